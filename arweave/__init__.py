@@ -1 +1,3 @@
 from .arweave_lib import Wallet, Transaction, arql
+from .http_client import HttpClient
+from .gateway_pool import GatewayPool
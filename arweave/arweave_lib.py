@@ -1,18 +1,15 @@
 import json
 import os
 import io
-import requests
 import logging
 import hashlib
+import threading
 import psutil
 import arrow
 import nacl.bindings
 from jose import jwk
 from jose.utils import base64url_encode, base64url_decode, base64
 from jose.backends.cryptography_backend import CryptographyRSAKey
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_PSS
-from Crypto.Hash import SHA256
 from .utils import (
     winston_to_ar,
     ar_to_winston,
@@ -24,11 +21,16 @@ from .utils import (
 )
 from .deep_hash import deep_hash
 from .merkle import compute_root_hash, generate_transaction_chunks
+from .file_io import open_data_source, opened_data_source, IterStream
+from .http_client import get_default_client
+from .cache import GatewayCache
+from .crypto_backend import get_backend, PyCryptodomeBackend
 
 logger = logging.getLogger(__name__)
 
 TRANSACTION_DATA_LIMIT_IN_BYTES = 2000000
 API_URL = "https://arweave.net"
+DATA_READ_SIZE = 256 * 1024
 
 
 class ArweaveTransactionException(Exception):
@@ -39,33 +41,53 @@ class Wallet(object):
     HASH = 'sha256'
     api_url = API_URL
 
-    def _set_jwk_params(self):
+    def _set_jwk_params(self, backend=None):
         self.jwk_data['p2s'] = ''
-        self.jwk = jwk.construct(self.jwk_data, algorithm=jwk.ALGORITHMS.RS256)
-        self.rsa = RSA.importKey(self.jwk.to_pem())
+        self.backend = backend or get_backend()
+        self.key = self.backend.load_private_key(self.jwk_data)
+        self._jwk = None
+        self._rsa = None
 
         self.owner = self.jwk_data.get('n')
         self.address = owner_to_address(self.owner)
 
-    def __init__(self, jwk_file='jwk_file.json', gateway=API_URL):
+    def __init__(self, jwk_file='jwk_file.json', gateway=API_URL, client=None, backend=None):
         with open(jwk_file, 'r') as j_file:
             self.jwk_data = json.loads(j_file.read())
-        self._set_jwk_params()
+        self._set_jwk_params(backend)
         
         self.api_url = gateway
+        self.client = client or get_default_client()
 
     @classmethod
-    def from_data(cls, jwk_data):
+    def from_data(cls, jwk_data, client=None, backend=None):
         wallet = cls.__new__(cls)
         wallet.jwk_data = jwk_data
-        wallet._set_jwk_params()
+        wallet._set_jwk_params(backend)
+        wallet.client = client or get_default_client()
         return wallet
 
+    @property
+    def jwk(self):
+        """python-jose key, only built when asked for"""
+        if self._jwk is None:
+            self._jwk = jwk.construct(self.jwk_data, algorithm=jwk.ALGORITHMS.RS256)
+
+        return self._jwk
+
+    @property
+    def rsa(self):
+        """PyCryptodome key, only built when asked for"""
+        if self._rsa is None:
+            self._rsa = PyCryptodomeBackend().load_private_key(self.jwk_data)
+
+        return self._rsa
+
     @property
     def balance(self):
         url = "{}/wallet/{}/balance".format(self.api_url, self.address)
 
-        response = requests.get(url)
+        response = self.client.get(url)
 
         if response.status_code == 200:
             balance = winston_to_ar(response.text)
@@ -75,40 +97,90 @@ class Wallet(object):
         return balance
 
     def sign(self, message):
-        h = SHA256.new(message)
-        signed_data = PKCS1_PSS.new(self.rsa).sign(h)
-        return signed_data
+        return self.backend.sign(self.key, message)
 
-    def verify(self):
-        pass
+    def verify(self, message, signature, owner=None):
+        """
+        Checks an RSA-PSS signature of message against owner (the base64url
+        encoded modulus), which defaults to this wallet.
+        """
+        return self.backend.verify(owner or self.owner, message, signature)
 
     def get_last_transaction_id(self):
-        url = "{}/tx_anchor".format(self.api_url)
+        self.last_tx = fetch_anchor(self.client, self.api_url)
 
-        response = requests.get(url)
+        return self.last_tx
 
-        if response.status_code == 200:
-            self.last_tx = response.text
-        else:
+    def get_rewards(self, data_sizes, target_address=None):
+        """
+        Price quotes in winston for many data sizes. One request is made per
+        distinct 256 KiB bucket (see cache.GatewayCache), using the client's
+        cache when it has one.
+        :return: dict of data size -> winston string
+        """
+        cache = self.client.cache or GatewayCache()
+
+        return {
+            data_size: fetch_reward(self.client, self.api_url, data_size, target_address, cache=cache)
+            for data_size in data_sizes
+        }
+
+
+def fetch_anchor(client, api_url):
+    """GET /tx_anchor, served from the client's cache if it has one"""
+    def fetch():
+        response = client.get("{}/tx_anchor".format(api_url))
+
+        if response.status_code != 200:
             raise ArweaveTransactionException(response.text)
 
-        return self.last_tx
+        return response.text
+
+    if client.cache is None:
+        return fetch()
+
+    return client.cache.anchor(api_url, fetch)
+
+
+def fetch_reward(client, api_url, data_size, target_address=None, cache=None):
+    """GET /price/{data_size}[/{target_address}], served from the cache if there is one"""
+    def fetch():
+        url = "{}/price/{}".format(api_url, data_size)
+
+        if target_address:
+            url = "{}/price/{}/{}".format(api_url, data_size, target_address)
+
+        response = client.get(url)
+
+        if response.status_code != 200:
+            raise ArweaveTransactionException(response.text)
+
+        return response.text
+
+    cache = cache or client.cache
+
+    if cache is None:
+        return fetch()
+
+    return cache.reward(api_url, data_size, target_address, fetch)
 
 
 class Transaction(object):
     def __init__(self, wallet, **kwargs):
         self.jwk_data = wallet.jwk_data
-        self.jwk = jwk.construct(self.jwk_data, algorithm="RS256")
         self.wallet = wallet
 
         self.id = kwargs.get('id', '')
-        self.last_tx = wallet.get_last_transaction_id()
+        self.last_tx = kwargs.get('last_tx', None)
         self.owner = self.jwk_data.get('n')
         self.tags = []
         self.format = kwargs.get('format', 2)
 
         self.api_url = kwargs.get('gateway', API_URL)
+        self.client = kwargs.get('client', None) or getattr(wallet, 'client', None) or get_default_client()
         self.chunks = None
+        self.hash_workers = kwargs.get('hash_workers', None)
+        self.tree_cache = kwargs.get('tree_cache', None)
 
         data = kwargs.get('data', '')
         self.data_size = len(data)
@@ -122,6 +194,9 @@ class Transaction(object):
             self.data = ''
 
         self.file_handler = kwargs.get('file_handler', None)
+        self.data_source = None
+        # the upload threads share the data source get_chunk opens on first use
+        self.data_source_lock = threading.Lock()
         if self.file_handler:
             self.uses_uploader = True
             self.data_size = os.stat(kwargs['file_path']).st_size
@@ -150,9 +225,7 @@ class Transaction(object):
                 # convert to winston
                 self.quantity = ar_to_winston(float(self.quantity))
 
-            reward = kwargs.get('reward', None)
-            if reward is not None:
-                self.reward = reward
+            self.reward = kwargs.get('reward', None)
 
             self.signature = ''
             self.status = None
@@ -165,18 +238,7 @@ class Transaction(object):
                 "Please supply a string containing json to initialize a serialized transaction")
 
     def get_reward(self, data_size, target_address=None):
-
-        url = "{}/price/{}".format(self.api_url, data_size)
-
-        if target_address:
-            url = "{}/price/{}/{}".format(self.api_url, data_size, target_address)
-
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            reward = response.text
-
-        return reward
+        return fetch_reward(self.client, self.api_url, data_size, target_address)
 
     def add_tag(self, name, value):
         tag = create_tag(name, value, self.format == 2)
@@ -190,10 +252,34 @@ class Transaction(object):
         self.tags = tags
 
     def sign(self):
+        # the anchor and reward are fetched here rather than in get_signature_data, so verify stays offline
+        prefetch_transactions([self])
+
         data_to_sign = self.get_signature_data()
 
         raw_signature = self.wallet.sign(data_to_sign)
 
+        self.set_signature(raw_signature)
+
+    def verify(self):
+        """
+        Checks the signature against the signature data and the owner of this
+        transaction, and that the id is the hash of the signature. Works for
+        transactions loaded with load_json or get_transaction, see
+        verification.verify_transactions for auditing many at once.
+        """
+        if not self.signature:
+            return False
+
+        signature = base64url_decode(self.signature.encode() if type(self.signature) == str else self.signature)
+        tx_id = self.id.decode() if type(self.id) == bytes else self.id
+
+        if base64url_encode(hashlib.sha256(signature).digest()).decode() != tx_id:
+            return False
+
+        return self.wallet.verify(self.get_signature_data(), signature, owner=self.owner)
+
+    def set_signature(self, raw_signature):
         self.signature = base64url_encode(raw_signature)
 
         self.id = base64url_encode(hashlib.sha256(raw_signature).digest())
@@ -202,7 +288,15 @@ class Transaction(object):
             self.id = self.id.decode()
 
     def get_signature_data(self):
-        self.reward = self.get_reward(self.data_size, target_address=self.target if len(self.target) > 0 else None)
+        """
+        The message the transaction is signed over, built from its fields
+        alone. An empty last_tx is signed as it is, as in a wallet's first
+        transaction; sign() fetches a missing anchor and reward beforehand.
+        """
+        if self.last_tx is None or self.reward is None:
+            raise ArweaveTransactionException(
+                "last_tx and reward must be set, sign() or prefetch_transactions fetches them"
+            )
 
         if int(self.data_size) > 0 and self.data_root == "" and not self.uses_uploader:
             if type(self.data) == str:
@@ -217,14 +311,15 @@ class Transaction(object):
             tag_str = ""
 
             for tag in self.tags:
-                name, value = decode_tag(tag)
-                tag_str += "{}{}".format(name.decode(), value.decode())
-
-            owner = base64url_decode(self.jwk_data['n'].encode())
-            target = base64url_decode(self.target)
-            data = base64url_decode(self.data)
-            quantity = self.quantity.encode()
-            reward = self.reward.encode()
+                if type(tag['name']) != bytes:
+                    tag = decode_tag(tag)
+                tag_str += "{}{}".format(tag['name'].decode(), tag['value'].decode())
+
+            owner = base64url_decode(self.owner.encode())
+            target = base64url_decode(self.target.encode())
+            data = base64url_decode(self.data.encode() if type(self.data) == str else self.data)
+            quantity = str(self.quantity).encode()
+            reward = str(self.reward).encode()
             last_tx = base64url_decode(self.last_tx.encode())
 
             signature_data = owner + target + data + quantity + reward + last_tx + tag_str.encode()
@@ -233,18 +328,21 @@ class Transaction(object):
             if self.uses_uploader:
                 self.prepare_chunks()
 
-            tag_list = [[tag['name'].encode(), tag['value'].encode()] for tag in self.tags]
+            # loaded transactions hold their tags decoded to bytes
+            tag_list = [[tag['name'] if type(tag['name']) == bytes else tag['name'].encode(),
+                         tag['value'] if type(tag['value']) == bytes else tag['value'].encode()]
+                        for tag in self.tags]
 
             signature_data_list = [
                 "2".encode(),
-                base64url_decode(self.jwk_data['n'].encode()),
+                base64url_decode(self.owner.encode()),
                 base64url_decode(self.target.encode()),
                 str(self.quantity).encode(),
-                self.reward.encode(),
+                str(self.reward).encode(),
                 base64url_decode(self.last_tx.encode()),
                 tag_list,
                 str(self.data_size).encode(),
-                base64url_decode(self.data_root)]
+                base64url_decode(self.data_root.encode() if type(self.data_root) == str else self.data_root)]
 
             signature_data = deep_hash(signature_data_list)
 
@@ -256,7 +354,7 @@ class Transaction(object):
         headers = {'Content-Type': 'application/json', 'Accept': 'text/plain'}
 
         json_data = self.json_data
-        response = requests.post(url, data=json_data, headers=headers)
+        response = self.client.post(url, data=json_data, headers=headers)
 
         logger.debug("{}\n\n{}".format(response.text, self.json_data))
 
@@ -279,17 +377,17 @@ class Transaction(object):
             'owner': self.owner,
             'quantity': self.quantity,
             'reward': self.reward,
-            'signature': self.signature.decode(),
+            'signature': self.signature.decode() if type(self.signature) == bytes else self.signature,
             'tags': self.tags,
             'target': self.target
         }
 
         if self.format == 2:
-            self.encode_tags()
-            data['tags'] = self.tags
+            # encode a copy, signing again later needs the raw tags
+            data['tags'] = [encode_tag(tag) for tag in self.tags]
             data['format'] = 2
             if len(self.data_root) > 0:
-                data['data_root'] = self.data_root.decode()
+                data['data_root'] = self.data_root.decode() if type(self.data_root) == bytes else self.data_root
             else:
                 data['data_root'] = ""
             data['data_size'] = str(self.data_size)
@@ -310,7 +408,7 @@ class Transaction(object):
     def get_status(self):
         url = "{}/tx/{}/status".format(self.api_url, self.id)
 
-        response = requests.get(url)
+        response = self.client.get(url)
 
         if response.status_code == 200:
             self.status = json.loads(response.text)
@@ -323,7 +421,7 @@ class Transaction(object):
     def get_transaction(self):
         url = "{}/tx/{}".format(self.api_url, self.id)
 
-        response = requests.get(url)
+        response = self.client.get(url)
 
         tx = None
 
@@ -335,32 +433,111 @@ class Transaction(object):
         return tx
 
     def get_price(self):
-        url = "{}/price/{}".format(self.api_url, self.data_size)
+        try:
+            return winston_to_ar(self.get_reward(self.data_size))
+        except ArweaveTransactionException as e:
+            logger.error(e)
+
+    def get_data(self, stream=False, file_handler=None, offset=0, length=None, chunk_size=DATA_READ_SIZE):
+        """
+        Fetches the transaction data. By default it is stored in self.data.
+        With stream=True an iterator of chunk_size byte blocks is returned
+        instead, and with a file_handler the data is written to it and the
+        number of bytes written returned; both use constant memory. offset
+        and length select a byte range, fetched with an HTTP Range request.
+        """
+        if not stream and file_handler is None and offset == 0 and length is None:
+            response = self.client.get(self.data_url)
+
+            if response.status_code == 200:
+                self.data = response.content
+            else:
+                logger.error(response.text)
 
-        response = requests.get(url)
+                raise ArweaveTransactionException(
+                    response.text
+                )
 
-        if response.status_code == 200:
-            return winston_to_ar(response.text)
-        else:
-            logger.error(response.text)
+            return self.data
 
-    def get_data(self):
-        url = "{}/{}/".format(self.api_url, self.id)
+        blocks = self.iter_data(offset, length, chunk_size)
 
-        response = requests.get(url)
+        if file_handler is None:
+            return blocks
 
-        if response.status_code == 200:
-            self.data = response.content
-        else:
-            logger.error(response.text)
+        written = 0
 
-            raise ArweaveTransactionException(
-                response.text
-            )
+        for block in blocks:
+            file_handler.write(block)
+            written += len(block)
+
+        return written
+
+    @property
+    def data_url(self):
+        return "{}/{}/".format(self.api_url, self.id)
+
+    def iter_data(self, offset=0, length=None, chunk_size=DATA_READ_SIZE):
+        """Iterator of the transaction data (or a range of it) in blocks of up to chunk_size bytes"""
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("offset and length must not be negative")
+
+        if length == 0:
+            return iter(())
+
+        return self.iter_data_blocks(offset, length, chunk_size)
+
+    def iter_data_blocks(self, offset, length, chunk_size):
+        headers = {}
+
+        if offset > 0 or length is not None:
+            end = "" if length is None else offset + length - 1
+            headers['Range'] = "bytes={}-{}".format(offset, end)
+
+        response = self.client.get(self.data_url, headers=headers, stream=True)
+
+        try:
+            if response.status_code not in (200, 206):
+                logger.error(response.text)
+
+                raise ArweaveTransactionException(
+                    response.text
+                )
+
+            # a gateway that ignores the Range header sends everything, skip to the range ourselves
+            skip = offset if response.status_code == 200 else 0
+            remaining = length
+
+            for block in response.iter_content(chunk_size=chunk_size):
+                if skip > 0:
+                    if len(block) <= skip:
+                        skip -= len(block)
+                        continue
+
+                    block = block[skip:]
+                    skip = 0
+
+                if remaining is not None:
+                    block = block[:remaining]
+                    remaining -= len(block)
+
+                if block:
+                    yield block
+
+                if remaining == 0:
+                    break
+        finally:
+            response.close()
+
+    def open_data(self, offset=0, length=None, chunk_size=DATA_READ_SIZE):
+        """The transaction data as a readable binary file like object"""
+        return io.BufferedReader(IterStream(self.iter_data(offset, length, chunk_size)), buffer_size=chunk_size)
 
     def load_json(self, json_str):
         json_data = json.loads(json_str)
 
+        self.id = json_data.get('id', self.id)
+        self.format = int(json_data.get('format', 1))
         self.data = json_data.get('data', '')
         self.last_tx = json_data.get('last_tx', '')
         self.owner = json_data.get('owner', '')
@@ -377,7 +554,11 @@ class Transaction(object):
 
     def prepare_chunks(self):
         if not self.chunks:
-            self.chunks = generate_transaction_chunks(self.file_handler)
+            # hashing maps the file only for as long as it takes, get_chunk opens it again when uploading
+            with opened_data_source(self.file_handler) as data_source:
+                self.chunks = generate_transaction_chunks(data_source, workers=self.hash_workers,
+                                                          cache=self.tree_cache)
+
             self.data_root = base64url_encode(self.chunks.get('data_root'))
 
         if not self.chunks:
@@ -389,6 +570,30 @@ class Transaction(object):
 
             self.data_root = ''
 
+    def close(self):
+        """
+        Releases the merkle tree (temporary files for a large one) and the
+        data source (memory map) opened over file_handler, which itself stays
+        open. The chunks are prepared again if they are needed afterwards.
+        """
+        tree = self.chunks.get('tree') if self.chunks else None
+
+        if tree is not None:
+            tree.close()
+
+        self.chunks = None
+
+        if self.data_source is not None and self.data_source is not self.file_handler:
+            self.data_source.close()
+
+        self.data_source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
     def get_chunk(self, idx):
         if self.chunks is None:
             raise ArweaveTransactionException("Chunks have not been prepared")
@@ -396,9 +601,13 @@ class Transaction(object):
         proof = self.chunks.get('proofs')[idx]
         chunk = self.chunks.get('chunks')[idx]
 
-        self.file_handler.seek(chunk.min_byte_range)
+        with self.data_source_lock:
+            if self.data_source is None:
+                self.data_source = open_data_source(self.file_handler)
 
-        chunk_data = self.file_handler.read(chunk.data_size)
+            data_source = self.data_source
+
+        chunk_data = data_source.read(chunk.min_byte_range, chunk.data_size)
 
         return {
             "data_root": self.data_root.decode(),
@@ -409,6 +618,38 @@ class Transaction(object):
         }
 
 
+def prefetch_transactions(transactions):
+    """
+    Fetches everything signing needs from the network in one step, so the
+    transactions can then be signed offline at CPU speed. Anchors are valid
+    for many blocks, so one anchor per gateway is shared by the batch, and
+    the price is fetched once per distinct data size and target.
+    Fields that are already set are left alone.
+    :param transactions: list of Transaction instances
+    :return: transactions
+    """
+    anchors = {}
+    rewards = {}
+
+    for tx in transactions:
+        if not tx.last_tx:
+            if tx.wallet.api_url not in anchors:
+                anchors[tx.wallet.api_url] = tx.wallet.get_last_transaction_id()
+
+            tx.last_tx = anchors[tx.wallet.api_url]
+
+        if tx.reward is None:
+            target = tx.target if len(tx.target) > 0 else None
+            key = (tx.api_url, int(tx.data_size), target)
+
+            if key not in rewards:
+                rewards[key] = tx.get_reward(tx.data_size, target_address=target)
+
+            tx.reward = rewards[key]
+
+    return transactions
+
+
 def arql(wallet, query):
     """
     Creat your query like so:
@@ -439,7 +680,7 @@ def arql(wallet, query):
 
     data = json.dumps(query)
     headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
-    response = requests.post("{}/arql".format(API_URL), data=data, headers=headers)
+    response = wallet.client.post("{}/arql".format(API_URL), data=data, headers=headers)
 
     if response.status_code == 200:
         transaction_ids = json.loads(response.text)
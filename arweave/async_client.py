@@ -0,0 +1,339 @@
+import json
+import asyncio
+import logging
+from .arweave_lib import Transaction, ArweaveTransactionException, API_URL
+from .transaction_uploader import (
+    TransactionUploader,
+    TransactionUploaderException,
+    TransactionDownloaderException,
+    JSON_HEADERS,
+    MAX_CHUNK_ERRORS,
+    DEFAULT_UPLOAD_CONCURRENCY
+)
+from .scheduler import UploadScheduler
+from .utils import winston_to_ar
+
+try:
+    import aiohttp
+
+    REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+except ImportError:  # aiohttp is only needed for the async client
+    aiohttp = None
+
+    # an injected session that is not aiohttp's raises its own errors, which are not retried
+    REQUEST_ERRORS = (asyncio.TimeoutError,)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTION_LIMIT = 100
+DEFAULT_TIMEOUT = 60
+LIMIT_POLL_INTERVAL = 0.05  # seconds a worker above the scheduler limit waits before looking again
+
+
+class AsyncResponse(object):
+    """The parts of a gateway response the library uses, read before the connection is released"""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+
+class AsyncClient(object):
+    """
+    asyncio counterpart of the blocking gateway calls in arweave_lib and
+    transaction_uploader, built on one pooled aiohttp session. Signing and
+    merkle work still use the Wallet and Transaction code; only the network
+    calls are awaited, so thousands of uploads can share one event loop.
+    """
+
+    def __init__(self, gateway=API_URL, limit=DEFAULT_CONNECTION_LIMIT, timeout=DEFAULT_TIMEOUT, session=None,
+                 cache=None):
+        if aiohttp is None and session is None:
+            raise ImportError("The async client requires aiohttp: pip install aiohttp")
+
+        self.api_url = gateway
+        self.cache = cache
+        self.limit = limit
+        self.timeout = timeout
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, path, **kwargs):
+        url = "{}{}".format(self.api_url, path)
+
+        async with self.get_session().request(method, url, **kwargs) as response:
+            return AsyncResponse(response.status, await response.read())
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def get_balance(self, address):
+        response = await self.get("/wallet/{}/balance".format(address))
+
+        if response.status_code != 200:
+            raise ArweaveTransactionException(response.text)
+
+        return winston_to_ar(response.text)
+
+    async def get_last_transaction_id(self):
+        """GET /tx_anchor, served from the client's cache if it has one"""
+        async def fetch():
+            response = await self.get("/tx_anchor")
+
+            if response.status_code != 200:
+                raise ArweaveTransactionException(response.text)
+
+            return response.text
+
+        if self.cache is None:
+            return await fetch()
+
+        return await self.cache.anchor_async(self.api_url, fetch)
+
+    async def get_reward(self, data_size, target_address=None):
+        """GET /price/{data_size}[/{target_address}], served from the client's cache if it has one"""
+        async def fetch():
+            if target_address:
+                response = await self.get("/price/{}/{}".format(data_size, target_address))
+            else:
+                response = await self.get("/price/{}".format(data_size))
+
+            if response.status_code != 200:
+                raise ArweaveTransactionException(response.text)
+
+            return response.text
+
+        if self.cache is None:
+            return await fetch()
+
+        return await self.cache.reward_async(self.api_url, data_size, target_address, fetch)
+
+    async def get_price(self, data_size, target_address=None):
+        return winston_to_ar(await self.get_reward(data_size, target_address))
+
+    async def create_transaction(self, wallet, **kwargs):
+        """Creates a Transaction, fetching its anchor without blocking the loop"""
+        if not kwargs.get('last_tx'):
+            kwargs['last_tx'] = await self.get_last_transaction_id()
+
+        kwargs.setdefault('gateway', self.api_url)
+
+        return Transaction(wallet, **kwargs)
+
+    async def sign(self, transaction):
+        """
+        Fetches the anchor and reward if they are missing, then signs.
+        Transactions that chunk a file are signed on the default executor as
+        hashing the file would otherwise stall the event loop.
+        """
+        if not transaction.last_tx:
+            transaction.last_tx = await self.get_last_transaction_id()
+
+        if transaction.reward is None:
+            target = transaction.target if len(transaction.target) > 0 else None
+            transaction.reward = await self.get_reward(transaction.data_size, target)
+
+        if transaction.uses_uploader:
+            await asyncio.get_running_loop().run_in_executor(None, transaction.sign)
+        else:
+            transaction.sign()
+
+        return transaction
+
+    async def send(self, transaction):
+        response = await self.post("/tx", data=transaction.json_data, headers=JSON_HEADERS)
+
+        if response.status_code != 200:
+            logger.error(response.text)
+
+            raise ArweaveTransactionException(response.text)
+
+        return transaction.last_tx
+
+    async def get_transaction(self, transaction_id):
+        response = await self.get("/tx/{}".format(transaction_id))
+
+        if response.status_code != 200:
+            raise ArweaveTransactionException(response.text)
+
+        return json.loads(response.text)
+
+    async def get_status(self, transaction_id):
+        response = await self.get("/tx/{}/status".format(transaction_id))
+
+        if response.status_code != 200:
+            logger.error(response.text)
+
+            return "PENDING"
+
+        return json.loads(response.text)
+
+    async def post_chunk(self, body):
+        return await self.post("/chunk", data=body, headers=JSON_HEADERS)
+
+    async def get_chunk(self, offset):
+        response = await self.get("/chunk/{}".format(offset))
+
+        if response.status_code != 200:
+            raise TransactionDownloaderException("Unable to get chunk: {}".format(response.text))
+
+        return json.loads(response.text)
+
+    def get_uploader(self, transaction, file_handler, **kwargs):
+        return AsyncTransactionUploader(transaction=transaction, file_handler=file_handler, async_client=self, **kwargs)
+
+
+class AsyncTransactionUploader(TransactionUploader):
+    """
+    TransactionUploader whose network calls are coroutines on an AsyncClient.
+    Chunk validation, progress and error handling are shared with the
+    blocking uploader; upload_chunks keeps up to concurrency POSTs (or the
+    scheduler's limit) in flight on the event loop instead of a thread pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncTransactionUploader, self).__init__(*args, **kwargs)
+        self.async_client = kwargs['async_client']
+
+    async def post_transaction(self, chunk):
+        json_data, upload_in_body = self.transaction_request(chunk)
+
+        response = await self.async_client.post("/tx", data=json_data, headers=JSON_HEADERS)
+
+        self.record_transaction_response(response, json_data, upload_in_body, journal=False)
+
+        if self.journal is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.journal.record_posted, upload_in_body)
+
+    async def post_chunk(self, index, chunk):
+        body = self.chunk_request(index, chunk)
+
+        delay = self.send_delay(len(body))
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        response = await self.async_client.post_chunk(body)
+        self.record_latency(response.status_code, loop.time() - started)
+
+        self.record_chunk_response(index, chunk, response, journal=False)
+
+        if response.status_code == 200 and self.journal is not None:
+            # the journal fsyncs every record, which would stall all the uploads on the loop
+            await loop.run_in_executor(None, self.journal.record_chunk, index)
+
+        return response
+
+    async def upload_chunk(self):
+        if self.is_complete:
+            raise TransactionUploaderException("Upload is already complete")
+
+        if not self.tx_posted:
+            await self.post_transaction(self.transaction.get_chunk(self.chunk_index))
+
+            if self.is_complete:
+                return
+
+        await self.upload_chunk_with_retry(self.chunk_index)
+
+        while self.chunk_index in self.completed_chunks:
+            self.chunk_index += 1
+
+    async def upload_chunk_with_retry(self, index):
+        errors = 0
+
+        while True:
+            try:
+                response = await self.post_chunk(index, self.transaction.get_chunk(index))
+                error = response.text if response.status_code != 200 else None
+            except REQUEST_ERRORS as e:
+                error = str(e)
+
+                if self.scheduler is not None:
+                    self.scheduler.on_error()
+
+            if error is None:
+                return
+
+            errors += 1
+
+            if errors >= MAX_CHUNK_ERRORS:
+                raise TransactionUploaderException(
+                    "Unable to upload chunk {}: {}".format(index, error)
+                )
+
+            await asyncio.sleep(self.retry_delay(errors))
+
+    async def upload_chunks(self, concurrency=DEFAULT_UPLOAD_CONCURRENCY, progress=None, scheduler=None):
+        if self.is_complete:
+            return
+
+        if scheduler is not None:
+            self.scheduler = scheduler
+
+        scheduler = self.scheduler or UploadScheduler.fixed(concurrency)
+
+        if not self.tx_posted:
+            await self.post_transaction(self.transaction.get_chunk(0))
+
+            if self.is_complete:
+                return
+
+        remaining = iter([index for index in range(self.total_chunks) if index not in self.completed_chunks])
+
+        async def worker(number):
+            while True:
+                # workers above the current limit idle until it grows again
+                while number >= scheduler.limit:
+                    await asyncio.sleep(LIMIT_POLL_INTERVAL)
+
+                index = next(remaining, None)
+
+                if index is None:
+                    return
+
+                await self.upload_chunk_with_retry(index)
+
+                if progress is not None:
+                    progress(self)
+
+        workers = [asyncio.ensure_future(worker(number)) for number in range(scheduler.maximum)]
+
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+
+            raise
+
+        while self.chunk_index in self.completed_chunks:
+            self.chunk_index += 1
@@ -0,0 +1,429 @@
+import hashlib
+import logging
+from array import array
+from jose.utils import base64url_encode, base64url_decode
+from .arweave_lib import Transaction
+from .deep_hash import deep_hash
+from .crypto_backend import get_backend
+from .file_io import open_data_source
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_TYPE_ARWEAVE = 1
+SIGNATURE_LENGTH = 512
+OWNER_LENGTH = 512
+TARGET_LENGTH = 32
+ANCHOR_LENGTH = 32
+MAX_TAGS = 128
+
+BUNDLE_COUNT_SIZE = 32
+BUNDLE_ENTRY_SIZE = 64
+HEADER_READ_ENTRIES = 4096
+
+BUNDLE_TAGS = [('Bundle-Format', 'binary'), ('Bundle-Version', '2.0.0')]
+
+
+class BundleException(Exception):
+    pass
+
+
+def to_bytes(value):
+    return value.encode('utf-8') if type(value) == str else bytes(value)
+
+
+def encode_long(value):
+    """Avro long: zig-zag then little endian base 128"""
+    value = (value << 1) ^ (value >> 63)
+    encoded = bytearray()
+
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    encoded.append(value)
+
+    return bytes(encoded)
+
+
+def decode_long(buffer, offset):
+    value = 0
+    shift = 0
+
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+
+        if byte < 0x80:
+            break
+
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def serialize_tags(tags):
+    """Tags as the Avro array of {name: bytes, value: bytes} records ANS-104 uses"""
+    if len(tags) == 0:
+        return b''
+
+    parts = [encode_long(len(tags))]
+
+    for tag in tags:
+        for field in (tag['name'], tag['value']):
+            parts.append(encode_long(len(field)))
+            parts.append(field)
+
+    parts.append(encode_long(0))
+
+    return b''.join(parts)
+
+
+def deserialize_tags(buffer):
+    tags = []
+    offset = 0
+
+    if len(buffer) == 0:
+        return tags
+
+    while True:
+        count, offset = decode_long(buffer, offset)
+
+        if count == 0:
+            return tags
+
+        if count < 0:
+            # a negative block count is followed by the size of the block in bytes
+            count = -count
+            _, offset = decode_long(buffer, offset)
+
+        for _ in range(count):
+            fields = []
+
+            for _ in range(2):
+                length, offset = decode_long(buffer, offset)
+                fields.append(bytes(buffer[offset:offset + length]))
+                offset += length
+
+            tags.append({'name': fields[0], 'value': fields[1]})
+
+
+class DataItem(object):
+    """
+    A signed ANS-104 data item. Many of them are packed into one bundle
+    transaction, so they have no reward and need no anchor or price lookups.
+    target and anchor are optional, base64url encoded 32 byte values.
+    """
+
+    def __init__(self, data=b'', target='', anchor='', tags=None):
+        self.data = to_bytes(data)
+        self.target = target
+        self.anchor = anchor
+        self.tags = []
+        self.owner = ''
+        self.signature = ''
+        self.id = ''
+        self.signature_type = SIGNATURE_TYPE_ARWEAVE
+
+        for name, value in (tags or []):
+            self.add_tag(name, value)
+
+    def add_tag(self, name, value):
+        if len(self.tags) >= MAX_TAGS:
+            raise BundleException("A data item can have at most {} tags".format(MAX_TAGS))
+
+        self.tags.append({'name': to_bytes(name), 'value': to_bytes(value)})
+
+    @property
+    def raw_target(self):
+        return self.decode_field(self.target, TARGET_LENGTH, 'target')
+
+    @property
+    def raw_anchor(self):
+        return self.decode_field(self.anchor, ANCHOR_LENGTH, 'anchor')
+
+    @staticmethod
+    def decode_field(value, length, name):
+        if not value:
+            return b''
+
+        raw = base64url_decode(to_bytes(value))
+
+        if len(raw) != length:
+            raise BundleException("Data item {} must be {} bytes".format(name, length))
+
+        return raw
+
+    def get_signature_data(self):
+        return deep_hash([
+            b"dataitem",
+            b"1",
+            str(self.signature_type).encode(),
+            base64url_decode(to_bytes(self.owner)),
+            self.raw_target,
+            self.raw_anchor,
+            serialize_tags(self.tags),
+            self.data
+        ])
+
+    def sign(self, wallet):
+        self.owner = wallet.owner
+
+        self.set_signature(wallet.sign(self.get_signature_data()))
+
+    def set_signature(self, raw_signature):
+        self.signature = base64url_encode(raw_signature).decode()
+        self.id = base64url_encode(hashlib.sha256(raw_signature).digest()).decode()
+
+    def verify(self, backend=None):
+        if not self.signature:
+            return False
+
+        raw_signature = base64url_decode(to_bytes(self.signature))
+
+        if base64url_encode(hashlib.sha256(raw_signature).digest()).decode() != self.id:
+            return False
+
+        return (backend or get_backend()).verify(self.owner, self.get_signature_data(), raw_signature)
+
+    @property
+    def binary_size(self):
+        return (2 + SIGNATURE_LENGTH + OWNER_LENGTH +
+                1 + len(self.raw_target) +
+                1 + len(self.raw_anchor) +
+                16 + len(serialize_tags(self.tags)) +
+                len(self.data))
+
+    def to_bytes(self):
+        if not self.signature:
+            raise BundleException("Data items must be signed before they are bundled")
+
+        signature = base64url_decode(to_bytes(self.signature))
+        owner = base64url_decode(to_bytes(self.owner))
+
+        if len(signature) != SIGNATURE_LENGTH or len(owner) != OWNER_LENGTH:
+            raise BundleException("Data items must be signed with a 4096 bit RSA key")
+
+        target = self.raw_target
+        anchor = self.raw_anchor
+        tags = serialize_tags(self.tags)
+
+        return b''.join([
+            self.signature_type.to_bytes(2, byteorder='little'),
+            signature,
+            owner,
+            b'\x01' + target if target else b'\x00',
+            b'\x01' + anchor if anchor else b'\x00',
+            len(self.tags).to_bytes(8, byteorder='little'),
+            len(tags).to_bytes(8, byteorder='little'),
+            tags,
+            self.data
+        ])
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        buffer = memoryview(buffer)
+        item = cls()
+
+        item.signature_type = int.from_bytes(buffer[0:2], byteorder='little')
+
+        if item.signature_type != SIGNATURE_TYPE_ARWEAVE:
+            raise BundleException("Unsupported data item signature type {}".format(item.signature_type))
+
+        offset = 2
+        raw_signature = bytes(buffer[offset:offset + SIGNATURE_LENGTH])
+        offset += SIGNATURE_LENGTH
+        item.owner = base64url_encode(bytes(buffer[offset:offset + OWNER_LENGTH])).decode()
+        offset += OWNER_LENGTH
+
+        for name, length in (('target', TARGET_LENGTH), ('anchor', ANCHOR_LENGTH)):
+            present = buffer[offset]
+            offset += 1
+
+            if present:
+                setattr(item, name, base64url_encode(bytes(buffer[offset:offset + length])).decode())
+                offset += length
+
+        tag_count = int.from_bytes(buffer[offset:offset + 8], byteorder='little')
+        tag_bytes = int.from_bytes(buffer[offset + 8:offset + 16], byteorder='little')
+        offset += 16
+
+        item.tags = deserialize_tags(buffer[offset:offset + tag_bytes])
+        offset += tag_bytes
+
+        if len(item.tags) != tag_count:
+            raise BundleException("Data item declares {} tags but has {}".format(tag_count, len(item.tags)))
+
+        item.data = bytes(buffer[offset:])
+        item.set_signature(raw_signature)
+
+        return item
+
+
+def sign_data_items(items, wallet, workers=None):
+    """
+    Signs data items with one wallet. With workers > 1 the signatures are
+    computed on the signing process pool, see signing.sign_messages.
+    """
+    for item in items:
+        item.owner = wallet.owner
+
+    if workers is None or workers < 2:
+        for item in items:
+            item.set_signature(wallet.sign(item.get_signature_data()))
+
+        return items
+
+    from .signing import sign_messages
+
+    tasks = [(wallet.address, item.get_signature_data()) for item in items]
+
+    for item, raw_signature in zip(items, sign_messages(tasks, {wallet.address: wallet.jwk_data}, workers)):
+        item.set_signature(raw_signature)
+
+    return items
+
+
+def write_bundle(items, file_handler):
+    """
+    Writes signed data items to file_handler as an ANS-104 binary bundle,
+    one item at a time, and returns the number of bytes written.
+    """
+    header = [len(items).to_bytes(BUNDLE_COUNT_SIZE, byteorder='little')]
+
+    for item in items:
+        if not item.id:
+            raise BundleException("Data items must be signed before they are bundled")
+
+        header.append(item.binary_size.to_bytes(32, byteorder='little'))
+        header.append(base64url_decode(to_bytes(item.id)))
+
+    size = file_handler.write(b''.join(header))
+
+    for item in items:
+        size += file_handler.write(item.to_bytes())
+
+    return size
+
+
+def create_bundle(items):
+    """The bundle as bytes, for bundles small enough to send as Transaction data"""
+    header = [len(items).to_bytes(BUNDLE_COUNT_SIZE, byteorder='little')]
+    binaries = [item.to_bytes() for item in items]
+
+    for item, binary in zip(items, binaries):
+        header.append(len(binary).to_bytes(32, byteorder='little'))
+        header.append(base64url_decode(to_bytes(item.id)))
+
+    return b''.join(header + binaries)
+
+
+def add_bundle_tags(transaction):
+    for name, value in BUNDLE_TAGS:
+        transaction.add_tag(name, value)
+
+    return transaction
+
+
+def bundle_transaction(wallet, file_handler, file_path, **kwargs):
+    """
+    A Transaction for a bundle written with write_bundle, tagged so gateways
+    index its data items. Sign it and upload it with get_uploader as for any
+    other file.
+    """
+    return add_bundle_tags(Transaction(wallet, file_handler=file_handler, file_path=file_path, **kwargs))
+
+
+class BundleReader(object):
+    """
+    Streaming unbundler. Only the bundle header is read up front, in blocks
+    of HEADER_READ_ENTRIES entries, to index the id, offset and size of every
+    data item; items are read and parsed one at a time when asked for.
+    """
+
+    def __init__(self, file_handler):
+        self.file_handler = file_handler
+        self.data_source = open_data_source(file_handler)
+
+        self.count = int.from_bytes(self.read(0, BUNDLE_COUNT_SIZE), byteorder='little')
+        self.ids = bytearray()
+        self.offsets = array('Q')
+        self.sizes = array('Q')
+        self.positions = None
+
+        offset = BUNDLE_COUNT_SIZE + self.count * BUNDLE_ENTRY_SIZE
+
+        for first in range(0, self.count, HEADER_READ_ENTRIES):
+            entries = min(HEADER_READ_ENTRIES, self.count - first)
+            block = self.read(BUNDLE_COUNT_SIZE + first * BUNDLE_ENTRY_SIZE, entries * BUNDLE_ENTRY_SIZE)
+
+            for entry in range(0, len(block), BUNDLE_ENTRY_SIZE):
+                size = int.from_bytes(block[entry:entry + 32], byteorder='little')
+
+                self.offsets.append(offset)
+                self.sizes.append(size)
+                self.ids += block[entry + 32:entry + BUNDLE_ENTRY_SIZE]
+                offset += size
+
+    def read(self, offset, size):
+        if self.data_source is None:
+            raise BundleException("Bundle reader is closed")
+
+        data = self.data_source.read(offset, size)
+
+        if len(data) != size:
+            raise BundleException("Bundle is truncated at byte {}".format(offset + len(data)))
+
+        return data
+
+    def close(self):
+        """
+        Releases the data source (memory map) opened over file_handler, which
+        itself stays open. Items cannot be read after the reader is closed.
+        """
+        if self.data_source is not None and self.data_source is not self.file_handler:
+            self.data_source.close()
+
+        self.data_source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def item_id(self, index):
+        return base64url_encode(bytes(self.ids[index * 32:index * 32 + 32])).decode()
+
+    def entries(self):
+        """(id, offset, size) of every data item, in bundle order"""
+        for index in range(self.count):
+            yield self.item_id(index), self.offsets[index], self.sizes[index]
+
+    def index_of(self, item_id):
+        if self.positions is None:
+            self.positions = {self.item_id(index): index for index in range(self.count)}
+
+        return self.positions[item_id]
+
+    def read_item(self, index):
+        return DataItem.from_bytes(self.read(self.offsets[index], self.sizes[index]))
+
+    def get(self, item_id):
+        return self.read_item(self.index_of(item_id))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.read_item(index)
+
+    def verify(self, backend=None):
+        """True when every data item is validly signed and matches its header id"""
+        backend = backend or get_backend()
+
+        for index, item in enumerate(self):
+            if item.id != self.item_id(index) or not item.verify(backend):
+                return False
+
+        return True
@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+
+ANCHOR_TTL = 5 * 60
+PRICE_TTL = 60
+DEFAULT_MAXSIZE = 4096
+PRICE_BUCKET_SIZE = 256 * 1024  # gateways price data by the number of 256 KiB chunks
+
+_MISSING = object()
+
+
+class TTLCache(object):
+    """
+    Thread safe mapping whose entries expire ttl seconds after they are set.
+    When more than maxsize entries are stored the least recently used one is
+    evicted. Hit, miss and eviction counts are kept for export.
+    """
+
+    def __init__(self, ttl, maxsize=DEFAULT_MAXSIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key)
+
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self.data[key]
+
+                self.misses += 1
+                return default
+
+            self.data.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self.lock:
+            self.data[key] = (self.clock() + self.ttl, value)
+            self.data.move_to_end(key)
+
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_fetch(self, key, fetch):
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            value = fetch()
+            self.set(key, value)
+
+        return value
+
+    async def get_or_fetch_async(self, key, fetch):
+        """get_or_fetch for a coroutine function fetch"""
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            value = await fetch()
+            self.set(key, value)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.data)
+        }
+
+
+class GatewayCache(object):
+    """
+    Cache for the slowly changing gateway values: the transaction anchor
+    (valid for many blocks) and the price of storing data (changes per
+    block). Prices are keyed by the number of PRICE_BUCKET_SIZE chunks the
+    data occupies, as that is what the gateway charges for, so every size in
+    the same bucket is served by one quote. Pass price_bucket_size=None to
+    key prices by the exact byte size instead.
+    """
+
+    def __init__(self, anchor_ttl=ANCHOR_TTL, price_ttl=PRICE_TTL, maxsize=DEFAULT_MAXSIZE,
+                 price_bucket_size=PRICE_BUCKET_SIZE):
+        self.anchors = TTLCache(anchor_ttl, maxsize=maxsize)
+        self.prices = TTLCache(price_ttl, maxsize=maxsize)
+        self.price_bucket_size = price_bucket_size
+
+    def price_key(self, api_url, data_size, target_address=None):
+        data_size = int(data_size)
+
+        if self.price_bucket_size:
+            data_size = -(-data_size // self.price_bucket_size)
+
+        return api_url, data_size, target_address
+
+    def anchor(self, api_url, fetch):
+        return self.anchors.get_or_fetch(api_url, fetch)
+
+    def reward(self, api_url, data_size, target_address, fetch):
+        return self.prices.get_or_fetch(self.price_key(api_url, data_size, target_address), fetch)
+
+    async def anchor_async(self, api_url, fetch):
+        return await self.anchors.get_or_fetch_async(api_url, fetch)
+
+    async def reward_async(self, api_url, data_size, target_address, fetch):
+        return await self.prices.get_or_fetch_async(self.price_key(api_url, data_size, target_address), fetch)
+
+    def clear(self):
+        self.anchors.clear()
+        self.prices.clear()
+
+    def stats(self):
+        return {
+            "anchor": self.anchors.stats(),
+            "price": self.prices.stats()
+        }
@@ -0,0 +1,131 @@
+from jose.utils import base64url_decode
+
+RSA_PUBLIC_EXPONENT = 65537
+PSS_SALT_LENGTH = 32
+
+
+def jwk_int(value):
+    """An integer from a base64url encoded JWK member"""
+    if type(value) == str:
+        value = value.encode()
+
+    return int.from_bytes(base64url_decode(value), byteorder='big')
+
+
+class CryptoBackend(object):
+    """
+    RSA-PSS (SHA-256, 32 byte salt) signing and verification as used by
+    Arweave. A private key is parsed once with load_private_key and the
+    returned object is passed back to sign. verify takes the base64url
+    encoded owner (the key modulus) of the transaction.
+    """
+    name = None
+
+    def load_private_key(self, jwk_data):
+        raise NotImplementedError
+
+    def sign(self, key, message):
+        raise NotImplementedError
+
+    def verify(self, owner, message, signature):
+        raise NotImplementedError
+
+
+class CryptographyBackend(CryptoBackend):
+    """OpenSSL through the cryptography package, the fast default"""
+    name = 'cryptography'
+
+    def __init__(self):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding, rsa
+        from cryptography.exceptions import InvalidSignature
+
+        self.hashes = hashes
+        self.rsa = rsa
+        self.invalid_signature = InvalidSignature
+        self.padding = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=PSS_SALT_LENGTH)
+
+    def load_private_key(self, jwk_data):
+        public_numbers = self.rsa.RSAPublicNumbers(jwk_int(jwk_data.get('e', 'AQAB')), jwk_int(jwk_data['n']))
+
+        return self.rsa.RSAPrivateNumbers(
+            p=jwk_int(jwk_data['p']),
+            q=jwk_int(jwk_data['q']),
+            d=jwk_int(jwk_data['d']),
+            dmp1=jwk_int(jwk_data['dp']),
+            dmq1=jwk_int(jwk_data['dq']),
+            iqmp=jwk_int(jwk_data['qi']),
+            public_numbers=public_numbers
+        ).private_key()
+
+    def sign(self, key, message):
+        return key.sign(message, self.padding, self.hashes.SHA256())
+
+    def verify(self, owner, message, signature):
+        public_key = self.rsa.RSAPublicNumbers(RSA_PUBLIC_EXPONENT, jwk_int(owner)).public_key()
+
+        try:
+            public_key.verify(signature, message, self.padding, self.hashes.SHA256())
+        except self.invalid_signature:
+            return False
+
+        return True
+
+
+class PyCryptodomeBackend(CryptoBackend):
+    """Pure PyCryptodome fallback"""
+    name = 'pycryptodome'
+
+    def __init__(self):
+        from Crypto.PublicKey import RSA
+        from Crypto.Signature import PKCS1_PSS
+        from Crypto.Hash import SHA256
+
+        self.RSA = RSA
+        self.PKCS1_PSS = PKCS1_PSS
+        self.SHA256 = SHA256
+
+    def load_private_key(self, jwk_data):
+        return self.RSA.construct((
+            jwk_int(jwk_data['n']),
+            jwk_int(jwk_data.get('e', 'AQAB')),
+            jwk_int(jwk_data['d']),
+            jwk_int(jwk_data['p']),
+            jwk_int(jwk_data['q'])
+        ))
+
+    def sign(self, key, message):
+        return self.PKCS1_PSS.new(key).sign(self.SHA256.new(message))
+
+    def verify(self, owner, message, signature):
+        public_key = self.RSA.construct((jwk_int(owner), RSA_PUBLIC_EXPONENT))
+
+        return bool(self.PKCS1_PSS.new(public_key).verify(self.SHA256.new(message), signature))
+
+
+BACKENDS = (CryptographyBackend, PyCryptodomeBackend)
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """
+    Returns the named backend, or the first one that can be imported
+    (cryptography, then PyCryptodome) when no name is given.
+    """
+    for backend_class in BACKENDS:
+        if name is not None and backend_class.name != name:
+            continue
+
+        if backend_class.name not in _backends:
+            try:
+                _backends[backend_class.name] = backend_class()
+            except ImportError:
+                if name is not None:
+                    raise
+
+                continue
+
+        return _backends[backend_class.name]
+
+    raise ValueError("Unknown crypto backend: {}".format(name))
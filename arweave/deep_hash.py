@@ -5,27 +5,125 @@ from Crypto.PublicKey import RSA
 from Crypto.Signature import PKCS1_PSS
 from Crypto.Hash import SHA384
 
+BLOB_READ_SIZE = 1024 * 1024
+
+_END = object()
+
+
+class Blob(object):
+    """
+    A deep hash leaf whose data is streamed rather than held in memory. The
+    size has to be known up front as it is part of the blob tag.
+    :param source: file like object (read from its current position) or an
+                   iterable of bytes like chunks
+    :param size: number of bytes the source will produce
+    """
+
+    def __init__(self, source, size):
+        self.source = source
+        self.size = size
+
+    def __iter__(self):
+        if hasattr(self.source, 'read'):
+            remaining = self.size
+
+            while remaining > 0:
+                data = self.source.read(min(BLOB_READ_SIZE, remaining))
+
+                if not data:
+                    break
+
+                remaining -= len(data)
+
+                yield data
+        else:
+            yield from self.source
+
+
+def blob_size(data):
+    """Size in bytes of a blob leaf, for file like objects the bytes left to read"""
+    if isinstance(data, Blob):
+        return data.size
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return memoryview(data).nbytes
+
+    if hasattr(data, 'read') and hasattr(data, 'seek'):
+        position = data.tell()
+        end = data.seek(0, 2)
+        data.seek(position)
+
+        return end - position
+
+    raise TypeError("Unable to deep hash {}, wrap streams of unknown size in a Blob".format(type(data).__name__))
 
-def deep_hash(data):
-    if type(data) == list:
-        tag = b"list" + str(len(data)).encode()
 
-        return deep_hash_chunks(data, hashlib.sha384(tag).digest())
+def hash_blob(data):
+    size = blob_size(data)
 
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data_hash = hashlib.sha384(data).digest()
     else:
-        tag = b"blob" + str(len(data)).encode()
+        if not isinstance(data, Blob):
+            data = Blob(data, size)
 
-    tagged_hash = hashlib.sha384(tag).digest() + hashlib.sha384(data).digest()
+        hasher = hashlib.sha384()
+        hashed = 0
 
-    return hashlib.sha384(tagged_hash).digest()
+        for chunk in data:
+            hasher.update(chunk)
+            hashed += memoryview(chunk).nbytes
 
+        if hashed != size:
+            raise ValueError("Blob produced {} bytes, expected {}".format(hashed, size))
 
-def deep_hash_chunks(chunks, acc):
-    if len(chunks) < 1:
-        return acc
+        data_hash = hasher.digest()
+
+    tag = b"blob" + str(size).encode()
+
+    return hashlib.sha384(hashlib.sha384(tag).digest() + data_hash).digest()
+
+
+def deep_hash(data):
+    """
+    Arweave deep hash of nested lists of blobs. Blobs are bytes like objects,
+    file like objects (hashed from their current position to the end) or
+    Blob instances, and are hashed incrementally so large data items are
+    never read into memory. Nesting is walked with an explicit stack.
+    """
+    stack = []
+    item = data
+
+    while True:
+        if type(item) == list:
+            tag = b"list" + str(len(item)).encode()
+            stack.append([iter(item), hashlib.sha384(tag).digest()])
+        else:
+            digest = hash_blob(item)
+
+            if not stack:
+                return digest
 
-    hash_pair = acc + deep_hash(chunks[0])
+            stack[-1][1] = hashlib.sha384(stack[-1][1] + digest).digest()
+
+        while True:
+            item = next(stack[-1][0], _END)
+
+            if item is not _END:
+                break
+
+            digest = stack.pop()[1]
+
+            if not stack:
+                return digest
+
+            stack[-1][1] = hashlib.sha384(stack[-1][1] + digest).digest()
+
+
+def deep_hash_chunks(chunks, acc):
+    for chunk in chunks:
+        hash_pair = acc + deep_hash(chunk)
 
-    new_acc = hashlib.sha384(hash_pair).digest()
+        acc = hashlib.sha384(hash_pair).digest()
 
-    return deep_hash_chunks(chunks[1:], new_acc)
+    return acc
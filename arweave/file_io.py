@@ -1,3 +1,9 @@
+import io
+import mmap
+import threading
+from contextlib import contextmanager
+
+
 def read_file_chunks(file_handler, chunk_size, seek_to=0):
     """A generator function to read files one chunk at a time"""
     while True:
@@ -7,3 +13,145 @@ def read_file_chunks(file_handler, chunk_size, seek_to=0):
             break
 
         yield data
+
+
+class IterStream(io.RawIOBase):
+    """
+    Read only raw stream over an iterator of bytes blocks, so a streamed
+    download can be handed to anything expecting a file. Wrap it in an
+    io.BufferedReader for efficient small reads.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = iter(blocks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            block = next(self.blocks, None)
+
+            if block is None:
+                return 0
+
+            self.pending = memoryview(block)
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+
+        return size
+
+    def close(self):
+        close = getattr(self.blocks, 'close', None)
+
+        if close is not None:
+            close()
+
+        super(IterStream, self).close()
+
+
+class FileDataSource:
+    """
+    Buffered access to the data behind a file handler. Used for streams that
+    cannot be memory mapped, every read copies the data into a new bytes object.
+    Reads hold a lock so chunks can be fetched from several threads.
+    """
+
+    def __init__(self, file_handler):
+        self.file_handler = file_handler
+        self.lock = threading.Lock()
+
+    def read(self, offset, size):
+        with self.lock:
+            self.file_handler.seek(offset)
+
+            return self.file_handler.read(size)
+
+    def iter_chunks(self, chunk_size):
+        return read_file_chunks(self.file_handler, chunk_size)
+
+    def close(self):
+        pass
+
+
+class MappedFileDataSource(FileDataSource):
+    """
+    Zero copy access to a file or BytesIO. Reads return memoryview slices of
+    a read only mmap (or of the BytesIO buffer) which can be handed straight to
+    hashlib and base64 without copying the data.
+    """
+
+    def __init__(self, file_handler, buffer):
+        super(MappedFileDataSource, self).__init__(file_handler)
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.size = len(self.view)
+
+    def read(self, offset, size):
+        return self.view[offset:offset + size]
+
+    def iter_chunks(self, chunk_size):
+        # start where the file handler is, like read_file_chunks, and leave it at the end
+        cursor = self.file_handler.tell()
+
+        while cursor < self.size:
+            yield self.view[cursor:cursor + chunk_size]
+            cursor += chunk_size
+
+        self.file_handler.seek(self.size)
+
+    def close(self):
+        """
+        Releases the mmap, or the export of the BytesIO buffer so it can be
+        written to again. Slices still held by callers keep it alive until
+        they are dropped.
+        """
+        self.view.release()
+
+        try:
+            if isinstance(self.buffer, mmap.mmap):
+                self.buffer.close()
+            else:
+                self.buffer.release()
+        except BufferError:
+            pass
+
+
+def open_data_source(file_handler):
+    """
+    Returns the best data source for the file handler: a memory mapped one for
+    regular files and BytesIO, falling back to buffered reads for anything
+    that is not seekable or cannot be mapped (pipes, sockets, empty files).
+    :param file_handler: a file like object or an existing data source
+    :return: FileDataSource
+    """
+    if isinstance(file_handler, FileDataSource):
+        return file_handler
+
+    if isinstance(file_handler, io.BytesIO):
+        return MappedFileDataSource(file_handler, file_handler.getbuffer())
+
+    try:
+        if not file_handler.seekable():
+            return FileDataSource(file_handler)
+
+        mapped = mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+        return FileDataSource(file_handler)
+
+    return MappedFileDataSource(file_handler, mapped)
+
+
+@contextmanager
+def opened_data_source(file_handler):
+    """open_data_source for a with block, the data source is closed on exit unless file_handler already was one"""
+    data_source = open_data_source(file_handler)
+
+    try:
+        yield data_source
+    finally:
+        if data_source is not file_handler:
+            data_source.close()
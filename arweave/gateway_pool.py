@@ -0,0 +1,258 @@
+import time
+import random
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import get_default_client
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_PATH = "/info"
+DEFAULT_HEALTH_CHECK_INTERVAL = 30  # seconds
+DEFAULT_ATTEMPTS = 3  # gateways tried per request before giving up
+FAILOVER_STATUSES = (429, 500, 502, 503, 504)
+COOLDOWN = 5.0  # seconds a failed gateway is skipped, doubled for every further consecutive failure
+MAX_COOLDOWN = 300.0
+LATENCY_SMOOTHING = 0.2
+UNKNOWN_LATENCY = 1.0  # seconds assumed for a gateway that has not answered yet
+
+
+class GatewayPoolException(Exception):
+    pass
+
+
+class Gateway(object):
+    """Health and smoothed latency of one gateway in a GatewayPool"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def is_available(self, now):
+        return now >= self.down_until
+
+    @property
+    def weight(self):
+        return 1.0 / max(self.latency if self.latency is not None else UNKNOWN_LATENCY, 0.001)
+
+    def on_success(self, latency):
+        self.requests += 1
+        self.failures = 0
+        self.down_until = 0.0
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+
+    def on_failure(self, now):
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+        self.down_until = now + min(MAX_COOLDOWN, COOLDOWN * 2 ** (self.failures - 1))
+
+    def to_dict(self, now):
+        return {
+            "url": self.url,
+            "available": self.is_available(now),
+            "latency": self.latency,
+            "requests": self.requests,
+            "errors": self.errors
+        }
+
+
+class GatewayPool(object):
+    """
+    HTTP client that spreads gateway calls over several gateways. Use it
+    anywhere an HttpClient is accepted (Wallet, Transaction, the uploaders,
+    get_chunk, the downloaders): a request for a URL under any of the pool's
+    gateways is sent to a gateway picked at random, weighted by the inverse
+    of its smoothed latency, so the fastest gateways take most of the load.
+
+    A network error or one of the FAILOVER_STATUSES puts the gateway in a
+    cooldown that doubles with every consecutive failure and the request is
+    retried on another gateway, up to attempts gateways. A 404 on a GET is
+    retried elsewhere too, without penalty, since data may not have reached
+    every gateway yet. check_health (or start, to run it in the background)
+    probes every gateway and brings recovered ones back early.
+
+    URLs under no gateway of the pool are passed through unchanged. Requests
+    go through client, which defaults to the shared HttpClient.
+    """
+
+    def __init__(self, gateways, client=None, attempts=DEFAULT_ATTEMPTS,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        if len(gateways) == 0:
+            raise GatewayPoolException("A gateway pool needs at least one gateway")
+
+        self.gateways = [Gateway(url) for url in gateways]
+        self.client = client or get_default_client()
+        self.attempts = attempts
+        self.health_check_interval = health_check_interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.health_thread = None
+
+    @property
+    def url(self):
+        """The first gateway, the api_url to give the objects that use the pool"""
+        return self.gateways[0].url
+
+    @property
+    def cache(self):
+        return self.client.cache
+
+    @property
+    def timeout(self):
+        return self.client.timeout
+
+    def gateway_for(self, url):
+        for gateway in self.gateways:
+            if url == gateway.url or url.startswith(gateway.url + '/'):
+                return gateway
+
+        return None
+
+    def choose(self, exclude=()):
+        """
+        A gateway picked by latency weight from the available ones. When
+        every gateway is cooling down the one that recovers first is used.
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            candidates = [gateway for gateway in self.gateways if gateway not in exclude]
+
+            if len(candidates) == 0:
+                return None
+
+            available = [gateway for gateway in candidates if gateway.is_available(now)]
+
+            if len(available) == 0:
+                return min(candidates, key=lambda gateway: gateway.down_until)
+
+            return random.choices(available, weights=[gateway.weight for gateway in available])[0]
+
+    def record_success(self, gateway, latency):
+        with self.lock:
+            gateway.on_success(latency)
+
+    def record_failure(self, gateway):
+        with self.lock:
+            gateway.on_failure(time.monotonic())
+
+    def request(self, method, url, **kwargs):
+        origin = self.gateway_for(url)
+
+        if origin is None:
+            return self.client.request(method, url, **kwargs)
+
+        path = url[len(origin.url):]
+        tried = []
+        response = None
+        error = None
+
+        for _ in range(min(self.attempts, len(self.gateways))):
+            gateway = self.choose(exclude=tried)
+            tried.append(gateway)
+
+            started = time.monotonic()
+
+            try:
+                attempt = self.client.request(method, gateway.url + path, **kwargs)
+            except requests.exceptions.RequestException as e:
+                logger.warning("{} {}{} failed: {}".format(method, gateway.url, path, e))
+                self.record_failure(gateway)
+                error = e
+                continue
+
+            if response is not None:
+                # release the connection of the response that is being replaced
+                response.close()
+
+            # the last real answer is returned if every other gateway fails
+            response = attempt
+
+            if response.status_code in FAILOVER_STATUSES:
+                logger.warning("{} {}{} returned {}".format(method, gateway.url, path, response.status_code))
+                self.record_failure(gateway)
+                continue
+
+            self.record_success(gateway, time.monotonic() - started)
+
+            if response.status_code == 404 and method == 'GET':
+                continue
+
+            return response
+
+        if response is None:
+            raise error
+
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def check_gateway(self, gateway):
+        started = time.monotonic()
+
+        try:
+            response = self.client.get(gateway.url + HEALTH_CHECK_PATH)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Health check of {} failed: {}".format(gateway.url, e))
+            self.record_failure(gateway)
+            return False
+
+        if response.status_code != 200:
+            logger.warning("Health check of {} returned {}".format(gateway.url, response.status_code))
+            self.record_failure(gateway)
+            return False
+
+        self.record_success(gateway, time.monotonic() - started)
+
+        return True
+
+    def check_health(self):
+        """Probes every gateway at once, returns the number that are healthy"""
+        with ThreadPoolExecutor(max_workers=len(self.gateways)) as executor:
+            return sum(executor.map(self.check_gateway, self.gateways))
+
+    def start(self):
+        """Runs check_health every health_check_interval seconds on a daemon thread"""
+        if self.health_thread is not None:
+            return
+
+        self.stopped.clear()
+
+        def run():
+            while not self.stopped.is_set():
+                self.check_health()
+                self.stopped.wait(self.health_check_interval)
+
+        self.health_thread = threading.Thread(target=run, name="gateway-health", daemon=True)
+        self.health_thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.health_thread is not None:
+            self.health_thread.join()
+            self.health_thread = None
+
+    def stats(self):
+        now = time.monotonic()
+
+        with self.lock:
+            return [gateway.to_dict(now) for gateway in self.gateways]
+
+    def close(self):
+        """Stops the health checks, the client is left open as it may be shared"""
+        self.stop()
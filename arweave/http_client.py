@@ -0,0 +1,62 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) seconds
+
+
+class HttpClient(object):
+    """
+    Shared HTTP client for all gateway calls. Holds one requests.Session with
+    keep-alive and a connection pool, so repeated calls (e.g. thousands of
+    chunk POSTs) reuse a handful of connections instead of opening a new
+    TCP+TLS connection each time. A Wallet, its Transactions and their
+    uploaders all use the same client unless given their own.
+
+    Pass a cache.GatewayCache as cache to serve the anchor and price
+    endpoints from a TTL cache.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 timeout=DEFAULT_TIMEOUT, session=None, cache=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.session = session or requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+
+
+def get_default_client():
+    """The process wide client used when none is supplied"""
+    global _default_client
+
+    if _default_client is None:
+        _default_client = HttpClient()
+
+    return _default_client
+
+
+def set_default_client(client):
+    global _default_client
+
+    _default_client = client
@@ -1,8 +1,17 @@
+import io
+import os
+import stat
 import hashlib
 import struct
 import functools
+import tempfile
+import threading
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from jose.utils import base64url_encode, base64url_decode
-from .file_io import read_file_chunks
+from .file_io import read_file_chunks, opened_data_source
 from .utils import concat_buffers
 from json import JSONEncoder
 
@@ -11,6 +20,11 @@ NOTE_SIZE = 32
 HASH_SIZE = 32
 MAX_CHUNK_SIZE = 256 * 1024
 MIN_CHUNK_SIZE = 32 * 1024
+OFFSET_SIZE = 8
+NODE_RECORD_SIZE = HASH_SIZE + OFFSET_SIZE
+HASH_WINDOW_PER_WORKER = 4
+NOTE_CACHE_SIZE = 1 << 16
+SPILL_LEAF_COUNT = 1 << 16  # trees with more leaves than this are kept on disk by default
 
 
 class NodeTypeException(Exception):
@@ -18,6 +32,8 @@ class NodeTypeException(Exception):
 
 
 class Node:
+    __slots__ = ('id', 'type', 'byte_range', 'max_byte_range')
+
     def __init__(self, id='', type=None, byte_range=0, max_byte_range=0):
         self.id = id
         self.type = type
@@ -26,30 +42,67 @@ class Node:
 
 
 class BranchNode(Node):
+    """
+    A branch either owns its children or, when created by a CompactTree, is a
+    view whose children are resolved from the tree's arrays on access.
+    """
+    __slots__ = ('_left_child', '_right_child', 'tree', 'level', 'index')
+
     def __init__(self, *args, **kwargs):
         super(BranchNode, self).__init__(id=kwargs['id'], max_byte_range=kwargs['max_byte_range'],
                                          byte_range=kwargs['byte_range'])
         self.type = "branch"
-        self.left_child = kwargs.get("left_child", None)
-        self.right_child = kwargs.get("right_child", None)
+        self._left_child = kwargs.get("left_child", None)
+        self._right_child = kwargs.get("right_child", None)
+        self.tree = kwargs.get("tree", None)
+        self.level = kwargs.get("level", 0)
+        self.index = kwargs.get("index", 0)
+
+    @property
+    def left_child(self):
+        if self._left_child is None and self.tree is not None:
+            return self.tree.node(self.level - 1, self.index * 2)
+
+        return self._left_child
+
+    @left_child.setter
+    def left_child(self, node):
+        self._left_child = node
+
+    @property
+    def right_child(self):
+        if self._right_child is None and self.tree is not None:
+            return self.tree.node(self.level - 1, self.index * 2 + 1)
+
+        return self._right_child
+
+    @right_child.setter
+    def right_child(self, node):
+        self._right_child = node
 
 
 class LeafNode(Node):
+    __slots__ = ('data_hash', 'min_byte_range')
+
     def __init__(self, *args, **kwargs):
         super(LeafNode, self).__init__(max_byte_range=kwargs['max_byte_range'])
         self.data_hash = kwargs['data_hash']
         self.min_byte_range = kwargs['min_byte_range']
-        self.id = hash([hash(self.data_hash), hash(int_to_buffer(self.max_byte_range))])
+        self.id = kwargs.get('id') or hash_leaf_id(self.data_hash, self.max_byte_range)
         self.type = "leaf"
 
 
 class TaggedChunk:
+    __slots__ = ('id', 'end')
+
     def __init__(self, tc_id, end):
         self.id = tc_id
         self.end = end
 
 
 class Chunk:
+    __slots__ = ('data_size', 'data_hash', 'min_byte_range', 'max_byte_range')
+
     def __init__(self, data_hash, data_size=0, min_byte_range=0, max_byte_range=0):
         self.data_size = data_size
         self.data_hash = data_hash
@@ -66,12 +119,16 @@ class Chunk:
 
 
 class HashNode:
+    __slots__ = ('id', 'max')
+
     def __init__(self, hn_id, max):
         self.id = hn_id
         self.max = max
 
 
 class Proof:
+    __slots__ = ('offset', 'proof')
+
     def __init__(self, offset, proof):
         self.offset = offset
         self.proof = proof
@@ -84,6 +141,8 @@ class Proof:
 
 
 class ValidatedPathResult:
+    __slots__ = ('offset', 'left_bound', 'right_bound', 'chunk_size')
+
     def __init__(self, offset, left_bound, right_bound, chunk_size):
         self.offset = offset
         self.left_bound = left_bound
@@ -91,40 +150,467 @@ class ValidatedPathResult:
         self.chunk_size = chunk_size
 
 
-def chunk_data(file_handler):
+class CompactTree:
+    """
+    Array backed merkle tree. Every layer is stored as one contiguous
+    bytearray of node ids plus an array('Q') of max_byte_range values, and
+    children are found by index (2i, 2i + 1) instead of object references. A
+    node that is promoted because its layer has an odd length is copied into
+    the layer above. The leaf data hashes are kept in a separate bytearray.
+
+    Node, Chunk and Proof objects are only created on demand as views.
+    """
+    __slots__ = ('data_hashes', 'layers')
+
+    def __init__(self, data_hashes, leaf_ids, leaf_offsets):
+        self.data_hashes = data_hashes
+        self.layers = [(leaf_ids, leaf_offsets)]
+
+        while len(self.layers[-1][1]) > 1:
+            self.layers.append(build_compact_layer(*self.layers[-1]))
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        data_hashes = bytearray()
+        leaf_ids = bytearray()
+        leaf_offsets = array('Q')
+
+        for chunk in chunks:
+            data_hashes += chunk.data_hash
+            leaf_ids += hash_leaf_id(chunk.data_hash, chunk.max_byte_range)
+            leaf_offsets.append(chunk.max_byte_range)
+
+        return cls(data_hashes, leaf_ids, leaf_offsets)
+
+    @classmethod
+    def from_file(cls, file_handler, workers=None):
+        return cls.from_chunks(iter_chunk_data(file_handler, workers=workers))
+
+    def __len__(self):
+        return len(self.layers[0][1])
+
+    def node_id(self, level, index):
+        return bytes(self.layers[level][0][index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def max_byte_range(self, level, index):
+        return self.layers[level][1][index]
+
+    def layer_size(self, level):
+        return len(self.layers[level][1])
+
+    def root_id(self):
+        if len(self) == 0:
+            return None
+
+        return self.node_id(len(self.layers) - 1, 0)
+
+    def root(self):
+        return self.node(len(self.layers) - 1, 0)
+
+    def data_hash(self, index):
+        return bytes(self.data_hashes[index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def chunk(self, index):
+        offsets = self.layers[0][1]
+        min_byte_range = offsets[index - 1] if index > 0 else 0
+
+        return Chunk(
+            self.data_hash(index),
+            data_size=offsets[index] - min_byte_range,
+            min_byte_range=min_byte_range,
+            max_byte_range=offsets[index]
+        )
+
+    def chunks(self):
+        return tuple(self.chunk(index) for index in range(len(self)))
+
+    def node(self, level, index):
+        # a promoted node is the same node as the one it was copied from
+        while level > 0 and index * 2 + 1 >= self.layer_size(level - 1):
+            level -= 1
+            index *= 2
+
+        if level == 0:
+            chunk = self.chunk(index)
+
+            return LeafNode(
+                id=self.node_id(0, index),
+                data_hash=chunk.data_hash,
+                min_byte_range=chunk.min_byte_range,
+                max_byte_range=chunk.max_byte_range
+            )
+
+        return BranchNode(
+            id=self.node_id(level, index),
+            byte_range=self.max_byte_range(level - 1, index * 2),
+            max_byte_range=self.max_byte_range(level, index),
+            tree=self,
+            level=level,
+            index=index
+        )
+
+    def proof(self, index):
+        return build_proof(
+            lambda level, position: (self.node_id(level, position), self.max_byte_range(level, position)),
+            [self.layer_size(level) for level in range(len(self.layers))],
+            index,
+            self.data_hash(index),
+            self.max_byte_range(0, index)
+        )
+
+    def close(self):
+        """Nothing to release, for the same interface as SpilledTree"""
+        pass
+
+
+def build_compact_layer(ids, offsets):
+    count = len(offsets)
+
+    layer_ids = bytearray()
+    layer_offsets = array('Q')
+
+    for i in range(0, count - 1, 2):
+        layer_ids += hash_branch_id(
+            ids[i * HASH_SIZE:(i + 1) * HASH_SIZE],
+            offsets[i],
+            ids[(i + 1) * HASH_SIZE:(i + 2) * HASH_SIZE]
+        )
+        layer_offsets.append(offsets[i + 1])
+
+    if count % 2 == 1:
+        layer_ids += ids[(count - 1) * HASH_SIZE:]
+        layer_offsets.append(offsets[count - 1])
+
+    return layer_ids, layer_offsets
+
+
+def build_proof(read_node, layer_sizes, index, data_hash, max_byte_range):
+    """
+    Builds the proof for leaf index bottom up: at every layer where the node
+    has a sibling the pair (left id, right id, left max_byte_range) is added.
+    :param read_node: function(level, index) returning (id, max_byte_range)
+    :param layer_sizes: node count of every layer, leaves first
+    :return: Proof
+    """
+    path = [data_hash + int_to_buffer(max_byte_range)]
+
+    position = index
+    for level, count in enumerate(layer_sizes[:-1]):
+        sibling = position ^ 1
+
+        if sibling < count:
+            left = min(position, sibling)
+            left_id, left_max_byte_range = read_node(level, left)
+            right_id, _ = read_node(level, left + 1)
+
+            path.append(left_id + right_id + int_to_buffer(left_max_byte_range))
+
+        position >>= 1
+
+    path.reverse()
+
+    return Proof(max_byte_range - 1, concat_buffers(path))
+
+
+class StreamingTreeBuilder:
+    """
+    Builds the merkle tree one leaf at a time. Only the roots of the completed
+    perfect subtrees are kept on a stack (like a binary counter), so the
+    data_root needs O(log n) memory. Folding the stack from the right at the
+    end gives the same tree as pairing each layer and promoting the odd node.
+
+    If a spill file is supplied each leaf is written to it as a fixed size
+    record (id + max_byte_range) for SpilledTree.
+    """
+
+    def __init__(self, spill=None):
+        self.stack = []
+        self.spill = spill
+        self.leaf_count = 0
+
+    def add_chunk(self, chunk):
+        self.add_leaf(chunk.data_hash, chunk.max_byte_range)
+
+    def add_leaf(self, data_hash, max_byte_range):
+        node_id = hash_leaf_id(data_hash, max_byte_range)
+
+        if self.spill is not None:
+            self.spill.write(pack_node_record(node_id, max_byte_range))
+
+        self.leaf_count += 1
+
+        height = 0
+        while self.stack and self.stack[-1][0] == height:
+            _, left_id, left_max_byte_range = self.stack.pop()
+            node_id = hash_branch_id(left_id, left_max_byte_range, node_id)
+            height += 1
+
+        self.stack.append((height, node_id, max_byte_range))
+
+    def root_id(self):
+        if not self.stack:
+            return None
+
+        _, node_id, max_byte_range = self.stack[-1]
+
+        for _, left_id, left_max_byte_range in reversed(self.stack[:-1]):
+            node_id = hash_branch_id(left_id, left_max_byte_range, node_id)
+
+        return node_id
+
+
+def pack_node_record(node_id, max_byte_range):
+    return node_id + max_byte_range.to_bytes(OFFSET_SIZE, byteorder='big')
+
+
+def unpack_node_record(record):
+    return record[:HASH_SIZE], int.from_bytes(record[HASH_SIZE:NODE_RECORD_SIZE], byteorder='big')
+
+
+def read_node_record(file_handler, index):
+    file_handler.seek(index * NODE_RECORD_SIZE)
+
+    return unpack_node_record(file_handler.read(NODE_RECORD_SIZE))
+
+
+def build_spilled_layers(spill, leaf_count):
+    """
+    Builds every layer above the spilled leaves, each into its own temporary
+    file, reading the layer below sequentially so memory use stays constant.
+    :param spill: file holding the leaf records
+    :param leaf_count:
+    :return: list of (file, node_count) from the leaves up to the root
+    """
+    layers = [(spill, leaf_count)]
+
+    while layers[-1][1] > 1:
+        below, below_count = layers[-1]
+        below.seek(0)
+
+        layer = tempfile.TemporaryFile()
+
+        for i in range(0, below_count - 1, 2):
+            left_id, left_max_byte_range = unpack_node_record(below.read(NODE_RECORD_SIZE))
+            right_id, right_max_byte_range = unpack_node_record(below.read(NODE_RECORD_SIZE))
+
+            layer.write(pack_node_record(
+                hash_branch_id(left_id, left_max_byte_range, right_id),
+                right_max_byte_range
+            ))
+
+        if below_count % 2 == 1:
+            layer.write(below.read(NODE_RECORD_SIZE))
+
+        layers.append((layer, (below_count + 1) // 2))
+
+    return layers
+
+
+class SpilledTree:
+    """
+    Disk backed merkle tree. The leaf records are written by a
+    StreamingTreeBuilder while the file is hashed, the data hashes go to their
+    own file and the layers above are built from the leaves afterwards, so
+    memory use does not grow with the size of the data. Proofs and chunks are
+    read back on demand with the same interface as CompactTree.
+    """
+
+    def __init__(self):
+        self.data_hashes = tempfile.TemporaryFile()
+        self.builder = StreamingTreeBuilder(spill=tempfile.TemporaryFile())
+        self.layers = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        tree = cls()
+
+        for chunk in chunks:
+            tree.add_chunk(chunk)
+
+        tree.finish()
+
+        return tree
+
+    @classmethod
+    def from_file(cls, file_handler, workers=None):
+        return cls.from_chunks(iter_chunk_data(file_handler, workers=workers))
+
+    def add_chunk(self, chunk):
+        self.data_hashes.write(chunk.data_hash)
+        self.builder.add_chunk(chunk)
+
+    def finish(self):
+        self.layers = build_spilled_layers(self.builder.spill, self.builder.leaf_count)
+
+    def __len__(self):
+        return self.builder.leaf_count
+
+    def layer_size(self, level):
+        return self.layers[level][1]
+
+    def root_id(self):
+        return self.builder.root_id()
+
+    def read_node(self, level, index):
+        with self.lock:
+            return read_node_record(self.layers[level][0], index)
+
+    def data_hash(self, index):
+        with self.lock:
+            self.data_hashes.seek(index * HASH_SIZE)
+
+            return self.data_hashes.read(HASH_SIZE)
+
+    def chunk(self, index):
+        _, max_byte_range = self.read_node(0, index)
+        min_byte_range = self.read_node(0, index - 1)[1] if index > 0 else 0
+
+        return Chunk(
+            self.data_hash(index),
+            data_size=max_byte_range - min_byte_range,
+            min_byte_range=min_byte_range,
+            max_byte_range=max_byte_range
+        )
+
+    def proof(self, index):
+        return build_proof(
+            self.read_node,
+            [count for _, count in self.layers],
+            index,
+            self.data_hash(index),
+            self.read_node(0, index)[1]
+        )
+
+    def close(self):
+        self.data_hashes.close()
+        self.builder.spill.close()
+
+        for layer, _ in (self.layers or [])[1:]:
+            layer.close()
+
+
+class TreeSequence(Sequence):
+    """
+    Read only sequence over the leaves of a CompactTree or SpilledTree that
+    creates each item when it is accessed, so the chunks and proofs of a
+    transaction never have to be materialised all at once.
+    """
+    __slots__ = ('tree',)
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("leaf index out of range")
+
+        return self.get(index)
+
+    def get(self, index):
+        raise NotImplementedError
+
+
+class TreeChunks(TreeSequence):
+    __slots__ = ()
+
+    def get(self, index):
+        return self.tree.chunk(index)
+
+
+class TreeProofs(TreeSequence):
+    __slots__ = ()
+
+    def get(self, index):
+        return self.tree.proof(index)
+
+
+def chunk_data(file_handler, workers=None):
     """
     Takes the input data and chunks it into (mostly) equal sized chunks.
     The last chunk will be a bit smaller as it contains the remainder
     from the chunking process.
     :param file_handler:
+    :param workers: number of hashing threads, None or 1 hashes on this thread
     :return: chunks
     """
-    chunks = [];
-    chadd = chunks.append
+    return tuple(iter_chunk_data(file_handler, workers=workers))  # lets make this a fast processing tuple for later!
 
-    cursor = 0
 
-    for chunk in read_file_chunks(file_handler, MAX_CHUNK_SIZE):
-        data_hash = hashlib.sha256(chunk).digest()
+def iter_chunk_data(file_handler, workers=None, start=None):
+    """
+    Generator version of chunk_data so callers can consume the chunks as they
+    are hashed. When workers > 1 the chunks are hashed on a thread pool
+    (hashlib releases the GIL for large buffers) while the file is read
+    ahead, keeping at most HASH_WINDOW_PER_WORKER chunks per worker in flight.
+    Chunks are always yielded in file order. Regular files are memory mapped
+    so the hashing reads straight from the page cache without copies.
+    :param file_handler: file like object or data source
+    :param workers:
+    :param start: byte offset to seek to first, chunk byte ranges then count from the start of the file
+    :return: generator of Chunk
+    """
+    with opened_data_source(file_handler) as data_source:
+        if start is not None:
+            getattr(data_source, 'file_handler', data_source).seek(start)
 
-        cursor += len(chunk)
+        if workers is None or workers < 2:
+            cursor = start or 0
 
-        chadd(
-            Chunk(
-                data_hash,
-                data_size=len(chunk),
-                min_byte_range=cursor - len(chunk),
-                max_byte_range=cursor
-            )
-        )
+            for chunk in data_source.iter_chunks(MAX_CHUNK_SIZE):
+                cursor += len(chunk)
+
+                yield make_chunk(chunk, cursor - len(chunk))
 
-    return tuple(chunks)  # lets make this a fast processing tuple for later!
+            return
 
+        window = workers * HASH_WINDOW_PER_WORKER
+        pending = deque()
 
-def compute_root_hash(file_handler):
-    root_node = generate_tree(file_handler)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            cursor = start or 0
 
-    return root_node.id
+            for chunk in data_source.iter_chunks(MAX_CHUNK_SIZE):
+                pending.append(executor.submit(make_chunk, chunk, cursor))
+                cursor += len(chunk)
+
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+
+def make_chunk(data, min_byte_range):
+    return Chunk(
+        hashlib.sha256(data).digest(),
+        data_size=len(data),
+        min_byte_range=min_byte_range,
+        max_byte_range=min_byte_range + len(data)
+    )
+
+
+def compute_root_hash(file_handler, workers=None, cache=None):
+    """
+    Computes the data_root in a single pass. With workers > 1 the chunk
+    hashing runs on a thread pool while the tree is folded on this thread.
+    With a tree_cache.TreeCache the leaves of a file hashed before are reused.
+    """
+    builder = StreamingTreeBuilder()
+
+    for chunk in cached_chunk_data(file_handler, workers, cache):
+        builder.add_chunk(chunk)
+
+    return builder.root_id()
 
 
 def generate_leaves(chunks):
@@ -141,31 +627,28 @@ def generate_leaves(chunks):
 
 
 def generate_tree(file_handler):
-    root_node = build_layers(generate_leaves(chunk_data(file_handler)))
+    root_node = CompactTree.from_file(file_handler).root()
 
     return root_node
 
 
 def build_layers(nodes, level=0):
-    nodes_lenth = len(nodes)
-
-    if nodes_lenth < 2:
-        left = nodes[0]
-        right = None if nodes_lenth == 1 else nodes[1]
-        root = hash_branch(left, right)
+    while len(nodes) > 1:
+        nodes_lenth = len(nodes)
 
-        return root
+        next_layer = [];
+        nadd = next_layer.append
 
-    next_layer = [];
-    nadd = next_layer.append
+        for i in range(0, nodes_lenth, 2):
+            left = nodes[i]
+            right = None if i + 1 > (nodes_lenth - 1) else nodes[i + 1]
 
-    for i in range(0, nodes_lenth, 2):
-        left = nodes[i]
-        right = None if i + 1 > (nodes_lenth - 1) else nodes[i + 1]
+            nadd(hash_branch(left, right))
 
-        nadd(hash_branch(left, right))
+        nodes = next_layer
+        level += 1
 
-    return build_layers(next_layer, level + 1)
+    return nodes[0]
 
 
 def generate_proofs(root):
@@ -180,24 +663,266 @@ def generate_proofs(root):
     return flatten_tuple(proofs)
 
 
-def generate_transaction_chunks(file_handler):
-    chunks = chunk_data(file_handler)
-    leaves = generate_leaves(chunks)
-    root = build_layers(leaves)
-    proofs = generate_proofs(root)
+def cached_chunk_data(file_handler, workers=None, cache=None):
+    """iter_chunk_data, served from and recorded into cache when the file can be cached"""
+    key = cache.key(file_handler) if cache is not None else None
+
+    if key is None:
+        return iter_chunk_data(file_handler, workers=workers)
+
+    chunks = cache.load(key, file_handler)
+
+    if chunks is not None:
+        return chunks
+
+    return cache.record(key, iter_chunk_data(file_handler, workers=workers))
+
+
+def source_size(file_handler):
+    """Size of the data behind a file handler or data source, None when it cannot be told (pipes, sockets)"""
+    size = getattr(file_handler, 'size', None)
+
+    if size is not None:
+        return size
 
-    last_chunk = chunks[-1]
-    if last_chunk.max_byte_range - last_chunk.min_byte_range == 0:
-        chunks = chunks[:-1]
-        proofs = proofs[:-1]
+    handler = getattr(file_handler, 'file_handler', file_handler)
+
+    if isinstance(handler, io.BytesIO):
+        with handler.getbuffer() as view:
+            return view.nbytes
+
+    try:
+        file_stat = os.fstat(handler.fileno())
+    except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+        return None
+
+    return file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else None
+
+
+def generate_transaction_chunks(file_handler, workers=None, spill=None, cache=None):
+    """
+    Reads the file once to build the merkle tree. The chunks and proofs are
+    returned as lazy sequences over the tree, each proof is computed from the
+    stored layer hashes in O(log n) when it is accessed.
+
+    The tree is held in memory as a CompactTree unless the data has more than
+    SPILL_LEAF_COUNT chunks or its size cannot be told, then it is a
+    SpilledTree in temporary files so memory stays constant however big the
+    file is. Close the tree (or the Transaction holding it) when done.
+    :param file_handler:
+    :param workers: number of chunk hashing threads
+    :param spill: True or False to force the choice of tree
+    :param cache: optional tree_cache.TreeCache
+    :return: dict of data_root, chunks, proofs and the tree
+    """
+    if spill is None:
+        size = source_size(file_handler)
+        spill = size is None or size > SPILL_LEAF_COUNT * MAX_CHUNK_SIZE
+
+    chunks = cached_chunk_data(file_handler, workers, cache)
+
+    if spill:
+        tree = SpilledTree.from_chunks(chunks)
+    else:
+        tree = CompactTree.from_chunks(chunks)
+
+    return tree_transaction_chunks(tree)
+
+
+def tree_transaction_chunks(tree):
+    """The generate_transaction_chunks result for an already built tree"""
+    if len(tree) == 0:
+        return {
+            "data_root": b'',
+            "chunks": (),
+            "proofs": (),
+            "tree": tree
+        }
 
     return {
-        "data_root": root.id,
-        "chunks": chunks,
-        "proofs": proofs
+        "data_root": tree.root_id(),
+        "chunks": TreeChunks(tree),
+        "proofs": TreeProofs(tree),
+        "tree": tree
     }
 
 
+class IncrementalTree:
+    """
+    Right edge frontier of the merkle tree of an append-only file: the roots
+    of the perfect subtrees over its full chunks, as kept on the
+    StreamingTreeBuilder stack. Chunk boundaries are fixed, so those nodes
+    never change when data is appended; extend only reads the data after the
+    last full chunk (the old partial tail chunk plus the new bytes) and
+    computes the new data_root and the proofs of the new chunks from the
+    frontier, in time proportional to the data appended.
+
+    Store it between runs with to_dict / from_dict.
+    """
+
+    def __init__(self, leaf_count=0, frontier=()):
+        self.leaf_count = leaf_count
+        self.frontier = list(frontier)  # (height, node_id, max_byte_range), largest subtree first
+
+    @property
+    def data_size(self):
+        """Bytes covered by the frontier, extend reads from here"""
+        return self.leaf_count * MAX_CHUNK_SIZE
+
+    @classmethod
+    def from_file(cls, file_handler, workers=None):
+        tree = cls()
+        tree.extend(file_handler, workers=workers)
+
+        return tree
+
+    def to_dict(self):
+        return {
+            "leaf_count": self.leaf_count,
+            "frontier": [
+                [height, base64url_encode(node_id).decode(), max_byte_range]
+                for height, node_id, max_byte_range in self.frontier
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['leaf_count'], [
+            (height, base64url_decode(node_id.encode()), max_byte_range)
+            for height, node_id, max_byte_range in data['frontier']
+        ])
+
+    def frontier_node(self, height):
+        for node_height, node_id, max_byte_range in self.frontier:
+            if node_height == height:
+                return node_id, max_byte_range
+
+        return None
+
+    def extend(self, file_handler, workers=None):
+        """
+        Hashes the file from data_size to its end and moves the frontier up
+        to the last full chunk.
+        :return: dict of data_root, chunks and proofs of the chunks after
+            the old frontier, and first_index, the leaf index of chunks[0]
+        """
+        first_index = self.leaf_count
+        chunks = list(iter_chunk_data(file_handler, workers=workers, start=self.data_size))
+
+        if not chunks:
+            builder = StreamingTreeBuilder()
+            builder.stack = list(self.frontier)
+
+            return {"data_root": builder.root_id(), "chunks": [], "proofs": [], "first_index": first_index}
+
+        layers = self.partial_layers(chunks)
+        layer_sizes = [base + len(offsets) for base, _, offsets in layers]
+
+        def read_node(level, index):
+            base, ids, offsets = layers[level]
+            position = index - base
+
+            return bytes(ids[position * HASH_SIZE:(position + 1) * HASH_SIZE]), offsets[position]
+
+        proofs = [
+            build_proof(read_node, layer_sizes, first_index + i, chunk.data_hash, chunk.max_byte_range)
+            for i, chunk in enumerate(chunks)
+        ]
+
+        builder = StreamingTreeBuilder()
+        builder.stack = list(self.frontier)
+        builder.leaf_count = self.leaf_count
+
+        for chunk in chunks:
+            if chunk.data_size < MAX_CHUNK_SIZE:
+                break
+
+            builder.add_chunk(chunk)
+
+        self.leaf_count = builder.leaf_count
+        self.frontier = builder.stack
+
+        return {
+            "data_root": read_node(len(layers) - 1, 0)[0],
+            "chunks": chunks,
+            "proofs": proofs,
+            "first_index": first_index
+        }
+
+    def partial_layers(self, chunks):
+        """
+        The layers of the new tree from the first node that is not entirely
+        left of the new leaves: (base index, ids, max_byte_ranges) per level.
+        A base is always even so build_compact_layer pairs nodes as the full
+        tree does; the old left sibling a base needs is a frontier node.
+        """
+        leaf_ids = bytearray()
+        leaf_offsets = array('Q')
+
+        for chunk in chunks:
+            leaf_ids += hash_leaf_id(chunk.data_hash, chunk.max_byte_range)
+            leaf_offsets.append(chunk.max_byte_range)
+
+        first = self.leaf_count
+        level = 0
+        layers = []
+        ids, offsets = leaf_ids, leaf_offsets
+
+        while True:
+            if first % 2 == 1:
+                node_id, max_byte_range = self.frontier_node(level)
+                ids = bytearray(node_id) + ids
+                offsets = array('Q', [max_byte_range]) + offsets
+
+            layers.append((first - first % 2, ids, offsets))
+
+            if first - first % 2 + len(offsets) == 1:
+                return layers
+
+            ids, offsets = build_compact_layer(ids, offsets)
+            first //= 2
+            level += 1
+
+
+def write_tree_leaves(tree, file_handler):
+    """
+    Writes the leaves of a tree (data hash and max_byte_range, one
+    NODE_RECORD_SIZE record each) to file_handler. The whole tree can be
+    rebuilt from them with read_tree_leaves without reading the data again.
+    :return: number of leaves written
+    """
+    for index in range(len(tree)):
+        chunk = tree.chunk(index)
+        file_handler.write(pack_node_record(chunk.data_hash, chunk.max_byte_range))
+
+    return len(tree)
+
+
+def read_tree_leaves(file_handler):
+    """Generator of the Chunks stored with write_tree_leaves"""
+    min_byte_range = 0
+
+    while True:
+        record = file_handler.read(NODE_RECORD_SIZE)
+
+        if len(record) < NODE_RECORD_SIZE:
+            if record:
+                raise ValueError("Truncated leaf record")
+
+            return
+
+        data_hash, max_byte_range = unpack_node_record(record)
+
+        yield Chunk(
+            data_hash,
+            data_size=max_byte_range - min_byte_range,
+            min_byte_range=min_byte_range,
+            max_byte_range=max_byte_range
+        )
+
+        min_byte_range = max_byte_range
+
+
 def flatten_tuple(inputs):
     flat = [];
     fadd = flat.append
@@ -213,39 +938,66 @@ def flatten_tuple(inputs):
 
 def flatten_list(inputs):
     flat = [];
-    fadd = flat.append;
-    fexd = flat.extend
+    fadd = flat.append
+
+    stack = [iter(inputs)]
+
+    while stack:
+        for item in stack[-1]:
+            if type(item) == list:
+                stack.append(iter(item))
+                break
 
-    for item in inputs:
-        if type(item) == list:
-            fexd(flatten_list(item))
-        else:
             fadd(item)
+        else:
+            stack.pop()
 
     return flat
 
 
 def resolve_branch_proofs(node, proof=b'', depth=0):
+    """
+    Walks the tree depth first with an explicit stack. A leaf gives a single
+    Proof, a branch gives the list of proofs for all of its leaves in order.
+    """
     if node.type == "leaf":
         return Proof(
             node.max_byte_range - 1,
             concat_buffers([proof, node.data_hash, int_to_buffer(node.max_byte_range)])
         )
 
-    if node.type == "branch":
+    proofs = [];
+    padd = proofs.append
+
+    stack = [(node, proof)]
+
+    while stack:
+        node, proof = stack.pop()
+
+        if node.type == "leaf":
+            padd(Proof(
+                node.max_byte_range - 1,
+                concat_buffers([proof, node.data_hash, int_to_buffer(node.max_byte_range)])
+            ))
+            continue
+
+        if node.type != "branch":
+            raise NodeTypeException("Unexpected node type")
+
+        left_child = node.left_child
+        right_child = node.right_child
+
         partial_proof = concat_buffers([
             proof,
-            node.left_child.id,
-            node.right_child.id,
+            left_child.id,
+            right_child.id,
             int_to_buffer(node.byte_range)
         ])
 
-        return [
-            resolve_branch_proofs(node.left_child, partial_proof, depth + 1),
-            resolve_branch_proofs(node.right_child, partial_proof, depth + 1),
-        ]
+        stack.append((right_child, partial_proof))
+        stack.append((left_child, partial_proof))
 
-    raise NodeTypeException("Unexpected node type")
+    return proofs
 
 
 def hash_branch(left, right=None):
@@ -267,6 +1019,14 @@ def hash_branch(left, right=None):
     )
 
 
+def hash_leaf_id(data_hash, max_byte_range):
+    return hash([hash(data_hash), hash(int_to_buffer(max_byte_range))])
+
+
+def hash_branch_id(left_id, left_max_byte_range, right_id):
+    return hash([hash(left_id), hash(right_id), hash(int_to_buffer(left_max_byte_range))])
+
+
 def hash_leaf(data, note):
     return HashNode(
         hash([hash(data), hash(note_to_buffer(note))]),
@@ -276,150 +1036,167 @@ def hash_leaf(data, note):
 
 def hash(data):
     if type(data) == list:
-        byte_str = b''
-        for line in data:
-            byte_str += line
-
-        data = byte_str
+        data = b''.join(data)
 
-    digest = hashlib.sha256(data).digest()
-    b64_str = base64url_encode(digest)
-    return digest
+    return hashlib.sha256(data).digest()
 
 
+@functools.lru_cache(maxsize=NOTE_CACHE_SIZE)
 def note_to_buffer(note):
-    buffer = b"\x00" * NOTE_SIZE
-    buffer = bytearray(buffer)
-
-    for i in range(NOTE_SIZE - 1, 0, -1):
-        if i > 0:
-            if note > 0:
-                buffer[i] = note.to_bytes(4, byteorder='big')[-1]
-                note = note >> 8
-            else:
-                break
-        else:
-            break
-
-    return bytes(buffer)
+    return note.to_bytes(NOTE_SIZE, byteorder='big')
 
 
+@functools.lru_cache(maxsize=NOTE_CACHE_SIZE)
 def int_to_buffer(note):
-    buffer = b"\x00" * NOTE_SIZE
-    buffer = bytearray(buffer)
-
-    for i in range(NOTE_SIZE - 1, 0, -1):
-        byte_val = note % 256
-        buffer[i] = int(byte_val)
-        note = int((note - byte_val) / 256)
-
-    return buffer
+    return note.to_bytes(NOTE_SIZE, byteorder='big')
 
 
 def buffer_to_int(buffer):
-    value = 0
-
-    for byte_val in buffer:
-        value *= 256
-        value += byte_val
-
-    return value
+    return int.from_bytes(buffer, byteorder='big')
 
 
 def array_compare(a, b):
     functools.reduce(lambda x, y: x and y, map(lambda p, q: p == q, a, b), True)
 
 
-def validate_path(id, dest, left_bound, right_bound, path):
-    if right_bound < 0:
-        return False
+def validate_path(id, dest, left_bound, right_bound, path, verified=None):
+    """
+    Checks that path proves the chunk containing dest under the root id.
+    :param verified: optional dict of node id -> branch segment already
+        checked against that id, shared between calls to skip re-hashing
+    :return: ValidatedPathResult or False
+    """
+    branch_size = HASH_SIZE * 2 + NOTE_SIZE
+
+    while True:
+        if right_bound < 0:
+            return False
+
+        if dest > right_bound:
+            dest, left_bound = 0, right_bound - 1
+            continue
 
-    if dest > right_bound:
-        return validate_path(id, 0, right_bound - 1, right_bound, path)
+        if dest < 0:
+            dest, left_bound = 0, 0
+            continue
 
-    if dest < 0:
-        return validate_path(id, 0, 0, right_bound, path)
+        if len(path) == HASH_SIZE + NOTE_SIZE:
+            path_data = path[0:HASH_SIZE]
+            path_data_length = len(path_data)
+            end_offset_buffer = path[path_data_length:path_data_length + NOTE_SIZE]
 
-    if len(path) == HASH_SIZE + NOTE_SIZE:
-        path_data = path[0:HASH_SIZE]
-        path_data_length = len(path_data)
-        end_offset_buffer = path[path_data_length:path_data_length + NOTE_SIZE]
+            path_data_hash = hash([
+                hash(path_data),
+                hash(end_offset_buffer)
+            ])
 
-        path_data_hash = hash([
-            hash(path_data),
-            hash(end_offset_buffer)
-        ])
+            result = id == path_data_hash
 
-        result = id == path_data_hash
+            if result:
+                return ValidatedPathResult(right_bound - 1, left_bound, right_bound, right_bound - left_bound)
 
-        if result:
-            return ValidatedPathResult(right_bound - 1, left_bound, right_bound, right_bound - left_bound)
+            return False
 
-        return False
+        left = path[:HASH_SIZE]
+        left_length = len(left)
+        right = path[left_length: left_length + HASH_SIZE]
+        right_length = len(right)
 
-    left = path[:HASH_SIZE]
-    left_length = len(left)
-    right = path[left_length: left_length + HASH_SIZE]
-    right_length = len(right)
+        offset_buffer = path[left_length + right_length: left_length + right_length + NOTE_SIZE]
+        offset = buffer_to_int(offset_buffer)
 
-    offset_buffer = path[left_length + right_length: left_length + right_length + NOTE_SIZE]
-    offset = buffer_to_int(offset_buffer)
+        remainder = path[left_length + right_length + len(offset_buffer):]
+
+        if verified is not None and len(path) >= branch_size and verified.get(bytes(id)) == path[:branch_size]:
+            path_hash = id
+        else:
+            path_hash = hash([
+                hash(left),
+                hash(right),
+                hash(offset_buffer)
+            ])
 
-    remainder = path[left_length + right_length + len(offset_buffer):]
+            if verified is not None and id == path_hash:
+                verified[bytes(id)] = bytes(path[:branch_size])
 
-    path_hash = hash([
-        hash(left),
-        hash(right),
-        hash(offset_buffer)
-    ])
+        if id != path_hash:
+            return False
 
-    if id == path_hash:
         if dest < offset:
-            return validate_path(
-                left,
-                dest,
-                left_bound,
-                min(right_bound, offset),
-                remainder
-            )
+            id, right_bound = left, min(right_bound, offset)
+        else:
+            id, left_bound = right, max(left_bound, offset)
+
+        path = remainder
 
-        return validate_path(
-            right,
-            dest,
-            max(left_bound, offset),
-            right_bound,
-            remainder
-        )
 
-    return False
+class BatchPathVerifier:
+    """
+    Validates many (offset, data_path) pairs against one data_root. Branches
+    near the root are shared by neighbouring chunks, so every branch that has
+    been verified is remembered and later paths only need a byte comparison
+    for it instead of re-hashing. When chunk data is supplied its hash is
+    checked against the leaf of the path as well, which is what a downloader
+    needs to trust chunks coming from a gateway.
+    """
+
+    def __init__(self, data_root, data_size, max_cached_nodes=1 << 20):
+        self.data_root = data_root
+        self.data_size = int(data_size)
+        self.max_cached_nodes = max_cached_nodes
+        self.verified = {}
+
+    def validate(self, offset, data_path, chunk=None):
+        if len(self.verified) > self.max_cached_nodes:
+            self.verified = {}
+
+        result = validate_path(self.data_root, int(offset), 0, self.data_size, data_path, verified=self.verified)
+
+        if not result or chunk is None:
+            return result
+
+        if len(chunk) != result.chunk_size:
+            return False
+
+        if hashlib.sha256(chunk).digest() != data_path[-(HASH_SIZE + NOTE_SIZE):-NOTE_SIZE]:
+            return False
+
+        return result
+
+    def validate_many(self, items):
+        """
+        :param items: iterable of (offset, data_path) or (offset, data_path, chunk)
+        :return: list of ValidatedPathResult or False, one per item
+        """
+        return [self.validate(*item) for item in items]
 
 
 def debug(proof, output=""):
-    if len(proof) < 1:
-        return output
-
-    left = proof[:HASH_SIZE]
-    right = proof[len(left):len(left) + HASH_SIZE]
-    offset_buffer = proof[
-                    len(left) + len(right): len(left) + len(right) + HASH_SIZE
-                    ]
-
-    offset = buffer_to_int(offset_buffer)
-
-    remainder = proof[:len(left) + len(right) + len(offset_buffer)]
-
-    path_hash = hash([
-        hash(left),
-        hash(right),
-        hash(offset_buffer)
-    ])
-
-    updated_output = "{}\n{},{},{} => {}".format(
-        output,
-        bytearray(left),
-        bytearray(right),
-        offset,
-        bytearray(path_hash)
-    )
+    while len(proof) > 0:
+        left = proof[:HASH_SIZE]
+        right = proof[len(left):len(left) + HASH_SIZE]
+        offset_buffer = proof[
+                        len(left) + len(right): len(left) + len(right) + NOTE_SIZE
+                        ]
+
+        offset = buffer_to_int(offset_buffer)
+
+        remainder = proof[len(left) + len(right) + len(offset_buffer):]
+
+        path_hash = hash([
+            hash(left),
+            hash(right),
+            hash(offset_buffer)
+        ])
+
+        output = "{}\n{},{},{} => {}".format(
+            output,
+            bytearray(left),
+            bytearray(right),
+            offset,
+            bytearray(path_hash)
+        )
+
+        proof = remainder
 
-    return debug(remainder, updated_output)
+    return output
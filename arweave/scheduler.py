@@ -0,0 +1,190 @@
+import time
+import random
+import threading
+from collections import deque
+
+RETRY_BASE_DELAY = 1.0  # seconds before the first retry, doubled for every further attempt
+RETRY_MAX_DELAY = 40.0  # seconds
+RETRY_JITTER = 0.3
+
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 64
+LATENCY_TOLERANCE = 2.0  # latency above this multiple of the base latency counts as congestion
+DECREASE_FACTOR = 0.5
+LATENCY_SMOOTHING = 0.2
+BASE_LATENCY_WINDOW = 100  # completions the base latency is the minimum over, so it follows a lasting drift
+
+THROTTLE_STATUSES = (429, 502, 503, 504)
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, maximum=RETRY_MAX_DELAY, jitter=RETRY_JITTER):
+    """
+    Seconds to wait before retry number attempt (from 1): exponential from
+    base, capped at maximum, less up to jitter of itself so clients that
+    failed together do not retry together.
+    """
+    delay = min(maximum, base * 2 ** max(0, attempt - 1))
+
+    return delay - delay * random.random() * jitter
+
+
+class TokenBucket(object):
+    """
+    Bytes per second cap shared by every upload that uses it. reserve takes
+    the bytes out straight away, going into debt if needed, and returns how
+    long the caller must wait before sending them, so the same bucket works
+    for threads (acquire) and coroutines (await asyncio.sleep(reserve(n))).
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def acquire(self, size):
+        delay = self.reserve(size)
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency(object):
+    """
+    AIMD limit on the number of requests in flight. Every limit successful
+    requests the limit grows by one; a throttling response, a network error
+    or a latency above LATENCY_TOLERANCE times the lowest smoothed latency
+    of the last BASE_LATENCY_WINDOW completions halves it, at most once per limit completions so a burst of
+    failures from one window only counts once. With minimum == maximum it is
+    a fixed limit.
+    """
+
+    def __init__(self, initial=8, minimum=DEFAULT_MIN_CONCURRENCY, maximum=DEFAULT_MAX_CONCURRENCY,
+                 latency_tolerance=LATENCY_TOLERANCE):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.limit = max(minimum, min(maximum, initial))
+        self.window = self.limit
+        self.successes = 0
+        self.since_decrease = self.limit
+        self.latency = None
+        self.base_latency = None
+        self.recent_latencies = deque(maxlen=BASE_LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def on_success(self, latency):
+        with self.lock:
+            self.since_decrease += 1
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+
+            # a window rather than an all time minimum, one lucky fast sample would hold the limit down forever
+            self.recent_latencies.append(self.latency)
+            self.base_latency = min(self.recent_latencies)
+
+            if self.latency > self.base_latency * self.latency_tolerance:
+                self.decrease()
+                return
+
+            self.successes += 1
+
+            if self.successes >= self.limit:
+                self.successes = 0
+                self.limit = min(self.maximum, self.limit + 1)
+
+    def on_error(self):
+        with self.lock:
+            self.since_decrease += 1
+            self.decrease()
+
+    def decrease(self):
+        if self.since_decrease < self.limit:
+            return
+
+        self.limit = max(self.minimum, int(self.limit * DECREASE_FACTOR))
+        self.successes = 0
+        self.since_decrease = 0
+
+        # the latency seen at the old limit says nothing about the new one
+        self.latency = self.base_latency
+
+
+class UploadScheduler(object):
+    """
+    Decides how many chunk uploads run at once (AdaptiveConcurrency), paces
+    the bytes sent (an optional TokenBucket, shared process wide by default,
+    see set_rate_limit) and how long to back off after an error. Pass one
+    to TransactionUploader.upload_chunks; several uploads may share it.
+    """
+
+    def __init__(self, concurrency=None, rate_limiter=None, retry_base_delay=RETRY_BASE_DELAY,
+                 retry_max_delay=RETRY_MAX_DELAY):
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.rate_limiter = rate_limiter
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+    @classmethod
+    def fixed(cls, concurrency, **kwargs):
+        return cls(AdaptiveConcurrency(concurrency, minimum=concurrency, maximum=concurrency), **kwargs)
+
+    @property
+    def limit(self):
+        return self.concurrency.limit
+
+    @property
+    def maximum(self):
+        return self.concurrency.maximum
+
+    def send_delay(self, size):
+        """Seconds to wait before sending size bytes"""
+        limiter = self.rate_limiter or get_rate_limiter()
+
+        if limiter is None:
+            return 0.0
+
+        return limiter.reserve(size)
+
+    def retry_delay(self, attempt):
+        return backoff_delay(attempt, base=self.retry_base_delay, maximum=self.retry_max_delay)
+
+    def on_response(self, status_code, latency):
+        if status_code == 200:
+            self.concurrency.on_success(latency)
+        elif status_code in THROTTLE_STATUSES:
+            self.concurrency.on_error()
+
+    def on_error(self):
+        self.concurrency.on_error()
+
+
+_rate_limiter = None
+
+
+def set_rate_limit(bytes_per_second, burst=None):
+    """Caps the upload rate of every scheduler in the process that has no limiter of its own, None removes it"""
+    global _rate_limiter
+
+    _rate_limiter = TokenBucket(bytes_per_second, burst) if bytes_per_second else None
+
+
+def get_rate_limiter():
+    return _rate_limiter
@@ -0,0 +1,68 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from .arweave_lib import Wallet, prefetch_transactions
+
+logger = logging.getLogger(__name__)
+
+_worker_wallets = {}
+
+
+def _init_signing_worker(jwk_by_address):
+    # parse every key once per worker process rather than once per transaction
+    for address, jwk_data in jwk_by_address.items():
+        _worker_wallets[address] = Wallet.from_data(dict(jwk_data))
+
+
+def _sign_message(task):
+    address, message = task
+
+    return _worker_wallets[address].sign(message)
+
+
+def sign_messages(tasks, jwk_by_address, workers=None):
+    """
+    Signs (address, message) tasks on a process pool whose workers load
+    each wallet key in jwk_by_address once.
+    :return: list of raw signatures in task order
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_signing_worker,
+                             initargs=(jwk_by_address,)) as executor:
+        return list(executor.map(_sign_message, tasks, chunksize=chunksize))
+
+
+def sign_transactions(transactions, workers=None, prefetch=True):
+    """
+    Signs many transactions across a process pool. The signature data
+    (deep hash) is built here, then the RSA-PSS signatures are computed by
+    worker processes that each load the wallet keys once. The signature and
+    id of every transaction are set exactly as Transaction.sign() sets them.
+
+    Missing anchors and rewards are fetched first in one batch with
+    prefetch_transactions, pass prefetch=False to sign fully offline.
+    :param transactions: list of Transaction instances
+    :param workers: number of processes, defaults to the cpu count
+    :return: transactions
+    """
+    if len(transactions) == 0:
+        return transactions
+
+    if prefetch:
+        prefetch_transactions(transactions)
+
+    tasks = []
+    jwk_by_address = {}
+
+    for tx in transactions:
+        jwk_by_address.setdefault(tx.wallet.address, tx.jwk_data)
+        tasks.append((tx.wallet.address, tx.get_signature_data()))
+
+    for tx, raw_signature in zip(transactions, sign_messages(tasks, jwk_by_address, workers)):
+        tx.set_signature(raw_signature)
+
+    logger.debug("signed {} transactions".format(len(transactions)))
+
+    return transactions
@@ -1,13 +1,18 @@
+import io
+import os
 import json
-import arrow
-import random
 import time
+import threading
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from jose.utils import base64url_encode, base64url_decode
 from .arweave_lib import Transaction
 from .utils import *
-from .merkle import validate_path, CHUNK_SIZE
+from .merkle import BatchPathVerifier, CHUNK_SIZE, MAX_CHUNK_SIZE
+from .file_io import opened_data_source
+from .http_client import get_default_client
+from .scheduler import UploadScheduler, backoff_delay, get_rate_limiter
 from .arweave_lib import API_URL
 
 try:
@@ -25,6 +30,18 @@ FATAL_CHUNK_UPLOAD_ERRORS = ['invalid_json', 'chunk_too_big', 'data_path_too_big
 
 ERROR_DELAY = 1000 * 40
 
+MAX_CHUNK_ERRORS = 100
+
+DEFAULT_UPLOAD_CONCURRENCY = 8
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+
+MAX_DOWNLOAD_ERRORS = 10
+
+DOWNLOAD_ERROR_DELAY = 1  # seconds, multiplied by the number of failed attempts
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Accept': 'application/json, text/plain, */*'}
+
 
 class TransactionUploaderException(Exception):
     pass
@@ -40,12 +57,20 @@ class TransactionUploader:
         self.last_response_error = kwargs.get('last_response_error', '')
         self.transaction.data = b''  # zero out data for serialization
         self.file_handler = kwargs['file_handler']
+        self.client = kwargs.get('client', None) or getattr(self.transaction, 'client', None) or get_default_client()
         self.total_errors = 0
         self.data = None
+        self.path_verifier = None
+        self.completed_chunks = set(kwargs.get('completed_chunks', range(self.chunk_index)))
+        self.uploaded_bytes = 0
+        self.upload_started = None
+        self.lock = threading.Lock()
+        self.journal = kwargs.get('journal', None)
+        self.scheduler = kwargs.get('scheduler', None)
 
     @property
     def is_complete(self):
-        return self.tx_posted and self.chunk_index == len(self.transaction.chunks.get("chunks"))
+        return self.tx_posted and len(self.completed_chunks) == self.total_chunks
 
     @property
     def total_chunks(self):
@@ -53,7 +78,17 @@ class TransactionUploader:
 
     @property
     def uploaded_chunks(self):
-        return self.chunk_index
+        return len(self.completed_chunks)
+
+    @property
+    def throughput(self):
+        """Average upload rate of the chunk data in bytes per second"""
+        if self.upload_started is None:
+            return 0
+
+        elapsed = time.time() - self.upload_started
+
+        return self.uploaded_bytes / elapsed if elapsed > 0 else 0
 
     @property
     def pct_complete(self):
@@ -62,25 +97,43 @@ class TransactionUploader:
     def to_json(self):
         data = {
             "chunkIndex": self.chunk_index,
+            "completedChunks": sorted(self.completed_chunks),
             "transaction": self.transaction.to_dict(),
             "lastRequestTimeEnd": self.last_request_time_end,
             "lastResponseStatus": self.last_response_status,
             "lastResponseError": self.last_response_error,
-            "lastResponseError": self.tx_posted
+            "txPosted": self.tx_posted
         }
 
         return json.dumps(data)
 
     def load_from_json(self, data):
+        """
+        Restores the upload state saved with to_json. The file handler and
+        wallet of this uploader are kept, and its prepared chunks are reused
+        if they belong to the same data.
+        """
         if type(data) == str:
             data = json.loads(data)
 
+        chunks = self.transaction.chunks
+
+        if chunks and base64url_encode(chunks.get('data_root')).decode() != data['transaction'].get('data_root'):
+            chunks = None
+
+        self.transaction = restore_transaction(
+            self.transaction.wallet,
+            data['transaction'],
+            self.file_handler,
+            chunks=chunks,
+            gateway=self.transaction.api_url
+        )
         self.chunk_index = data['chunkIndex']
-        self.transaction = Transaction.from_serialized_transaction(data['transaction'])
-        self.last_request_time_end = arrow.now(data['lastRequestTimeEnd']).timestamp
+        self.completed_chunks = set(data.get('completedChunks', range(self.chunk_index)))
+        self.last_request_time_end = data['lastRequestTimeEnd']
         self.last_response_status = data['lastResponseStatus']
         self.last_response_error = data['lastResponseError']
-        self.tx_posted = data['lastResponseError']
+        self.tx_posted = data['txPosted']
 
     def upload_chunk(self):
         if self.is_complete:
@@ -91,7 +144,7 @@ class TransactionUploader:
         else:
             self.total_errors = 0
 
-        if self.total_errors == 100:
+        if self.total_errors == MAX_CHUNK_ERRORS:
             raise TransactionUploaderException(
                 "Unable to complete upload: {}: {}".format(self.last_response_status, self.last_response_error)
             )
@@ -99,13 +152,10 @@ class TransactionUploader:
         delay = 0
 
         if self.last_response_error != '':
-            delay = max(
-                (self.last_request_time_end + ERROR_DELAY) - arrow.now().timestamp,
-                ERROR_DELAY
-            )
+            # counted from the end of the failed request, in seconds
+            delay = self.last_request_time_end + self.retry_delay(self.total_errors) - time.time()
 
         if delay > 0:
-            delay = delay - (delay * random.random() * 0.3)
             time.sleep(delay)
 
         self.last_response_error = ''
@@ -118,142 +168,321 @@ class TransactionUploader:
         if self.is_complete:
             return
 
-        chunk_ok = validate_path(
-            self.transaction.chunks.get('data_root'),
-            int(chunk.get('offset')),
-            0,
-            int(chunk.get('data_size')),
-            base64url_decode(chunk.get('data_path'))
-        )
+        response = self.post_chunk(self.chunk_index, chunk)
 
-        if not chunk_ok:
-            raise TransactionUploaderException("Unable to validate chunk {}".format(self.chunk_index))
+        if response.status_code != 200:
+            return {"status": -1, "data": {"error": response.text}}
 
-        self.data = chunk['chunk']  # = self.get_chunk_data(self.chunk_index)
-        chunk['data_path'] = chunk['data_path'].decode()
-        chunk['chunk'] = chunk['chunk'].decode()
+        while self.chunk_index in self.completed_chunks:
+            self.chunk_index += 1
+
+    def upload_chunks(self, concurrency=DEFAULT_UPLOAD_CONCURRENCY, progress=None, scheduler=None):
+        """
+        Uploads every chunk that has not been uploaded yet, keeping up to
+        concurrency chunk POSTs in flight on a thread pool. Chunks complete out
+        of order and are tracked in completed_chunks. A failed chunk is retried
+        on its own after a backoff delay, up to MAX_CHUNK_ERRORS times, and any
+        of the FATAL_CHUNK_UPLOAD_ERRORS stops the whole upload.
+        :param concurrency: number of simultaneous chunk uploads
+        :param progress: optional callable, called with the uploader after each chunk
+        :param scheduler: optional scheduler.UploadScheduler, which adapts the
+            number of uploads in flight and paces them instead of concurrency
+        """
+        if self.is_complete:
+            return
 
-        url = "{}/chunk".format(self.transaction.api_url)
+        if scheduler is not None:
+            self.scheduler = scheduler
 
-        headers = {'Content-Type': 'application/json', 'Accept': 'application/json, text/plain, */*'}
+        scheduler = self.scheduler or UploadScheduler.fixed(concurrency)
 
-        response = requests.post(url, data=json.dumps(chunk), headers=headers)
+        if not self.tx_posted:
+            self.post_transaction(self.transaction.get_chunk(0))
 
-        # logger.error("{}\n\n{}".format(response.text, self.transaction.json_data))
+            if self.is_complete:
+                return
 
-        if response.status_code == 200:
-            logger.debug("RESPONSE 200: {}".format(response.text))
-        else:
-            logger.error("{}".format(response.text))
+        remaining = iter([index for index in range(self.total_chunks) if index not in self.completed_chunks])
+        in_flight = set()
 
-            return {"status": -1, "data": {"error": response.text}}
+        with ThreadPoolExecutor(max_workers=scheduler.maximum) as executor:
+            try:
+                while True:
+                    while len(in_flight) < scheduler.limit:
+                        index = next(remaining, None)
 
-        self.last_request_time_end = arrow.now().timestamp
-        self.last_response_status = response.status_code
+                        if index is None:
+                            break
+
+                        in_flight.add(executor.submit(self.upload_chunk_with_retry, index))
+
+                    if not in_flight:
+                        break
 
-        if self.last_response_status == 200:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        future.result()
+
+                        if progress is not None:
+                            progress(self)
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+
+                raise
+
+        while self.chunk_index in self.completed_chunks:
             self.chunk_index += 1
-        else:
-            self.last_response_error = json.loads(response.text)
 
-            if self.last_response_error.error in FATAL_CHUNK_UPLOAD_ERRORS:
+    def upload_chunk_with_retry(self, index):
+        errors = 0
+
+        while True:
+            try:
+                response = self.post_chunk(index, self.transaction.get_chunk(index))
+                error = response.text if response.status_code != 200 else None
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+
+                if self.scheduler is not None:
+                    self.scheduler.on_error()
+
+            if error is None:
+                return
+
+            errors += 1
+
+            if errors >= MAX_CHUNK_ERRORS:
                 raise TransactionUploaderException(
-                    "Fatal error uploading chunk {}: {}".format(self.chunk_index, self.last_response_error.error)
+                    "Unable to upload chunk {}: {}".format(index, error)
                 )
 
-    def get_chunk_data(self, chunk_index):
-        self.file_handler.seek(chunk_index * CHUNK_SIZE)
-        data = self.file_handler.read(CHUNK_SIZE)
+            time.sleep(self.retry_delay(errors))
 
-        return base64url_encode(data)
+    def retry_delay(self, attempt=1):
+        """
+        Seconds to wait before retry number attempt: jittered exponential
+        backoff from the scheduler, or capped at ERROR_DELAY (ms) without one
+        """
+        if self.scheduler is not None:
+            return self.scheduler.retry_delay(attempt)
 
-    def post_transaction(self, chunk):
-        upload_in_body = self.total_chunks <= MAX_CHUNKS_IN_BODY
+        return backoff_delay(attempt, maximum=ERROR_DELAY / 1000)
 
-        if upload_in_body:
-            url = "{}/tx".format(self.transaction.api_url)
-            headers = {'Content-Type': 'application/json', 'Accept': 'application/json, text/plain, */*'}
+    def send_delay(self, size):
+        """Seconds to wait before sending size bytes, to stay under the rate limit"""
+        if self.scheduler is not None:
+            return self.scheduler.send_delay(size)
+
+        limiter = get_rate_limiter()
+
+        return limiter.reserve(size) if limiter is not None else 0
+
+    def record_latency(self, status_code, latency):
+        if self.scheduler is not None:
+            self.scheduler.on_response(status_code, latency)
 
-            self.transaction.data = chunk['chunk']
+    def post_chunk(self, index, chunk):
+        """
+        Validates and POSTs a single chunk as returned by Transaction.get_chunk.
+        Fatal gateway errors raise, other failures are returned for the caller
+        to retry.
+        :return: the response
+        """
+        body = self.chunk_request(index, chunk)
 
-            json_data = self.transaction.json_data
-            response = requests.post(url, data=json_data, headers=headers)
+        delay = self.send_delay(len(body))
 
-            self.last_request_time_end = arrow.now().timestamp
+        if delay > 0:
+            time.sleep(delay)
+
+        started = time.monotonic()
+        response = self.client.post("{}/chunk".format(self.transaction.api_url), data=body, headers=JSON_HEADERS)
+        self.record_latency(response.status_code, time.monotonic() - started)
+
+        return self.record_chunk_response(index, chunk, response)
+
+    def chunk_request(self, index, chunk):
+        """Validates the chunk's proof and returns the json body to POST to /chunk"""
+        if self.path_verifier is None:
+            self.path_verifier = BatchPathVerifier(
+                self.transaction.chunks.get('data_root'),
+                self.transaction.data_size
+            )
+
+        chunk_ok = self.path_verifier.validate(
+            chunk.get('offset'),
+            base64url_decode(chunk.get('data_path'))
+        )
+
+        if not chunk_ok:
+            raise TransactionUploaderException("Unable to validate chunk {}".format(index))
+
+        self.data = chunk['chunk']  # = self.get_chunk_data(self.chunk_index)
+        chunk['data_path'] = chunk['data_path'].decode()
+        chunk['chunk'] = chunk['chunk'].decode()
+
+        with self.lock:
+            if self.upload_started is None:
+                self.upload_started = time.time()
+
+        return json.dumps(chunk)
+
+    def record_chunk_response(self, index, chunk, response, journal=True):
+        """
+        Tracks the outcome of a chunk POST and raises on a fatal error. With
+        journal=False the caller records a completed chunk in the journal
+        itself, as AsyncTransactionUploader does off the event loop.
+        """
+        error = None
+
+        with self.lock:
+            self.last_request_time_end = time.time()
             self.last_response_status = response.status_code
-            self.transaction.data = b''
 
-            if 200 <= response.status_code < 300:
+            if response.status_code == 200:
                 logger.debug("RESPONSE 200: {}".format(response.text))
-                self.tx_posted = True
-                self.chunk_index = MAX_CHUNKS_IN_BODY
-                return
+
+                self.completed_chunks.add(index)
+                self.uploaded_bytes += chunk_size(chunk)
+                self.last_response_error = ''
             else:
-                logger.error("{}\n\n{}".format(response.text, self.transaction.json_data))
+                logger.error("{}".format(response.text))
 
-                self.last_response_error = json.loads(response.text)
+                # other threads overwrite the shared field, so decide on this response's own error
+                error = response_error(response)
+                self.last_response_error = error
 
-                raise TransactionUploaderException(
-                    "Unable to upload transaction {}, {}".format(response.status_code, self.last_response_error)
-                )
+        if error is None:
+            # outside the lock, so other chunk completions do not queue behind the journal's fsync
+            if journal and self.journal is not None:
+                self.journal.record_chunk(index)
 
-        url = "{}/tx".format(self.transaction.api_url)
-        headers = {'Content-Type': 'application/json', 'Accept': 'application/json, text/plain, */*'}
+            return response
 
-        self.transaction.data = b''
+        if error in FATAL_CHUNK_UPLOAD_ERRORS:
+            raise TransactionUploaderException(
+                "Fatal error uploading chunk {}: {}".format(index, error)
+            )
+
+        return response
+
+    def get_chunk_data(self, chunk_index):
+        if self.transaction.data_source is not None:
+            return base64url_encode(self.transaction.data_source.read(chunk_index * CHUNK_SIZE, CHUNK_SIZE))
+
+        with opened_data_source(self.file_handler) as data_source:
+            return base64url_encode(data_source.read(chunk_index * CHUNK_SIZE, CHUNK_SIZE))
+
+    def post_transaction(self, chunk):
+        json_data, upload_in_body = self.transaction_request(chunk)
+
+        response = self.client.post("{}/tx".format(self.transaction.api_url), data=json_data, headers=JSON_HEADERS)
+
+        self.record_transaction_response(response, json_data, upload_in_body)
+
+    def transaction_request(self, chunk):
+        """
+        The json body to POST to /tx. If the data fits in MAX_CHUNKS_IN_BODY
+        chunks it goes in the body, otherwise the transaction is sent without
+        data and the chunks are uploaded separately.
+        :return: (json_data, upload_in_body)
+        """
+        upload_in_body = self.total_chunks <= MAX_CHUNKS_IN_BODY
+
+        self.transaction.data = chunk['chunk'] if upload_in_body else b''
 
         json_data = self.transaction.json_data
-        response = requests.post(url, data=json_data, headers=headers)
 
-        self.last_request_time_end = arrow.now().timestamp
-        self.last_response_status = response.status_code
         self.transaction.data = b''
 
+        return json_data, upload_in_body
+
+    def record_transaction_response(self, response, json_data, upload_in_body, journal=True):
+        self.last_request_time_end = time.time()
+        self.last_response_status = response.status_code
+
         if not (200 <= response.status_code < 300):
-            self.last_response_error = json.loads(response.text)
+            logger.error("{}\n\n{}".format(response.text, json_data))
+
+            self.last_response_error = response_error(response)
 
             raise TransactionUploaderException(
                 "Unable to upload transaction {}, {}".format(response.status_code, self.last_response_error)
             )
 
+        logger.debug("RESPONSE 200: {}".format(response.text))
+
         self.tx_posted = True
 
+        if upload_in_body:
+            self.chunk_index = MAX_CHUNKS_IN_BODY
+            self.completed_chunks.update(range(MAX_CHUNKS_IN_BODY))
+
+        if journal and self.journal is not None:
+            self.journal.record_posted(upload_in_body)
+
+
+def response_error(response):
+    """The error code from a gateway error response, or the raw text if it is not json"""
+    try:
+        error = json.loads(response.text)
+    except ValueError:
+        return response.text
+
+    if isinstance(error, dict):
+        return error.get('error', response.text)
+
+    return error
+
+
+def chunk_size(chunk):
+    """Size in bytes of the base64url encoded chunk in a get_chunk result"""
+    encoded_length = len(chunk['chunk'])
+
+    return encoded_length * 3 // 4
+
 
 class TransactionDownloaderException(Exception):
     pass
 
 
-def get_transaction_offset(tx_id):
-    url = "{}/tx/{}/offset".format(API_URL, tx_id)
+def get_transaction_offset(tx_id, client=None, api_url=API_URL):
+    """The size of the transaction data and the absolute offset of its last byte in the weave"""
+    url = "{}/tx/{}/offset".format(api_url, tx_id)
 
-    response = requests.get(url)
-    response_json = json.loads(response.text)
+    response = (client or get_default_client()).get(url)
 
-    if response.status_code == 200:
-        return int(response_json.get("data"))
-    else:
+    if response.status_code != 200:
         raise TransactionDownloaderException(
-            "Unable to get transaction offset: {}".format(response_json.get("error"))
+            "Unable to get transaction offset: {}".format(response.text)
         )
 
+    response_json = json.loads(response.text)
 
-def get_chunk(offset):
-    url = "{}/chunk/{}".format(API_URL, offset)
+    return {
+        "size": int(response_json.get("size")),
+        "offset": int(response_json.get("offset"))
+    }
 
-    response = requests.get(url)
-    response_json = json.loads(response.text)
 
-    if response.status_code == 200:
-        return response_json.get("data")
-    else:
+def get_chunk(offset, client=None, api_url=API_URL):
+    url = "{}/chunk/{}".format(api_url, offset)
+
+    response = (client or get_default_client()).get(url)
+
+    if response.status_code != 200:
         raise TransactionDownloaderException(
-            "Unable to get chunk: {}".format(response_json.get("error"))
+            "Unable to get chunk: {}".format(response.text)
         )
 
+    return json.loads(response.text)
 
-def get_chunk_data(offset):
-    chunk = get_chunk(offset)
-    buf = base64url_decode(chunk.get('chunk'))
+
+def get_chunk_data(offset, client=None, api_url=API_URL):
+    chunk = get_chunk(offset, client=client, api_url=api_url)
+    buf = base64url_decode(chunk.get('chunk').encode())
     return buf
 
 
@@ -261,45 +490,322 @@ def first_chunk_offset(offset_response):
     return int(offset_response.get('offset')) - int(offset_response.get('size')) + 1
 
 
-def download_chunked_data(tx_id, file_handler=None):
-    offset_response = get_transaction_offset(tx_id)
+class TransactionDownloader(object):
+    """
+    Downloads the data of a transaction chunk by chunk, keeping up to
+    concurrency GET /chunk requests in flight on a thread pool. Every chunk's
+    data_path is validated against the transaction data_root, which also
+    gives the chunk's position, and the chunk is written straight into place
+    in a preallocated file (with os.pwrite where available) or bytearray.
+
+    The byte ranges written so far can be appended to a journal file, a
+    download restarted with the same journal only fetches what is missing.
+    """
+
+    def __init__(self, tx_id, client=None, api_url=API_URL, concurrency=DEFAULT_DOWNLOAD_CONCURRENCY):
+        self.tx_id = tx_id
+        self.client = client or get_default_client()
+        self.api_url = api_url
+        self.concurrency = concurrency
+
+        self.size = None
+        self.start_offset = None
+        self.path_verifier = None
+        self.ranges = {}
+        self.downloaded_bytes = 0
+        self.lock = threading.Lock()
+
+    def load_transaction(self):
+        offset = get_transaction_offset(self.tx_id, client=self.client, api_url=self.api_url)
+
+        self.size = offset['size']
+        self.start_offset = first_chunk_offset(offset)
+
+        response = self.client.get("{}/tx/{}".format(self.api_url, self.tx_id))
+
+        if response.status_code != 200:
+            raise TransactionDownloaderException("Unable to get transaction: {}".format(response.text))
+
+        tx = json.loads(response.text)
+
+        if int(tx.get('data_size', 0)) != self.size:
+            raise TransactionDownloaderException("Transaction data_size does not match its offset size")
+
+        self.path_verifier = BatchPathVerifier(base64url_decode(tx['data_root'].encode()), self.size)
+
+    @property
+    def is_complete(self):
+        return self.size is not None and len(self.gaps()) == 0
+
+    def gaps(self):
+        """(start, end) byte ranges of the data not downloaded yet"""
+        gaps = []
+        cursor = 0
+
+        with self.lock:
+            ranges = sorted(self.ranges.items())
+
+        for left, right in ranges:
+            if left > cursor:
+                gaps.append((cursor, left))
+
+            cursor = max(cursor, right)
+
+        if cursor < self.size:
+            gaps.append((cursor, self.size))
+
+        return gaps
+
+    def fetch_chunk(self, offset):
+        """Fetches and validates the chunk holding data byte offset, returns (left_bound, data)"""
+        chunk = get_chunk(self.start_offset + offset, client=self.client, api_url=self.api_url)
+
+        data = base64url_decode(chunk['chunk'].encode())
+        data_path = base64url_decode(chunk['data_path'].encode())
+
+        result = self.path_verifier.validate(offset, data_path, data)
+
+        if not result:
+            raise TransactionDownloaderException("Chunk at offset {} failed validation".format(offset))
+
+        return result.left_bound, data
+
+    def fetch_chunk_with_retry(self, offset):
+        errors = 0
+
+        while True:
+            try:
+                return self.fetch_chunk(offset)
+            except (requests.exceptions.RequestException, TransactionDownloaderException, KeyError, ValueError) as e:
+                errors += 1
+
+                if errors >= MAX_DOWNLOAD_ERRORS:
+                    raise TransactionDownloaderException(
+                        "Unable to download chunk at offset {}: {}".format(offset, e)
+                    )
+
+                time.sleep(DOWNLOAD_ERROR_DELAY * errors)
+
+    def download(self, file_handler=None, journal_path=None, progress=None):
+        """
+        :param file_handler: writable, seekable binary file, None to download into memory
+        :param journal_path: optional path of the journal of downloaded ranges
+        :param progress: optional callable, called with the downloader after each chunk
+        :return: the data as bytes when no file_handler is given
+        """
+        if self.size is None:
+            self.load_transaction()
+
+        if journal_path is not None:
+            self.ranges.update(read_download_journal(journal_path))
+
+        if file_handler is None:
+            buffer = bytearray(self.size)
+            view = memoryview(buffer)
+
+            def write(left, data):
+                view[left:left + len(data)] = data
+        else:
+            write = self.file_writer(file_handler)
+
+        journal = open(journal_path, 'a') if journal_path is not None else None
+
+        try:
+            while True:
+                offsets = [offset for start, end in self.gaps() for offset in range(start, end, MAX_CHUNK_SIZE)]
 
-    size = int(offset_response.get('size'))
-    end_offset = int(offset_response.get('offset'))
-    start_offset = end_offset - size + 1
+                if not offsets:
+                    break
 
-    byte_offset = 0
+                before = self.downloaded_bytes
+                self.download_offsets(offsets, write, journal, progress)
 
-    if file_handler is None:
-        data = bytearray(length=size)
+                if self.downloaded_bytes == before:
+                    raise TransactionDownloaderException("Download made no progress")
+        finally:
+            if journal is not None:
+                journal.close()
 
-    while start_offset + byte_offset < end_offset:
-        chunk_data = get_chunk_data(start_offset + byte_offset)
+        if file_handler is not None:
+            file_handler.flush()
+
+        if journal_path is not None and os.path.exists(journal_path):
+            os.remove(journal_path)
 
         if file_handler is None:
-            data[byte_offset:] = byte(chunk_data)
+            return bytes(buffer)
+
+    def file_writer(self, file_handler):
+        file_handler.seek(0, 2)
+
+        if file_handler.tell() < self.size:
+            file_handler.truncate(self.size)
+
+        file_handler.flush()
+
+        try:
+            fileno = file_handler.fileno() if hasattr(os, 'pwrite') else None
+        except (AttributeError, io.UnsupportedOperation):
+            fileno = None
+
+        if fileno is not None:
+            def write(left, data):
+                os.pwrite(fileno, data, left)
         else:
-            file_handler.seek(byte_offset)
-            file_handler.write(chunk_data)
+            write_lock = threading.Lock()
+
+            def write(left, data):
+                with write_lock:
+                    file_handler.seek(left)
+                    file_handler.write(data)
+
+        return write
+
+    def download_offsets(self, offsets, write, journal, progress):
+        remaining = iter(offsets)
+        in_flight = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                while True:
+                    while len(in_flight) < self.concurrency:
+                        offset = next(remaining, None)
+
+                        if offset is None:
+                            break
+
+                        in_flight.add(executor.submit(self.fetch_chunk_with_retry, offset))
+
+                    if not in_flight:
+                        break
+
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        left, data = future.result()
+
+                        if left in self.ranges:
+                            continue
+
+                        write(left, data)
+
+                        with self.lock:
+                            self.ranges[left] = left + len(data)
+                            self.downloaded_bytes += len(data)
+
+                        if journal is not None:
+                            journal.write("{} {}\n".format(left, left + len(data)))
+                            journal.flush()
+
+                        if progress is not None:
+                            progress(self)
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+
+                raise
+
+
+def read_download_journal(journal_path):
+    ranges = {}
+
+    if not os.path.exists(journal_path):
+        return ranges
+
+    with open(journal_path) as journal:
+        for line in journal:
+            parts = line.split()
 
+            # a line cut short by a crash is ignored, that chunk is fetched again
+            if len(parts) == 2 and line.endswith("\n"):
+                ranges[int(parts[0])] = int(parts[1])
 
-def from_serialized(self, file_handler, json_str):
+    return ranges
+
+
+def download_chunked_data(tx_id, file_handler=None, client=None, concurrency=DEFAULT_DOWNLOAD_CONCURRENCY,
+                          api_url=API_URL):
+    """
+    Downloads and verifies the data of a chunked transaction, into
+    file_handler or, when none is given, returned as bytes.
+    """
+    downloader = TransactionDownloader(tx_id, client=client, api_url=api_url, concurrency=concurrency)
+
+    return downloader.download(file_handler)
+
+
+def download_to_file(tx_id, file_path, client=None, concurrency=DEFAULT_DOWNLOAD_CONCURRENCY, progress=None,
+                     api_url=API_URL):
+    """
+    Downloads the data of a transaction to file_path. Progress is journaled
+    next to the file, so calling this again after an interruption resumes
+    the download. The journal is removed once the file is complete.
+    """
+    journal_path = "{}.chunks".format(file_path)
+    mode = 'r+b' if os.path.exists(file_path) and os.path.exists(journal_path) else 'w+b'
+
+    downloader = TransactionDownloader(tx_id, client=client, api_url=api_url, concurrency=concurrency)
+
+    with open(file_path, mode) as file_handler:
+        downloader.download(file_handler, journal_path=journal_path, progress=progress)
+
+    return downloader
+
+
+def restore_transaction(wallet, transaction, file_handler, chunks=None, gateway=None):
+    """
+    Rebuilds a signed Transaction for a chunked upload from its to_dict form.
+    chunks (a generate_transaction_chunks result) saves re-hashing the file,
+    without it the chunks are prepared again. Either way the data_root must
+    match the one that was signed.
+    """
+    tx = Transaction(
+        wallet,
+        transaction=json.dumps(transaction),
+        gateway=gateway or wallet.api_url,
+        client=wallet.client
+    )
+
+    tx.file_handler = file_handler
+    tx.uses_uploader = True
+    tx.data = b''
+    tx.data_size = int(tx.data_size)
+    tx.chunks = chunks
+
+    if chunks is None:
+        file_handler.seek(0)
+
+    tx.prepare_chunks()
+
+    data_root = base64url_encode(tx.chunks.get('data_root'))
+
+    if data_root.decode() != transaction.get('data_root'):
+        raise TransactionUploaderException("The file does not match the data_root of the transaction")
+
+    tx.data_root = data_root
+
+    return tx
+
+
+def from_serialized(wallet, file_handler, json_str):
+    """Creates an uploader from the output of TransactionUploader.to_json, re-hashing the file"""
     if json_str is None:
         raise TransactionUploaderException("Serialized object does not match expected format")
 
     serialized = json.loads(json_str)
 
-    if type(serialized.chunk_index) != int or type(serialized.transaction) != object:
+    if type(serialized.get('chunkIndex')) != int or type(serialized.get('transaction')) != dict:
         raise TransactionUploaderException("Serialized object does not match expected format")
 
     upload = TransactionUploader(
         file_handler=file_handler,
-        transaction=Transaction(
-            file_handler=file_handler,
-            transaction=serialized.transaction
-        )
+        transaction=restore_transaction(wallet, serialized['transaction'], file_handler)
     )
 
+    upload.load_from_json(serialized)
+
+    return upload
+
 
 def from_transaction_id(file_handler, transaction_str, wallet, api_url=API_URL):
     tx = json.loads(transaction_str)
@@ -308,7 +814,7 @@ def from_transaction_id(file_handler, transaction_str, wallet, api_url=API_URL):
 
     headers = {'Content-Type': 'application/json', 'Accept': 'application/json, text/plain, */*'}
 
-    response = requests.get(url, headers=headers)
+    response = wallet.client.get(url, headers=headers)
 
     logger.error("{}".format(response.text))
 
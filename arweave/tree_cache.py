@@ -0,0 +1,238 @@
+import io
+import os
+import stat
+import json
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+from .merkle import (
+    Chunk,
+    NODE_RECORD_SIZE,
+    pack_node_record,
+    read_tree_leaves,
+    unpack_node_record
+)
+from .file_io import opened_data_source
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+ENTRY_SUFFIX = '.leaves'
+
+
+def file_identity(file_handler):
+    """
+    (path, size, mtime, inode, device) of the regular file behind a file
+    handler or data source, or None if it is not one or is not read from the
+    start, in which case nothing is cached for it.
+    """
+    handler = getattr(file_handler, 'file_handler', file_handler)
+
+    try:
+        if handler.tell() != 0:
+            return None
+
+        file_stat = os.fstat(handler.fileno())
+    except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+        return None
+
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+        return None
+
+    name = getattr(handler, 'name', None)
+    path = os.path.realpath(name) if isinstance(name, str) else ''
+
+    return path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, file_stat.st_dev
+
+
+class TreeCache(object):
+    """
+    On disk cache of the merkle tree leaves (chunk data hash and
+    max_byte_range) of files, keyed by their path, size, mtime and inode. A
+    hit rebuilds the tree from the leaves, which costs one small hash per
+    node instead of reading and hashing the whole file again.
+
+    With validate_samples > 0 that many chunks, always including the first
+    and last, are read back and hashed on every hit to check the content
+    still matches, catching files rewritten without a change of mtime.
+
+    Entries are evicted least recently used first once the cache holds more
+    than max_size bytes. Pass one to generate_transaction_chunks,
+    compute_root_hash or Transaction(tree_cache=...).
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, validate_samples=0):
+        self.directory = directory
+        self.max_size = max_size
+        self.validate_samples = validate_samples
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, file_handler):
+        identity = file_identity(file_handler)
+
+        if identity is None:
+            return None
+
+        return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def load(self, key, file_handler):
+        """
+        Generator of the Chunks of a cached tree, or None on a miss. On a hit
+        the file handler is left at the end of the file, as if it had been
+        hashed.
+        """
+        path = self.entry_path(key)
+
+        try:
+            entry = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if not self.validate(entry, file_handler):
+            entry.close()
+
+            logger.warning("Discarding stale tree cache entry {}".format(path))
+            self.misses += 1
+            self.discard(path)
+
+            return None
+
+        # mark as recently used for eviction
+        os.utime(path)
+        self.hits += 1
+
+        getattr(file_handler, 'file_handler', file_handler).seek(0, 2)
+        entry.seek(0)
+
+        return self.iter_entry(entry)
+
+    @staticmethod
+    def iter_entry(entry):
+        # the entry is already open, so evicting it meanwhile does not matter
+        with entry:
+            yield from read_tree_leaves(entry)
+
+    def validate(self, entry, file_handler):
+        size = os.fstat(entry.fileno()).st_size
+        leaf_count = size // NODE_RECORD_SIZE
+
+        if leaf_count == 0 or size % NODE_RECORD_SIZE != 0:
+            return False
+
+        file_size = os.fstat(getattr(file_handler, 'file_handler', file_handler).fileno()).st_size
+
+        if self.read_leaf(entry, leaf_count - 1).max_byte_range != file_size:
+            return False
+
+        if self.validate_samples <= 0:
+            return True
+
+        samples = {0, leaf_count - 1}
+        samples.update(random.sample(range(leaf_count), min(leaf_count, max(0, self.validate_samples - 2))))
+
+        with opened_data_source(file_handler) as data_source:
+            for index in samples:
+                chunk = self.read_leaf(entry, index)
+                data = data_source.read(chunk.min_byte_range, chunk.data_size)
+
+                if hashlib.sha256(data).digest() != chunk.data_hash:
+                    return False
+
+        return True
+
+    @staticmethod
+    def read_leaf(entry, index):
+        min_byte_range = 0
+
+        if index > 0:
+            entry.seek((index - 1) * NODE_RECORD_SIZE)
+            min_byte_range = unpack_node_record(entry.read(NODE_RECORD_SIZE))[1]
+        else:
+            entry.seek(0)
+
+        data_hash, max_byte_range = unpack_node_record(entry.read(NODE_RECORD_SIZE))
+
+        return Chunk(
+            data_hash,
+            data_size=max_byte_range - min_byte_range,
+            min_byte_range=min_byte_range,
+            max_byte_range=max_byte_range
+        )
+
+    def record(self, key, chunks):
+        """
+        Passes chunks through while writing their leaves to a new entry,
+        which is stored once the last chunk has been produced.
+        """
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                for chunk in chunks:
+                    entry.write(pack_node_record(chunk.data_hash, chunk.max_byte_range))
+
+                    yield chunk
+
+            os.replace(temp_path, self.entry_path(key))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+
+            for name in os.listdir(self.directory):
+                if name.endswith(ENTRY_SUFFIX):
+                    try:
+                        entry_stat = os.stat(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        continue
+
+                    entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, name in sorted(entries):
+                if total <= self.max_size:
+                    break
+
+                self.discard(os.path.join(self.directory, name))
+                self.evictions += 1
+                total -= size
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                self.discard(os.path.join(self.directory, name))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": sum(
+                os.path.getsize(os.path.join(self.directory, name))
+                for name in os.listdir(self.directory) if name.endswith(ENTRY_SUFFIX)
+            )
+        }
@@ -0,0 +1,256 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from .merkle import (
+    CompactTree,
+    SpilledTree,
+    SPILL_LEAF_COUNT,
+    write_tree_leaves,
+    read_tree_leaves,
+    tree_transaction_chunks
+)
+from .transaction_uploader import TransactionUploader, TransactionUploaderException, restore_transaction
+
+logger = logging.getLogger(__name__)
+
+
+class UploadJournal(object):
+    """
+    Append-only, line per record log of a chunked upload, so a process that
+    dies part way through can carry on where it stopped.
+
+    The first record holds the signed transaction and the identity of the
+    file; the leaves of its merkle tree are written beside the journal
+    (path + '.leaves') and fsynced before that record, so the tree can be
+    rebuilt without hashing the file again. After that one record is
+    appended when the transaction is posted and one per uploaded chunk. Each
+    record is a single write of one JSON line, a line cut short by a crash is
+    ignored when the journal is read back and that chunk is sent again.
+
+    append returns once its record is on disk. Records appended by other
+    threads while an fsync runs are covered by the next single fsync, so
+    concurrent chunk completions share fsyncs instead of queueing one each.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.leaves_path = "{}.leaves".format(path)
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.file_handler = None
+        self.written = 0
+        self.synced = 0
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+
+        with self.lock:
+            if self.file_handler is None:
+                self.file_handler = open(self.path, 'a')
+
+            self.file_handler.write(line)
+            self.file_handler.flush()
+            self.written += 1
+            position = self.written
+
+        if self.fsync:
+            self.sync(position)
+
+    def sync(self, position):
+        """fsyncs the journal unless an fsync that started after record number position was written already did"""
+        with self.sync_lock:
+            if self.synced >= position:
+                return
+
+            with self.lock:
+                if self.file_handler is None:
+                    # closed meanwhile, close synced it
+                    return
+
+                written = self.written
+                fileno = self.file_handler.fileno()
+
+            os.fsync(fileno)
+            self.synced = written
+
+    def start(self, transaction, file_path):
+        """Writes the tree leaves and the header record for a signed, prepared transaction"""
+        if os.path.exists(self.path):
+            raise TransactionUploaderException("Upload journal {} already exists".format(self.path))
+
+        tree = transaction.chunks.get('tree')
+        leaves_hash = hashlib.sha256()
+        temp_path = "{}.tmp".format(self.leaves_path)
+
+        with open(temp_path, 'wb') as leaves:
+            write_tree_leaves(tree, HashingWriter(leaves, leaves_hash))
+            leaves.flush()
+            os.fsync(leaves.fileno())
+
+        os.replace(temp_path, self.leaves_path)
+
+        stat = os.stat(file_path)
+
+        self.append({
+            "transaction": transaction.to_dict(),
+            "gateway": transaction.api_url,
+            "file_size": stat.st_size,
+            "file_mtime_ns": stat.st_mtime_ns,
+            "leaf_count": len(tree),
+            "leaves_sha256": leaves_hash.hexdigest()
+        })
+
+    def record_posted(self, upload_in_body=False):
+        self.append({"posted": True, "in_body": upload_in_body})
+
+    def record_chunk(self, index):
+        self.append({"chunk": index})
+
+    def read(self):
+        """
+        :return: (header, posted, completed chunk indexes)
+        """
+        header = None
+        posted = False
+        completed = set()
+
+        with open(self.path) as journal:
+            lines = journal.readlines()
+
+        for number, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if number == len(lines) - 1:
+                    logger.warning("Ignoring the incomplete last record of {}".format(self.path))
+                    break
+
+                raise TransactionUploaderException("Upload journal {} is corrupt at line {}".format(
+                    self.path, number + 1))
+
+            if header is None:
+                header = record
+            elif 'chunk' in record:
+                completed.add(record['chunk'])
+            elif record.get('posted'):
+                posted = True
+
+                if record.get('in_body'):
+                    completed.add(0)
+
+        if header is None:
+            raise TransactionUploaderException("Upload journal {} has no transaction".format(self.path))
+
+        return header, posted, completed
+
+    def load_chunks(self, header):
+        """Rebuilds the transaction chunks from the stored tree leaves"""
+        leaves_hash = hashlib.sha256()
+
+        with open(self.leaves_path, 'rb') as leaves:
+            chunks = read_tree_leaves(HashingReader(leaves, leaves_hash))
+
+            if header['leaf_count'] > SPILL_LEAF_COUNT:
+                tree = SpilledTree.from_chunks(chunks)
+            else:
+                tree = CompactTree.from_chunks(chunks)
+
+        if len(tree) != header['leaf_count'] or leaves_hash.hexdigest() != header['leaves_sha256']:
+            raise TransactionUploaderException("Tree leaves {} do not match the journal".format(self.leaves_path))
+
+        return tree_transaction_chunks(tree)
+
+    def close(self):
+        with self.sync_lock, self.lock:
+            if self.file_handler is not None:
+                if self.fsync and self.synced < self.written:
+                    os.fsync(self.file_handler.fileno())
+                    self.synced = self.written
+
+                self.file_handler.close()
+                self.file_handler = None
+
+    def remove(self):
+        self.close()
+
+        for path in (self.path, self.leaves_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class HashingWriter(object):
+    def __init__(self, file_handler, hasher):
+        self.file_handler = file_handler
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+
+        return self.file_handler.write(data)
+
+
+class HashingReader(object):
+    def __init__(self, file_handler, hasher):
+        self.file_handler = file_handler
+        self.hasher = hasher
+
+    def read(self, size):
+        data = self.file_handler.read(size)
+        self.hasher.update(data)
+
+        return data
+
+
+def journaled_uploader(transaction, file_handler, file_path, journal_path, fsync=True):
+    """
+    Uploader for a signed transaction that records its progress in a new
+    journal at journal_path. Remove the journal once is_complete.
+    """
+    journal = UploadJournal(journal_path, fsync=fsync)
+
+    transaction.prepare_chunks()
+    journal.start(transaction, file_path)
+
+    return TransactionUploader(transaction=transaction, file_handler=file_handler, journal=journal)
+
+
+def resume_upload(journal_path, wallet, file_handler, file_path, fsync=True):
+    """
+    Rebuilds the uploader of an interrupted upload from its journal. The file
+    is not hashed again and chunks that were uploaded are not sent again;
+    upload_chunks carries on with the rest. The file must be unchanged.
+    """
+    journal = UploadJournal(journal_path, fsync=fsync)
+    header, posted, completed = journal.read()
+
+    stat = os.stat(file_path)
+
+    if stat.st_size != header['file_size'] or stat.st_mtime_ns != header['file_mtime_ns']:
+        raise TransactionUploaderException("{} has changed since the upload started".format(file_path))
+
+    transaction = restore_transaction(
+        wallet,
+        header['transaction'],
+        file_handler,
+        chunks=journal.load_chunks(header),
+        gateway=header.get('gateway')
+    )
+
+    uploader = TransactionUploader(
+        transaction=transaction,
+        file_handler=file_handler,
+        tx_posted=posted,
+        completed_chunks=completed,
+        journal=journal
+    )
+
+    while uploader.chunk_index in uploader.completed_chunks:
+        uploader.chunk_index += 1
+
+    logger.info("Resuming upload of {}: {}/{} chunks done".format(
+        transaction.id, len(completed), uploader.total_chunks))
+
+    return uploader
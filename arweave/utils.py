@@ -17,8 +17,12 @@ def create_tag(name, value, v2):
 
 
 def encode_tag(tag):
-    b64name = base64url_encode(tag['name'].encode('ascii')).decode()
-    b64value = base64url_encode(tag['value'].encode('ascii')).decode()
+    # tags loaded from json are already decoded to bytes
+    name = tag['name'] if type(tag['name']) == bytes else tag['name'].encode('ascii')
+    value = tag['value'] if type(tag['value']) == bytes else tag['value'].encode('ascii')
+
+    b64name = base64url_encode(name).decode()
+    b64value = base64url_encode(value).decode()
 
     return {"name": b64name, "value": b64value}
 
@@ -54,19 +58,4 @@ def ar_to_winston(ar_amount: str) -> str:
 
 
 def concat_buffers(buffers):
-    total_length = 0
-
-    for buffer in buffers:
-        total_length += len(buffer)
-
-    offset = 0
-
-    temp = b'\x00' * total_length
-    temp = bytearray(temp)
-    for buffer in buffers:
-        for i in range(len(buffer)):
-            temp[i + offset] = buffer[i]
-
-        offset += len(buffer)
-
-    return bytes(temp)
+    return b''.join(buffers)
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from jose.utils import base64url_encode, base64url_decode
+from .deep_hash import deep_hash
+from .crypto_backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+VERIFY_BATCH_SIZE = 256
+BATCHES_PER_WORKER = 4
+REPORT_INTERVAL = 1.0
+
+
+def b64_field(value):
+    if not value:
+        return b''
+
+    if type(value) == str:
+        value = value.encode()
+
+    return base64url_decode(value)
+
+
+def str_field(value):
+    if value is None:
+        return b''
+
+    return str(value).encode()
+
+
+def signature_data(tx):
+    """
+    Rebuilds the message a transaction was signed over from its gateway JSON
+    form (as returned by GET /tx/{id}), without a wallet or any network
+    calls. Format 1 signs the concatenated fields, format 2 signs their deep
+    hash.
+    :param tx: dict of the transaction fields, base64url encoded
+    :return: bytes
+    """
+    tags = [[b64_field(tag['name']), b64_field(tag['value'])] for tag in tx.get('tags', [])]
+
+    if int(tx.get('format', 1)) == 1:
+        return b''.join([
+            b64_field(tx.get('owner')),
+            b64_field(tx.get('target')),
+            b64_field(tx.get('data')),
+            str_field(tx.get('quantity')),
+            str_field(tx.get('reward')),
+            b64_field(tx.get('last_tx'))
+        ] + [name + value for name, value in tags])
+
+    return deep_hash([
+        b"2",
+        b64_field(tx.get('owner')),
+        b64_field(tx.get('target')),
+        str_field(tx.get('quantity')),
+        str_field(tx.get('reward')),
+        b64_field(tx.get('last_tx')),
+        tags,
+        str_field(tx.get('data_size')),
+        b64_field(tx.get('data_root'))
+    ])
+
+
+def verify_transaction(tx, backend=None):
+    """
+    Checks that the signature of a transaction was made by its owner over
+    its signature data, and that its id is the SHA-256 of the signature.
+    :param tx: gateway JSON of the transaction, as a dict or a string
+    :param backend: crypto_backend.CryptoBackend, defaults to get_backend()
+    :return: bool
+    """
+    if type(tx) in (str, bytes):
+        tx = json.loads(tx)
+
+    if not tx.get('signature') or not tx.get('owner'):
+        return False
+
+    try:
+        raw_signature = b64_field(tx['signature'])
+        message = signature_data(tx)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    if base64url_encode(hashlib.sha256(raw_signature).digest()).decode() != tx.get('id'):
+        return False
+
+    return (backend or get_backend()).verify(tx['owner'], message, raw_signature)
+
+
+def _verify_batch(batch):
+    backend = get_backend()
+
+    return [verify_transaction(tx, backend) for tx in batch]
+
+
+def _batches(transactions, batch_size):
+    batch = []
+
+    for tx in transactions:
+        batch.append(tx)
+
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _transaction_id(tx):
+    if type(tx) in (str, bytes):
+        return json.loads(tx).get('id')
+
+    return tx.get('id')
+
+
+def verify_transactions(transactions, workers=None, batch_size=VERIFY_BATCH_SIZE, progress=None,
+                        report_interval=REPORT_INTERVAL):
+    """
+    Verifies a stream of transactions across a process pool and yields
+    (id, valid) in input order. The input is consumed lazily, at most
+    BATCHES_PER_WORKER batches per worker are in flight, so millions of
+    transactions can be audited from a file or a cursor without holding them
+    in memory.
+
+    Throughput is logged and passed to progress(stats) at most every
+    report_interval seconds and once at the end, stats being a dict of
+    verified, invalid, elapsed and per_second.
+    :param transactions: iterable of gateway JSON transactions (dicts or strings)
+    :param workers: number of processes, defaults to the cpu count, 1 verifies in this process
+    :param batch_size: transactions sent to a worker at a time
+    :param progress: optional callable
+    :return: generator of (id, bool)
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {"verified": 0, "invalid": 0, "elapsed": 0.0, "per_second": 0.0}
+    started = time.monotonic()
+    reported = started
+
+    def record(batch, results):
+        nonlocal reported
+
+        stats["verified"] += len(results)
+        stats["invalid"] += results.count(False)
+
+        now = time.monotonic()
+
+        if now - reported >= report_interval:
+            reported = now
+            report(now)
+
+        return zip([_transaction_id(tx) for tx in batch], results)
+
+    def report(now):
+        stats["elapsed"] = now - started
+        stats["per_second"] = stats["verified"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+
+        logger.info("verified {verified} transactions ({invalid} invalid), {per_second:.0f}/s".format(**stats))
+
+        if progress is not None:
+            progress(dict(stats))
+
+    if workers < 2:
+        for batch in _batches(transactions, batch_size):
+            yield from record(batch, _verify_batch(batch))
+    else:
+        window = workers * BATCHES_PER_WORKER
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in _batches(transactions, batch_size):
+                pending.append((batch, executor.submit(_verify_batch, batch)))
+
+                if len(pending) >= window:
+                    batch, future = pending.popleft()
+                    yield from record(batch, future.result())
+
+            while pending:
+                batch, future = pending.popleft()
+                yield from record(batch, future.result())
+
+    report(time.monotonic())
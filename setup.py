@@ -24,4 +24,7 @@ setup(
     'requests',
     'psutil'
   ],
+  extras_require={
+    'async': ['aiohttp'],
+  },
 )
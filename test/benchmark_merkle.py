@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for the merkle buffer primitives.
+
+Builds a synthetic tree (random chunk hashes, no file data) for the given
+data size and times leaf, branch and proof generation with the original
+byte-at-a-time concat_buffers/int_to_buffer and with the current ones.
+
+    python benchmark_merkle.py --size-gb 10
+"""
+import argparse
+import os
+import time
+from arweave import merkle
+from arweave.merkle import Chunk, MAX_CHUNK_SIZE, NOTE_SIZE
+
+
+def legacy_concat_buffers(buffers):
+    total_length = 0
+
+    for buffer in buffers:
+        total_length += len(buffer)
+
+    offset = 0
+
+    temp = b'\x00' * total_length
+    temp = bytearray(temp)
+    for buffer in buffers:
+        for i in range(len(buffer)):
+            temp[i + offset] = buffer[i]
+
+        offset += len(buffer)
+
+    return bytes(temp)
+
+
+def legacy_int_to_buffer(note):
+    buffer = b"\x00" * NOTE_SIZE
+    buffer = bytearray(buffer)
+
+    for i in range(NOTE_SIZE - 1, 0, -1):
+        byte_val = note % 256
+        buffer[i] = int(byte_val)
+        note = int((note - byte_val) / 256)
+
+    return buffer
+
+
+def synthetic_chunks(size):
+    chunks = []
+
+    for min_byte_range in range(0, size, MAX_CHUNK_SIZE):
+        max_byte_range = min(min_byte_range + MAX_CHUNK_SIZE, size)
+
+        chunks.append(Chunk(
+            os.urandom(32),
+            data_size=max_byte_range - min_byte_range,
+            min_byte_range=min_byte_range,
+            max_byte_range=max_byte_range
+        ))
+
+    return chunks
+
+
+def run(chunks):
+    start = time.time()
+
+    root = merkle.build_layers(merkle.generate_leaves(chunks))
+    tree_time = time.time() - start
+
+    proofs = merkle.generate_proofs(root)
+    proof_time = time.time() - start - tree_time
+
+    return root.id, len(proofs), tree_time, proof_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-gb', type=float, default=10)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(int(args.size_gb * 1024 ** 3))
+    print("{} chunks".format(len(chunks)))
+
+    root, proof_count, tree_time, proof_time = run(chunks)
+    print("current: tree {:.2f}s, {} proofs {:.2f}s".format(tree_time, proof_count, proof_time))
+
+    if args.skip_legacy:
+        return
+
+    concat_buffers, int_to_buffer = merkle.concat_buffers, merkle.int_to_buffer
+    merkle.concat_buffers, merkle.int_to_buffer = legacy_concat_buffers, legacy_int_to_buffer
+
+    try:
+        legacy_root, _, legacy_tree_time, legacy_proof_time = run(chunks)
+    finally:
+        merkle.concat_buffers, merkle.int_to_buffer = concat_buffers, int_to_buffer
+
+    assert legacy_root == root
+
+    print("legacy:  tree {:.2f}s, {} proofs {:.2f}s".format(legacy_tree_time, proof_count, legacy_proof_time))
+    print("speedup: tree {:.1f}x, proofs {:.1f}x".format(
+        legacy_tree_time / tree_time, legacy_proof_time / proof_time
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for the signing backends.
+
+Times key loading, signing and verification of a transaction sized message
+with every crypto backend that can be imported.
+
+    python benchmark_signing.py --count 200
+"""
+import argparse
+import json
+import os
+import time
+from arweave.crypto_backend import BACKENDS
+
+
+def timed(func, count):
+    started = time.perf_counter()
+
+    for _ in range(count):
+        result = func()
+
+    return (time.perf_counter() - started) / count, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--jwk', default='test_jwk_file.json')
+    args = parser.parse_args()
+
+    with open(args.jwk) as jwk_file:
+        jwk_data = json.load(jwk_file)
+
+    message = os.urandom(48)
+
+    for backend_class in BACKENDS:
+        try:
+            backend = backend_class()
+        except ImportError:
+            print("{:<14} not installed".format(backend_class.name))
+            continue
+
+        load, key = timed(lambda: backend.load_private_key(jwk_data), args.count)
+        sign, signature = timed(lambda: backend.sign(key, message), args.count)
+        verify, valid = timed(lambda: backend.verify(jwk_data['n'], message, signature), args.count)
+
+        assert valid
+
+        print("{:<14} load {:8.3f} ms  sign {:8.3f} ms  verify {:8.3f} ms".format(
+            backend.name, load * 1000, sign * 1000, verify * 1000
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import json
+import asyncio
+import threading
+from arweave import Wallet
+from arweave import transaction_uploader, async_client
+from arweave.cache import GatewayCache
+from arweave.async_client import AsyncClient
+from arweave.upload_journal import UploadJournal
+from arweave.merkle import MAX_CHUNK_SIZE, validate_path
+from jose.utils import base64url_decode
+
+wallet = Wallet("test_jwk_file.json")
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession, answering from a dict of handlers"""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+
+        for (handler_method, path), handler in self.handlers.items():
+            if handler_method == method and url.endswith(path):
+                return FakeResponse(*handler(kwargs))
+
+        return FakeResponse(404, b'not found')
+
+    async def close(self):
+        pass
+
+
+def test_async_sign_and_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(transaction_uploader, 'ERROR_DELAY', 0)
+    # an injected session works without aiohttp, including the retry of a timed out chunk
+    monkeypatch.setattr(async_client, 'aiohttp', None)
+
+    data = os.urandom(6 * MAX_CHUNK_SIZE + 100)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    chunks = {}
+    attempts = []
+
+    def post_chunk(kwargs):
+        attempts.append(kwargs)
+
+        if len(attempts) == 2:
+            return 503, json.dumps({"error": "busy"}).encode()
+
+        if len(attempts) == 4:
+            raise asyncio.TimeoutError()
+
+        body = json.loads(kwargs['data'])
+        chunks[int(body['offset'])] = body
+
+        return 200, b'OK'
+
+    session = FakeSession({
+        ('GET', '/tx_anchor'): lambda kwargs: (200, b'anchor'),
+        ('GET', '/price/{}'.format(len(data))): lambda kwargs: (200, b'1234'),
+        ('POST', '/tx'): lambda kwargs: (200, b'OK'),
+        ('POST', '/chunk'): post_chunk,
+    })
+
+    async def run():
+        async with AsyncClient(session=session) as client:
+            with open(file_path, "rb", buffering=0) as file_handler:
+                tx = await client.create_transaction(wallet, file_handler=file_handler, file_path=str(file_path))
+                await client.sign(tx)
+
+                uploader = client.get_uploader(tx, file_handler)
+                await uploader.upload_chunks(concurrency=3)
+
+                return tx, uploader
+
+    tx, uploader = asyncio.run(run())
+
+    assert tx.last_tx == 'anchor'
+    assert tx.reward == '1234'
+    assert uploader.is_complete
+    assert len(chunks) == 7
+
+    for offset, body in chunks.items():
+        assert validate_path(tx.chunks['data_root'], offset, 0, len(data), base64url_decode(body['data_path'].encode()))
+
+
+def test_async_journal_writes_off_the_loop(tmp_path, monkeypatch):
+    data = os.urandom(3 * MAX_CHUNK_SIZE + 100)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+    journal_path = str(tmp_path / "upload.journal")
+
+    journal_threads = []
+    append = UploadJournal.append
+
+    def record_thread(journal, record):
+        journal_threads.append(threading.current_thread())
+        append(journal, record)
+
+    monkeypatch.setattr(UploadJournal, 'append', record_thread)
+
+    session = FakeSession({
+        ('POST', '/tx'): lambda kwargs: (200, b'OK'),
+        ('POST', '/chunk'): lambda kwargs: (200, b'OK'),
+    })
+
+    async def run():
+        async with AsyncClient(session=session) as client:
+            with open(file_path, "rb", buffering=0) as file_handler:
+                tx = await client.create_transaction(wallet, file_handler=file_handler, file_path=str(file_path),
+                                                     last_tx='anchor', reward='1000')
+                await client.sign(tx)
+
+                journal = UploadJournal(journal_path)
+                journal.start(tx, str(file_path))
+
+                uploader = client.get_uploader(tx, file_handler, journal=journal)
+                await uploader.upload_chunks(concurrency=2)
+
+                return uploader, threading.current_thread()
+
+    uploader, loop_thread = asyncio.run(run())
+
+    assert uploader.is_complete
+    # the header is written before the upload starts, every later record off the loop
+    assert len(journal_threads) == 1 + 1 + 4
+    assert loop_thread not in journal_threads[1:]
+
+    header, posted, completed = UploadJournal(journal_path).read()
+
+    assert posted
+    assert completed == set(range(4))
+
+
+def test_async_cache_serves_anchor_and_price():
+    session = FakeSession({
+        ('GET', '/tx_anchor'): lambda kwargs: (200, b'anchor'),
+        ('GET', '/price/1000'): lambda kwargs: (200, b'1234'),
+        ('GET', '/price/2000'): lambda kwargs: (200, b'5678'),
+    })
+
+    async def run():
+        async with AsyncClient(session=session, cache=GatewayCache()) as client:
+            anchors = [await client.get_last_transaction_id() for _ in range(3)]
+            # both sizes are in the same 256 KiB price bucket
+            rewards = [await client.get_reward(1000), await client.get_reward(2000)]
+
+            return anchors, rewards
+
+    anchors, rewards = asyncio.run(run())
+
+    assert anchors == ['anchor'] * 3
+    assert rewards == ['1234', '1234']
+    assert len(session.requests) == 2
+
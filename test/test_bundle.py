@@ -0,0 +1,134 @@
+import io
+import json
+import pytest
+import responses
+from jose.utils import base64url_encode
+from arweave import Wallet
+from arweave.bundle import (
+    DataItem,
+    BundleReader,
+    BundleException,
+    serialize_tags,
+    deserialize_tags,
+    sign_data_items,
+    write_bundle,
+    create_bundle,
+    bundle_transaction
+)
+from arweave.transaction_uploader import get_uploader
+
+wallet = Wallet("test_jwk_file.json")
+
+
+def make_items(count, workers=None):
+    items = []
+
+    for i in range(count):
+        item = DataItem(data='record {}'.format(i), anchor=base64url_encode(bytes([i]) * 32).decode())
+        item.add_tag('Content-Type', 'text/plain')
+        items.append(item)
+
+    return sign_data_items(items, wallet, workers=workers)
+
+
+def test_serialize_tags():
+    tags = [{'name': b'a', 'value': b'b'}, {'name': b'Content-Type', 'value': b'text/plain'}]
+
+    assert serialize_tags([]) == b''
+    assert serialize_tags(tags[:1]) == b'\x02\x02a\x02b\x00'
+    assert deserialize_tags(serialize_tags(tags)) == tags
+
+
+def test_data_item_round_trip():
+    item = make_items(1)[0]
+    binary = item.to_bytes()
+
+    assert len(binary) == item.binary_size
+
+    parsed = DataItem.from_bytes(binary)
+
+    assert parsed.id == item.id
+    assert parsed.data == b'record 0'
+    assert parsed.anchor == item.anchor
+    assert parsed.target == ''
+    assert parsed.tags == item.tags
+    assert parsed.verify()
+
+    parsed.data = b'tampered'
+
+    assert not parsed.verify()
+
+
+def test_write_and_read_bundle(tmp_path):
+    items = make_items(5, workers=2)
+    path = tmp_path / "bundle.bin"
+
+    with open(path, "wb") as f:
+        size = write_bundle(items, f)
+
+    assert size == path.stat().st_size
+    assert path.read_bytes() == create_bundle(items)
+
+    with open(path, "rb") as f, BundleReader(f) as reader:
+        assert len(reader) == 5
+        assert [entry[0] for entry in reader.entries()] == [item.id for item in items]
+        assert reader.get(items[3].id).data == b'record 3'
+        assert reader.verify()
+
+
+def test_bundle_reader_releases_buffer():
+    items = make_items(2)
+    buffer = io.BytesIO(create_bundle(items))
+
+    with BundleReader(buffer) as reader:
+        assert reader.get(items[1].id).data == b'record 1'
+
+    # the buffer can only be resized once the reader's view of it is released
+    buffer.write(b'appended')
+    buffer.truncate(0)
+
+    buffer = io.BytesIO(create_bundle(items))
+    reader = BundleReader(buffer)
+    reader.close()
+
+    buffer.write(b'appended')
+
+    with pytest.raises(BundleException):
+        reader.get(items[0].id)
+
+
+@responses.activate
+def test_upload_bundle(tmp_path):
+    items = make_items(3)
+    path = tmp_path / "bundle.bin"
+
+    with open(path, "wb") as f:
+        write_bundle(items, f)
+
+    posted = []
+
+    def post_transaction(request):
+        posted.append(json.loads(request.body))
+
+        return 200, {}, 'OK'
+
+    responses.add_callback(responses.POST, '{}/tx'.format(wallet.api_url), callback=post_transaction)
+
+    with open(path, "rb", buffering=0) as file_handler:
+        tx = bundle_transaction(wallet, file_handler, str(path), last_tx='anchor', reward='1000')
+        tx.sign()
+
+        uploader = get_uploader(tx, file_handler)
+
+        while not uploader.is_complete:
+            uploader.upload_chunk()
+
+    assert {'name': 'QnVuZGxlLUZvcm1hdA', 'value': 'YmluYXJ5'} in posted[0]['tags']
+    with BundleReader(io.BytesIO(path.read_bytes())) as reader:
+        assert reader.verify()
+
+
+if __name__ == "__main__":
+    test_serialize_tags()
+    test_data_item_round_trip()
+    test_bundle_reader_releases_buffer()
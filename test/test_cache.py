@@ -0,0 +1,55 @@
+import responses
+from arweave import Wallet, HttpClient
+from arweave.cache import TTLCache, GatewayCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_and_eviction():
+    clock = FakeClock()
+    cache = TTLCache(10, maxsize=2, clock=clock)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)  # evicts b, the least recently used
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+    clock.now = 11
+    assert cache.get('a') is None
+
+    assert cache.stats() == {"hits": 2, "misses": 2, "evictions": 1, "size": 1}
+
+
+@responses.activate
+def test_wallet_uses_client_cache():
+    wallet = Wallet("test_jwk_file.json", client=HttpClient(cache=GatewayCache()))
+
+    responses.add(responses.GET, '{}/tx_anchor'.format(wallet.api_url), body='anchor')
+    responses.add(responses.GET, '{}/price/1'.format(wallet.api_url), body='1000')
+    responses.add(responses.GET, '{}/price/262145'.format(wallet.api_url), body='2000')
+
+    assert wallet.get_last_transaction_id() == 'anchor'
+    assert wallet.get_last_transaction_id() == 'anchor'
+
+    rewards = wallet.get_rewards([1, 1000, 262144, 262145, 500000])
+
+    assert rewards == {1: '1000', 1000: '1000', 262144: '1000', 262145: '2000', 500000: '2000'}
+    assert len(responses.calls) == 3
+
+    stats = wallet.client.cache.stats()
+    assert stats['anchor']['hits'] == 1
+    assert stats['price']['misses'] == 2
+
+
+if __name__ == "__main__":
+    test_ttl_cache_expiry_and_eviction()
+    test_wallet_uses_client_cache()
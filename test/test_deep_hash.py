@@ -0,0 +1,39 @@
+import io
+import os
+from arweave.deep_hash import deep_hash, Blob
+
+
+def test_deep_hash_nested_list():
+    expected = '30bce0a753c170f214f57dd0244bc29c76526aea405cd8bff8af8301a7d10424e1c57f63ab4d55070b99f48f72a8c2e7'
+
+    assert deep_hash([b'a', [b'b', b'c']]).hex() == expected
+
+
+def test_deep_hash_long_list():
+    # longer than the recursion limit, which broke the recursive deep_hash_chunks
+    tags = [[b'name', str(i).encode()] for i in range(5000)]
+
+    assert len(deep_hash(tags)) == 48
+
+
+def test_deep_hash_streamed_blobs():
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    expected = deep_hash([b'header', [data, b'']])
+
+    chunks = (data[i:i + 65536] for i in range(0, len(data), 65536))
+
+    assert deep_hash([b'header', [io.BytesIO(data), b'']]) == expected
+    assert deep_hash([b'header', [memoryview(data), bytearray()]]) == expected
+    assert deep_hash([b'header', [Blob(chunks, len(data)), b'']]) == expected
+
+    try:
+        deep_hash(Blob([data], len(data) + 1))
+        assert False, "expected a size mismatch"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_deep_hash_nested_list()
+    test_deep_hash_long_list()
+    test_deep_hash_streamed_blobs()
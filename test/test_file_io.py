@@ -0,0 +1,74 @@
+import io
+import os
+from arweave.file_io import open_data_source, FileDataSource, MappedFileDataSource
+from arweave.merkle import compute_root_hash, iter_chunk_data
+
+
+class UnseekableStream(io.RawIOBase):
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+
+def test_mapped_file_reads_slices():
+    with open("testfile0.bin", "rb", buffering=0) as file_handler:
+        data_source = open_data_source(file_handler)
+
+        assert isinstance(data_source, MappedFileDataSource)
+
+        file_handler.seek(1000)
+        expected = file_handler.read(500)
+
+        chunk = data_source.read(1000, 500)
+
+        assert type(chunk) == memoryview
+        assert chunk == expected
+
+
+def test_unseekable_stream_falls_back():
+    data = os.urandom(300 * 1024)
+
+    data_source = open_data_source(UnseekableStream(data))
+
+    assert type(data_source) == FileDataSource
+    assert compute_root_hash(UnseekableStream(data)) == compute_root_hash(io.BytesIO(data))
+
+
+def test_mapped_root_matches_buffered():
+    with open("testfile0.bin", "rb", buffering=0) as file_handler:
+        mapped_root = compute_root_hash(file_handler)
+
+    with open("testfile0.bin", "rb", buffering=0) as file_handler:
+        buffered_root = compute_root_hash(FileDataSource(file_handler))
+
+    assert mapped_root == buffered_root
+
+
+def test_iter_chunk_data_closes_its_data_source():
+    buffer = io.BytesIO(os.urandom(600 * 1024))
+
+    assert len(list(iter_chunk_data(buffer))) == 3
+
+    buffer.write(b'x')
+
+    chunks = iter_chunk_data(buffer)
+    buffer.seek(0)
+    next(chunks)
+    chunks.close()
+
+    buffer.write(b'x')
+
+
+if __name__ == "__main__":
+    test_mapped_file_reads_slices()
+    test_unseekable_stream_falls_back()
+    test_mapped_root_matches_buffered()
+    test_iter_chunk_data_closes_its_data_source()
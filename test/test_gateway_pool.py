@@ -0,0 +1,139 @@
+import os
+import json
+import requests
+import responses
+from arweave import Wallet, Transaction, GatewayPool
+from arweave import transaction_uploader, gateway_pool
+from arweave.transaction_uploader import get_uploader, get_chunk
+from arweave.merkle import MAX_CHUNK_SIZE
+
+PRIMARY = "https://primary.example"
+SECONDARY = "https://secondary.example"
+
+
+def test_routes_by_latency():
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    pool.record_success(pool.gateways[0], 1.0)
+    pool.record_success(pool.gateways[1], 0.01)
+
+    chosen = [pool.choose().url for _ in range(1000)]
+
+    assert chosen.count(SECONDARY) > 900
+
+
+def first_available(population, weights):
+    return [population[0]]
+
+
+@responses.activate
+def test_get_chunk_fails_over(monkeypatch):
+    monkeypatch.setattr(gateway_pool.random, 'choices', first_available)
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    responses.add(responses.GET, "{}/chunk/100".format(PRIMARY), status=503, body="busy")
+    responses.add(responses.GET, "{}/chunk/100".format(SECONDARY), json={"chunk": "AAAA"})
+
+    assert get_chunk(100, client=pool, api_url=PRIMARY) == {"chunk": "AAAA"}
+
+    stats = {gateway['url']: gateway for gateway in pool.stats()}
+    assert not stats[PRIMARY]['available']
+    assert stats[SECONDARY]['available']
+
+    # the failed gateway is skipped while it cools down
+    assert get_chunk(100, client=pool, api_url=PRIMARY) == {"chunk": "AAAA"}
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_get_tries_another_gateway_on_404(monkeypatch):
+    monkeypatch.setattr(gateway_pool.random, 'choices', first_available)
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    responses.add(responses.GET, "{}/tx/abc".format(PRIMARY), status=404, body="Not Found")
+    responses.add(responses.GET, "{}/tx/abc".format(SECONDARY), body="{}")
+
+    assert pool.get("{}/tx/abc".format(PRIMARY)).status_code == 200
+    assert all(gateway['available'] for gateway in pool.stats())
+
+
+@responses.activate
+def test_keeps_404_when_next_gateway_is_down(monkeypatch):
+    monkeypatch.setattr(gateway_pool.random, 'choices', first_available)
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    responses.add(responses.GET, "{}/tx/x/status".format(PRIMARY), status=404, body="Not Found")
+    responses.add(responses.GET, "{}/tx/x/status".format(SECONDARY), body=requests.exceptions.ConnectionError("down"))
+
+    assert pool.get("{}/tx/x/status".format(PRIMARY)).status_code == 404
+
+
+@responses.activate
+def test_raises_when_every_gateway_fails():
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    for gateway in (PRIMARY, SECONDARY):
+        responses.add(responses.POST, "{}/chunk".format(gateway), body=requests.exceptions.ConnectionError("down"))
+
+    try:
+        pool.post("{}/chunk".format(SECONDARY), data=b'{}')
+        assert False
+    except requests.exceptions.ConnectionError:
+        pass
+
+    assert not any(gateway['available'] for gateway in pool.stats())
+
+
+@responses.activate
+def test_health_check_and_passthrough():
+    pool = GatewayPool([PRIMARY, SECONDARY])
+
+    responses.add(responses.GET, "{}/info".format(PRIMARY), json={"height": 1})
+    responses.add(responses.GET, "{}/info".format(SECONDARY), status=500)
+    responses.add(responses.GET, "https://other.example/info", json={"height": 2})
+
+    assert pool.check_health() == 1
+    assert [gateway['available'] for gateway in pool.stats()] == [True, False]
+
+    assert pool.get("https://other.example/info").json() == {"height": 2}
+
+
+@responses.activate
+def test_upload_through_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(transaction_uploader, 'ERROR_DELAY', 0)
+
+    pool = GatewayPool([PRIMARY, SECONDARY])
+    wallet = Wallet("test_jwk_file.json", gateway=PRIMARY, client=pool)
+
+    data = os.urandom(6 * MAX_CHUNK_SIZE + 1)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    uploaded = set()
+
+    def post_chunk(request):
+        uploaded.add(json.loads(request.body)['offset'])
+
+        return 200, {}, "OK"
+
+    for gateway in (PRIMARY, SECONDARY):
+        responses.add(responses.GET, '{}/tx_anchor'.format(gateway), body='anchor')
+        responses.add(responses.GET, '{}/price/{}'.format(gateway, len(data)), body='1234')
+        responses.add(responses.POST, '{}/tx'.format(gateway), body='OK')
+
+    responses.add(responses.POST, '{}/chunk'.format(PRIMARY), body=requests.exceptions.ConnectionError("down"))
+    responses.add_callback(responses.POST, '{}/chunk'.format(SECONDARY), callback=post_chunk)
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = Transaction(wallet, file_handler=file_handler, file_path=str(file_path), gateway=PRIMARY)
+        tx.sign()
+
+        uploader = get_uploader(tx, file_handler)
+        uploader.upload_chunks(concurrency=2)
+
+    assert uploader.is_complete
+    assert len(uploaded) == uploader.total_chunks == 7
+
+
+if __name__ == "__main__":
+    test_routes_by_latency()
@@ -0,0 +1,194 @@
+import io
+import os
+from arweave import merkle
+from arweave.merkle import (
+    CompactTree,
+    SpilledTree,
+    IncrementalTree,
+    BatchPathVerifier,
+    TreeProofs,
+    chunk_data,
+    generate_leaves,
+    build_layers,
+    generate_proofs,
+    compute_root_hash,
+    generate_transaction_chunks,
+    validate_path,
+    hash_branch,
+    debug,
+    LeafNode,
+    MAX_CHUNK_SIZE
+)
+
+DATA_SIZES = [1, MAX_CHUNK_SIZE, MAX_CHUNK_SIZE + 1, 5 * MAX_CHUNK_SIZE + 7, 13 * MAX_CHUNK_SIZE]
+
+
+def test_streaming_root_matches_tree():
+    for size in DATA_SIZES:
+        data = os.urandom(size)
+
+        expected = build_layers(generate_leaves(chunk_data(io.BytesIO(data)))).id
+
+        assert compute_root_hash(io.BytesIO(data)) == expected
+
+
+def test_spilled_proofs_validate():
+    for size in DATA_SIZES:
+        data = os.urandom(size)
+
+        result = generate_transaction_chunks(io.BytesIO(data), spill=True)
+
+        assert type(result['tree']) == SpilledTree
+        assert len(result['proofs']) == len(result['chunks'])
+
+        for proof in result['proofs']:
+            assert validate_path(result['data_root'], proof.offset, 0, size, proof.proof)
+
+
+def test_spills_only_large_trees(monkeypatch):
+    data = os.urandom(3 * MAX_CHUNK_SIZE)
+
+    assert type(generate_transaction_chunks(io.BytesIO(data))['tree']) == CompactTree
+
+    monkeypatch.setattr(merkle, 'SPILL_LEAF_COUNT', 2)
+    tree = generate_transaction_chunks(io.BytesIO(data))['tree']
+
+    assert type(tree) == SpilledTree
+    tree.close()
+
+
+def test_compact_tree_matches_node_tree():
+    for size in DATA_SIZES:
+        data = os.urandom(size)
+
+        root = build_layers(generate_leaves(chunk_data(io.BytesIO(data))))
+        expected = [(proof.offset, proof.proof) for proof in generate_proofs(root)]
+
+        tree = CompactTree.from_file(io.BytesIO(data))
+
+        assert tree.root_id() == root.id
+        assert [(tree.proof(i).offset, tree.proof(i).proof) for i in range(len(tree))] == expected
+
+        # proofs resolved through the node views match too
+        assert [(proof.offset, proof.proof) for proof in generate_proofs(tree.root())] == expected
+
+
+def test_lazy_proofs_match_eager():
+    data = os.urandom(11 * MAX_CHUNK_SIZE + 3)
+
+    root = build_layers(generate_leaves(chunk_data(io.BytesIO(data))))
+    expected = [(proof.offset, proof.proof) for proof in generate_proofs(root)]
+
+    for spill in (True, False):
+        result = generate_transaction_chunks(io.BytesIO(data), spill=spill)
+
+        assert type(result['proofs']) == TreeProofs
+        assert len(result['proofs']) == len(expected)
+        assert (result['proofs'][-1].offset, result['proofs'][-1].proof) == expected[-1]
+        assert [(proof.offset, proof.proof) for proof in result['proofs']] == expected
+
+        chunk = result['chunks'][3]
+        assert (chunk.min_byte_range, chunk.data_size) == (3 * MAX_CHUNK_SIZE, MAX_CHUNK_SIZE)
+
+
+def test_batch_verifier():
+    size = 21 * MAX_CHUNK_SIZE + 5
+    data = os.urandom(size)
+
+    result = generate_transaction_chunks(io.BytesIO(data))
+    verifier = BatchPathVerifier(result['data_root'], size)
+
+    items = [
+        (proof.offset, proof.proof, data[chunk.min_byte_range:chunk.max_byte_range])
+        for chunk, proof in zip(result['chunks'], result['proofs'])
+    ]
+
+    validated = verifier.validate_many(items)
+
+    for (offset, path, chunk), batch_result in zip(items, validated):
+        single_result = validate_path(result['data_root'], offset, 0, size, path)
+
+        assert batch_result.offset == single_result.offset
+        assert batch_result.chunk_size == len(chunk)
+
+    assert len(verifier.verified) > 0
+
+    offset, path, chunk = items[4]
+    assert not verifier.validate(offset, path, b'x' + chunk[1:])
+    assert not verifier.validate(offset, path[:-1] + b'x')
+
+
+def test_parallel_root_matches_serial():
+    data = os.urandom(9 * MAX_CHUNK_SIZE + 11)
+
+    expected = compute_root_hash(io.BytesIO(data))
+
+    for workers in (2, 4):
+        assert compute_root_hash(io.BytesIO(data), workers=workers) == expected
+
+        result = generate_transaction_chunks(io.BytesIO(data), workers=workers)
+        assert result['data_root'] == expected
+
+
+def test_deep_tree_does_not_recurse():
+    # a degenerate tree deeper than the recursion limit
+    depth = 1500
+
+    leaves = [
+        LeafNode(data_hash=os.urandom(32), min_byte_range=i * 10, max_byte_range=(i + 1) * 10)
+        for i in range(depth + 1)
+    ]
+
+    root = leaves[-1]
+    for leaf in reversed(leaves[:-1]):
+        root = hash_branch(leaf, root)
+
+    proofs = generate_proofs(root)
+
+    assert len(proofs) == depth + 1
+
+    last = proofs[-1]
+    assert validate_path(root.id, last.offset, 0, root.max_byte_range, last.proof)
+
+    assert len(debug(last.proof).splitlines()) == depth + 2
+
+    layered_root = build_layers(leaves)
+    assert layered_root.max_byte_range == root.max_byte_range
+
+
+def test_testfile_data_root():
+    with open("testfile0.bin", "rb") as file_handler:
+        root = compute_root_hash(file_handler)
+
+    assert root == b'`\xf87C\x86\xe4co\xbeq\xfe\x18v7\xf9^t\xf5-p\xca\x01U\xd5\x085\x1a\xaaBt&\xf9'
+
+
+def test_incremental_tree_matches_full_rebuild():
+    data = b''
+    tree = IncrementalTree()
+
+    for appended in [5 * MAX_CHUNK_SIZE + 7, 100, MAX_CHUNK_SIZE, 11 * MAX_CHUNK_SIZE + 3]:
+        data += os.urandom(appended)
+        first_full_chunks = tree.leaf_count
+
+        result = tree.extend(io.BytesIO(data))
+        tree = IncrementalTree.from_dict(tree.to_dict())
+
+        full = generate_transaction_chunks(io.BytesIO(data), spill=False)
+
+        assert result['data_root'] == full['data_root']
+        assert result['first_index'] == first_full_chunks
+        assert [p.proof for p in result['proofs']] == [p.proof for p in full['proofs'][first_full_chunks:]]
+        assert tree.leaf_count == len(data) // MAX_CHUNK_SIZE
+
+
+if __name__ == "__main__":
+    test_streaming_root_matches_tree()
+    test_spilled_proofs_validate()
+    test_compact_tree_matches_node_tree()
+    test_lazy_proofs_match_eager()
+    test_batch_verifier()
+    test_parallel_root_matches_serial()
+    test_deep_tree_does_not_recurse()
+    test_testfile_data_root()
+    test_incremental_tree_matches_full_rebuild()
@@ -0,0 +1,178 @@
+import os
+import json
+import random
+import responses
+from arweave import Wallet, Transaction
+from arweave.transaction_uploader import get_uploader
+from arweave.merkle import MAX_CHUNK_SIZE
+from arweave.scheduler import (
+    AdaptiveConcurrency,
+    TokenBucket,
+    UploadScheduler,
+    backoff_delay,
+    get_rate_limiter,
+    set_rate_limit
+)
+
+wallet = Wallet("test_jwk_file.json")
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_delay_is_exponential_capped_and_jittered():
+    for attempt, expected in [(1, 1.0), (2, 2.0), (3, 4.0), (6, 32.0), (7, 40.0), (20, 40.0)]:
+        delay = backoff_delay(attempt)
+
+        assert expected * 0.7 <= delay <= expected
+
+    assert backoff_delay(3, maximum=0) == 0
+
+
+def test_token_bucket_paces_bytes():
+    clock = FakeClock()
+    bucket = TokenBucket(1000, burst=500, clock=clock)
+
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(250) == 0.25
+    assert bucket.reserve(250) == 0.5
+
+    clock.now = 0.5
+    assert bucket.reserve(100) == 0.1
+
+    clock.now = 10
+    assert bucket.reserve(500) == 0
+
+
+def test_adaptive_concurrency_increases_and_halves():
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=6)
+
+    for _ in range(4):
+        concurrency.on_success(0.1)
+
+    assert concurrency.limit == 5
+
+    concurrency.on_error()
+    assert concurrency.limit == 2
+
+    # errors from requests already in flight do not decrease it again
+    concurrency.on_error()
+    assert concurrency.limit == 2
+
+    for _ in range(100):
+        concurrency.on_success(0.1)
+
+    assert concurrency.limit == 6
+
+    for _ in range(20):
+        concurrency.on_success(1.0)
+
+    assert concurrency.limit < 6
+
+
+def test_base_latency_follows_upward_drift():
+    concurrency = AdaptiveConcurrency(initial=2, maximum=64)
+    rng = random.Random(1)
+
+    # one fast first sample, then a steady but slower gateway with no congestion
+    concurrency.on_success(0.03)
+
+    for _ in range(5000):
+        concurrency.on_success(rng.uniform(0.05, 0.08))
+
+    assert concurrency.limit == 64
+
+    # latency creeping up slowly moves the base with it
+    for step in range(2000):
+        concurrency.on_success(0.065 * (1 + step / 1000))
+
+    assert concurrency.limit == 64
+
+    # a sudden jump is still congestion
+    for _ in range(20):
+        concurrency.on_success(1.0)
+
+    assert concurrency.limit < 64
+
+
+def test_scheduler_reacts_to_status_codes():
+    scheduler = UploadScheduler(AdaptiveConcurrency(initial=8, maximum=8))
+
+    scheduler.on_response(400, 0.1)
+    assert scheduler.limit == 8
+
+    scheduler.on_response(429, 0.1)
+    assert scheduler.limit == 4
+
+    fixed = UploadScheduler.fixed(3)
+    fixed.on_error()
+    assert fixed.limit == fixed.maximum == 3
+
+
+def test_process_rate_limit():
+    try:
+        set_rate_limit(1000)
+        scheduler = UploadScheduler()
+
+        assert scheduler.send_delay(1000) == 0
+        assert scheduler.send_delay(1000) > 0.9
+    finally:
+        set_rate_limit(None)
+
+    assert get_rate_limiter() is None
+    assert scheduler.send_delay(10 ** 9) == 0
+
+
+@responses.activate
+def test_upload_with_adaptive_scheduler(tmp_path):
+    data = os.urandom(10 * MAX_CHUNK_SIZE + 3)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    calls = []
+
+    def post_chunk(request):
+        calls.append(json.loads(request.body)['offset'])
+
+        if len(calls) == 3:
+            return 503, {}, json.dumps({"error": "busy"})
+
+        return 200, {}, "OK"
+
+    responses.add(responses.GET, '{}/tx_anchor'.format(wallet.api_url), body='anchor')
+    responses.add(responses.GET, '{}/price/{}'.format(wallet.api_url, len(data)), body='1234')
+    responses.add(responses.POST, '{}/tx'.format(wallet.api_url), body='OK')
+    responses.add_callback(responses.POST, '{}/chunk'.format(wallet.api_url), callback=post_chunk)
+
+    # only the 503 should lower the limit, not the jitter of mocked latencies
+    concurrency = AdaptiveConcurrency(initial=4, maximum=8, latency_tolerance=float("inf"))
+    scheduler = UploadScheduler(concurrency, retry_base_delay=0)
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = Transaction(wallet, file_handler=file_handler, file_path=str(file_path))
+        tx.sign()
+
+        uploader = get_uploader(tx, file_handler)
+        limits = []
+        uploader.upload_chunks(scheduler=scheduler, progress=lambda _: limits.append(scheduler.limit))
+
+    assert uploader.is_complete
+    assert len(calls) == uploader.total_chunks + 1
+
+    # the 503 halved the limit at some point, however the threads interleaved
+    limits = [4] + limits
+    assert any(after < before for before, after in zip(limits, limits[1:]))
+
+
+if __name__ == "__main__":
+    test_backoff_delay_is_exponential_capped_and_jittered()
+    test_token_bucket_paces_bytes()
+    test_adaptive_concurrency_increases_and_halves()
+    test_base_latency_follows_upward_drift()
+    test_scheduler_reacts_to_status_codes()
+    test_process_rate_limit()
@@ -0,0 +1,84 @@
+import hashlib
+import responses
+from Crypto.Hash import SHA256
+from Crypto.Signature import PKCS1_PSS
+from jose.utils import base64url_encode, base64url_decode
+from arweave import Wallet, Transaction
+from arweave.signing import sign_transactions
+from arweave.crypto_backend import get_backend
+from arweave.verification import verify_transaction
+
+wallet = Wallet("test_jwk_file.json")
+
+
+def test_sign_transactions_matches_sign():
+    transactions = [
+        Transaction(wallet, data='record {}'.format(i), last_tx='anchor', reward='1000')
+        for i in range(6)
+    ]
+
+    sign_transactions(transactions, workers=2, prefetch=False)
+
+    for tx in transactions:
+        raw_signature = base64url_decode(tx.signature)
+
+        assert PKCS1_PSS.new(wallet.rsa).verify(SHA256.new(tx.get_signature_data()), raw_signature)
+        assert tx.id == base64url_encode(hashlib.sha256(raw_signature).digest()).decode()
+
+    single = Transaction(wallet, data='record 0', last_tx='anchor', reward='1000')
+    single.sign()
+
+    assert single.get_signature_data() == transactions[0].get_signature_data()
+    assert len(single.signature) == len(transactions[0].signature)
+
+
+def test_backends_verify_each_other():
+    message = b'signature data'
+
+    cryptography_backend = get_backend('cryptography')
+    pycryptodome_backend = get_backend('pycryptodome')
+
+    for signer, verifier in [(cryptography_backend, pycryptodome_backend),
+                             (pycryptodome_backend, cryptography_backend)]:
+        signature = signer.sign(signer.load_private_key(wallet.jwk_data), message)
+
+        assert verifier.verify(wallet.owner, message, signature)
+        assert not verifier.verify(wallet.owner, message + b'!', signature)
+
+
+def test_transaction_verify():
+    for backend in ['cryptography', 'pycryptodome']:
+        signer = Wallet("test_jwk_file.json", backend=get_backend(backend))
+
+        tx = Transaction(signer, data='payload', last_tx='anchor', reward='1000')
+        tx.sign()
+
+        assert tx.verify()
+
+        tx.reward = '1001'
+
+        assert not tx.verify()
+
+
+@responses.activate
+def test_verify_loaded_transaction_offline():
+    # no responses registered, so any network call would fail
+    for tx_format in (1, 2):
+        tx = Transaction(wallet, data='first', last_tx='', reward='1000', format=tx_format)
+        tx.set_signature(wallet.sign(tx.get_signature_data()))
+
+        loaded = Transaction(wallet, transaction=tx.json_data)
+
+        assert loaded.last_tx == ''
+        assert loaded.verify()
+        assert verify_transaction(tx.json_data)
+        assert loaded.last_tx == ''
+
+    assert len(responses.calls) == 0
+
+
+if __name__ == "__main__":
+    test_sign_transactions_matches_sign()
+    test_backends_verify_each_other()
+    test_transaction_verify()
+    test_verify_loaded_transaction_offline()
@@ -0,0 +1,176 @@
+import io
+import os
+import time
+import pytest
+import responses
+from concurrent.futures import ThreadPoolExecutor
+from arweave import Wallet, Transaction, arweave_lib
+from arweave.arweave_lib import prefetch_transactions, ArweaveTransactionException
+from arweave.file_io import open_data_source
+from arweave.transaction_uploader import get_uploader
+
+wallet = Wallet("test_jwk_file.json")
+
+
+@responses.activate
+def test_construct_and_sign_offline():
+    # no responses registered, so any network call would fail
+    tx = Transaction(wallet, data=b'some data', last_tx='anchor', reward='1000')
+    tx.add_tag('Content-Type', 'text/plain')
+    tx.sign()
+
+    assert len(responses.calls) == 0
+    assert tx.id != ''
+
+
+def test_sign_with_int_reward():
+    for tx_format in (1, 2):
+        tx = Transaction(wallet, data='payload', last_tx='anchor', reward=1000, format=tx_format)
+        tx.sign()
+
+        expected = Transaction(wallet, data='payload', last_tx='anchor', reward='1000', format=tx_format)
+
+        assert tx.get_signature_data() == expected.get_signature_data()
+        assert tx.verify()
+
+
+@responses.activate
+def test_prefetch_transactions():
+    responses.add(responses.GET, '{}/tx_anchor'.format(wallet.api_url), body='anchor')
+    responses.add(responses.GET, '{}/price/4'.format(wallet.api_url), body='100')
+    responses.add(responses.GET, '{}/price/5'.format(wallet.api_url), body='125')
+
+    transactions = [Transaction(wallet, data=data) for data in ['four', 'five!', 'four', 'five!', 'four']]
+
+    assert len(responses.calls) == 0
+
+    prefetch_transactions(transactions)
+
+    assert len(responses.calls) == 3
+    assert [tx.reward for tx in transactions] == ['100', '125', '100', '125', '100']
+    assert all(tx.last_tx == 'anchor' for tx in transactions)
+
+    for tx in transactions:
+        tx.sign()
+
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_streamed_and_ranged_get_data():
+    data = os.urandom(700000)
+    honour_range = [True]
+
+    def get_data(request):
+        byte_range = request.headers.get('Range')
+
+        if byte_range is None or not honour_range[0]:
+            return 200, {}, data
+
+        start, end = byte_range[len('bytes='):].split('-')
+        end = int(end) + 1 if end else len(data)
+
+        return 206, {}, data[int(start):end]
+
+    responses.add_callback(responses.GET, '{}/txid/'.format(wallet.api_url), callback=get_data)
+
+    tx = Transaction(wallet, id='txid')
+
+    assert b''.join(tx.get_data(stream=True, chunk_size=65536)) == data
+    assert tx.open_data(offset=1000, length=5000).read() == data[1000:6000]
+
+    out = io.BytesIO()
+    assert tx.get_data(file_handler=out, offset=300000) == len(data) - 300000
+    assert out.getvalue() == data[300000:]
+
+    honour_range[0] = False
+    assert b''.join(tx.get_data(stream=True, offset=100000, length=200000, chunk_size=65536)) == data[100000:300000]
+
+    assert tx.get_data() == data
+
+    calls = len(responses.calls)
+    assert list(tx.iter_data(offset=500, length=0)) == []
+    assert tx.open_data(length=0).read() == b''
+    assert len(responses.calls) == calls
+
+    for offset, length in ((-1, None), (0, -5)):
+        with pytest.raises(ValueError):
+            tx.iter_data(offset, length)
+
+
+def test_prepared_transaction_releases_buffer(tmp_path):
+    data = os.urandom(600 * 1024)
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(data)
+
+    buffer = io.BytesIO(data)
+    tx = Transaction(wallet, file_handler=buffer, file_path=str(file_path), last_tx='anchor', reward='1000')
+    tx.prepare_chunks()
+
+    # hashing does not keep the buffer exported
+    buffer.seek(0, 2)
+    buffer.write(b'x')
+    buffer.truncate(len(data))
+
+    assert tx.get_chunk(0)['chunk']
+
+    tx.close()
+    buffer.write(b'x')
+
+
+def test_get_chunk_opens_one_data_source(tmp_path, monkeypatch):
+    data = os.urandom(600 * 1024)
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(data)
+
+    opened = []
+
+    def slow_open(file_handler):
+        # widen the window in which two threads could both see no data source
+        time.sleep(0.05)
+        opened.append(open_data_source(file_handler))
+
+        return opened[-1]
+
+    monkeypatch.setattr(arweave_lib, 'open_data_source', slow_open)
+
+    buffer = io.BytesIO(data)
+    tx = Transaction(wallet, file_handler=buffer, file_path=str(file_path), last_tx='anchor', reward='1000')
+    tx.prepare_chunks()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        chunks = list(executor.map(lambda index: tx.get_chunk(index % 3)['chunk'], range(8)))
+
+    assert len(opened) == 1
+    assert chunks[:3] == [tx.get_chunk(index)['chunk'] for index in range(3)]
+
+    tx.close()
+
+    # the uploader reads through a data source of its own, released right away
+    assert get_uploader(tx, buffer).get_chunk_data(1) == chunks[1]
+    buffer.write(b'x')
+
+
+def test_transaction_closes_its_tree(tmp_path):
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(os.urandom(600 * 1024))
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        with Transaction(wallet, file_handler=file_handler, file_path=str(file_path)) as tx:
+            tx.prepare_chunks()
+            assert tx.data_root
+
+        assert tx.chunks is None
+        assert tx.data_source is None
+        assert not file_handler.closed
+
+    with pytest.raises(ArweaveTransactionException):
+        tx.get_chunk(0)
+
+
+if __name__ == "__main__":
+    test_construct_and_sign_offline()
+    test_sign_with_int_reward()
+    test_prefetch_transactions()
+    test_streamed_and_ranged_get_data()
+    test_prepared_transaction_releases_buffer()
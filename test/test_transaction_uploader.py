@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import responses
+from arweave import Wallet, Transaction
+from arweave import transaction_uploader
+from arweave.transaction_uploader import get_uploader, download_to_file, download_chunked_data
+from arweave.merkle import MAX_CHUNK_SIZE
+
+wallet = Wallet("test_jwk_file.json")
+
+
+def signed_transaction(file_handler, file_path, data_size):
+    responses.add(responses.GET, '{}/tx_anchor'.format(wallet.api_url), body='anchor')
+    responses.add(responses.GET, '{}/price/{}'.format(wallet.api_url, data_size), body='1234')
+
+    tx = Transaction(wallet, file_handler=file_handler, file_path=file_path)
+    tx.sign()
+
+    return tx
+
+
+@responses.activate
+def test_concurrent_upload_retries_and_completes(tmp_path, monkeypatch):
+    monkeypatch.setattr(transaction_uploader, 'ERROR_DELAY', 0)
+
+    data = os.urandom(12 * MAX_CHUNK_SIZE + 9)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    uploaded = {}
+    requests_seen = []
+
+    def post_chunk(request):
+        requests_seen.append(request)
+
+        if len(requests_seen) % 4 == 0:
+            return 503, {}, json.dumps({"error": "busy"})
+
+        body = json.loads(request.body)
+        uploaded[int(body['offset'])] = body
+
+        return 200, {}, "OK"
+
+    responses.add(responses.POST, '{}/tx'.format(wallet.api_url), body='OK')
+    responses.add_callback(responses.POST, '{}/chunk'.format(wallet.api_url), callback=post_chunk)
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = signed_transaction(file_handler, str(file_path), len(data))
+
+        uploader = get_uploader(tx, file_handler)
+        uploader.upload_chunks(concurrency=4)
+
+    assert uploader.is_complete
+    assert uploader.uploaded_chunks == uploader.total_chunks == 13
+    assert len(uploaded) == 13
+    assert uploader.uploaded_bytes == len(data)
+
+    # every failed chunk was retried successfully, so no stale error is left to serialize
+    assert uploader.last_response_error == ''
+    assert json.loads(uploader.to_json())['lastResponseError'] == ''
+
+
+@responses.activate
+def test_concurrent_upload_stops_on_fatal_error(tmp_path):
+    data = os.urandom(3 * MAX_CHUNK_SIZE)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    responses.add(responses.POST, '{}/tx'.format(wallet.api_url), body='OK')
+    responses.add(responses.POST, '{}/chunk'.format(wallet.api_url), status=400,
+                  body=json.dumps({"error": "invalid_proof"}))
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = signed_transaction(file_handler, str(file_path), len(data))
+
+        uploader = get_uploader(tx, file_handler)
+
+        try:
+            uploader.upload_chunks(concurrency=2)
+            assert False, "expected a fatal upload error"
+        except transaction_uploader.TransactionUploaderException as e:
+            assert "invalid_proof" in str(e)
+
+    assert not uploader.is_complete
+
+
+def serve_chunks(tx, end_offset, fail_first=()):
+    failed = set()
+
+    def get_chunk(request):
+        offset = int(request.url.rsplit('/', 1)[1]) - (end_offset - tx.data_size + 1)
+        index = offset // MAX_CHUNK_SIZE
+
+        if index in fail_first and index not in failed:
+            failed.add(index)
+            return 200, {}, json.dumps({"chunk": "AAAA", "data_path": "AAAA"})
+
+        chunk = tx.get_chunk(index)
+
+        return 200, {}, json.dumps({"chunk": chunk['chunk'].decode(), "data_path": chunk['data_path'].decode()})
+
+    responses.add(responses.GET, '{}/tx/{}/offset'.format(wallet.api_url, tx.id),
+                  body=json.dumps({"size": str(tx.data_size), "offset": str(end_offset)}))
+    responses.add(responses.GET, '{}/tx/{}'.format(wallet.api_url, tx.id), body=tx.json_data)
+    responses.add_callback(responses.GET, re.compile(r'.*/chunk/\d+'), callback=get_chunk)
+
+
+@responses.activate
+def test_download_verifies_and_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(transaction_uploader, 'DOWNLOAD_ERROR_DELAY', 0)
+
+    data = os.urandom(9 * MAX_CHUNK_SIZE + 100)
+    file_path = tmp_path / "upload.bin"
+    file_path.write_bytes(data)
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = signed_transaction(file_handler, str(file_path), len(data))
+
+        serve_chunks(tx, end_offset=10 ** 9, fail_first={2, 7})
+
+        assert download_chunked_data(tx.id, concurrency=3) == data
+
+        # a journal from an interrupted download, chunks 0 and 4 are already in place
+        out_path = tmp_path / "download.bin"
+        partial = bytearray(len(data))
+        for index in (0, 4):
+            start = index * MAX_CHUNK_SIZE
+            partial[start:start + MAX_CHUNK_SIZE] = data[start:start + MAX_CHUNK_SIZE]
+        out_path.write_bytes(bytes(partial))
+
+        with open("{}.chunks".format(out_path), "w") as journal:
+            for index in (0, 4):
+                journal.write("{} {}\n".format(index * MAX_CHUNK_SIZE, (index + 1) * MAX_CHUNK_SIZE))
+            journal.write("7")
+
+        requests_before = len(responses.calls)
+        downloader = download_to_file(tx.id, str(out_path), concurrency=4)
+
+    assert out_path.read_bytes() == data
+    assert not os.path.exists("{}.chunks".format(out_path))
+    assert downloader.downloaded_bytes == len(data) - 2 * MAX_CHUNK_SIZE
+    assert len(responses.calls) - requests_before == 2 + 8
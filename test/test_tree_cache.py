@@ -0,0 +1,73 @@
+import io
+import os
+from arweave import merkle
+from arweave.merkle import generate_transaction_chunks, compute_root_hash, MAX_CHUNK_SIZE
+from arweave.tree_cache import TreeCache
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_cache_hit_skips_hashing(tmp_path, monkeypatch):
+    cache = TreeCache(str(tmp_path / "cache"))
+    file_path = str(tmp_path / "data.bin")
+    write_file(file_path, os.urandom(5 * MAX_CHUNK_SIZE + 11))
+
+    with open(file_path, "rb") as f:
+        first = generate_transaction_chunks(f, cache=cache)
+
+    def no_hashing(*args, **kwargs):
+        raise AssertionError("the file was hashed again")
+
+    monkeypatch.setattr(merkle, 'iter_chunk_data', no_hashing)
+
+    with open(file_path, "rb") as f:
+        second = generate_transaction_chunks(f, spill=False, cache=cache)
+
+    with open(file_path, "rb") as f:
+        root = compute_root_hash(f, cache=cache)
+
+    assert second['data_root'] == first['data_root'] == root
+    assert [p.proof for p in second['proofs']] == [p.proof for p in first['proofs']]
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_changed_file_misses(tmp_path):
+    cache = TreeCache(str(tmp_path / "cache"), validate_samples=4)
+    file_path = str(tmp_path / "data.bin")
+    write_file(file_path, os.urandom(3 * MAX_CHUNK_SIZE))
+
+    with open(file_path, "rb") as f:
+        compute_root_hash(f, cache=cache)
+
+    stat = os.stat(file_path)
+    data = os.urandom(3 * MAX_CHUNK_SIZE)
+    write_file(file_path, data)
+
+    # same size and mtime, only the content check can tell
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    with open(file_path, "rb") as f:
+        assert compute_root_hash(f, cache=cache) == compute_root_hash(io.BytesIO(data))
+
+    assert cache.stats()['hits'] == 0
+
+
+def test_lru_eviction(tmp_path):
+    entry_size = 3 * merkle.NODE_RECORD_SIZE
+    cache = TreeCache(str(tmp_path / "cache"), max_size=2 * entry_size)
+
+    for name in ['a', 'b', 'c']:
+        write_file(str(tmp_path / name), os.urandom(3 * MAX_CHUNK_SIZE))
+
+        with open(str(tmp_path / name), "rb") as f:
+            compute_root_hash(f, cache=cache)
+
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2 * entry_size
+
+    with open(str(tmp_path / 'a'), "rb") as f:
+        assert cache.load(cache.key(f), f) is None
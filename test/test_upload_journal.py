@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import threading
+import responses
+from arweave import Wallet, Transaction
+from arweave import arweave_lib, transaction_uploader, upload_journal
+from arweave.transaction_uploader import TransactionUploaderException, from_serialized
+from arweave.upload_journal import journaled_uploader, resume_upload, UploadJournal
+from arweave.merkle import MAX_CHUNK_SIZE
+
+wallet = Wallet("test_jwk_file.json")
+
+
+def signed_transaction(file_handler, file_path):
+    tx = Transaction(wallet, file_handler=file_handler, file_path=file_path, last_tx='anchor', reward='1000')
+    tx.add_tag('Content-Type', 'application/octet-stream')
+    tx.sign()
+
+    return tx
+
+
+@responses.activate
+def test_resume_from_journal(tmp_path, monkeypatch):
+    data = os.urandom(10 * MAX_CHUNK_SIZE + 3)
+    file_path = str(tmp_path / "upload.bin")
+    journal_path = str(tmp_path / "upload.journal")
+
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+    posted_chunks = []
+    posted_transactions = []
+
+    def post_chunk(request):
+        body = json.loads(request.body)
+
+        # the process dies after the 6th chunk
+        if len(posted_chunks) == 6:
+            return 400, {}, json.dumps({"error": "invalid_proof"})
+
+        posted_chunks.append(int(body['offset']) // MAX_CHUNK_SIZE)
+
+        return 200, {}, "OK"
+
+    def post_transaction(request):
+        posted_transactions.append(json.loads(request.body))
+
+        return 200, {}, "OK"
+
+    responses.add_callback(responses.POST, '{}/tx'.format(wallet.api_url), callback=post_transaction)
+    responses.add_callback(responses.POST, '{}/chunk'.format(wallet.api_url), callback=post_chunk)
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = signed_transaction(file_handler, file_path)
+        uploader = journaled_uploader(tx, file_handler, file_path, journal_path)
+
+        try:
+            uploader.upload_chunks(concurrency=1)
+            assert False, "expected the upload to stop"
+        except TransactionUploaderException:
+            pass
+
+        uploader.journal.close()
+
+    # leave a torn record behind, as a crash in the middle of a write would
+    with open(journal_path, "a") as journal:
+        journal.write('{"chu')
+
+    def no_rehash(*args, **kwargs):
+        raise AssertionError("the file was hashed again")
+
+    monkeypatch.setattr(arweave_lib, 'generate_transaction_chunks', no_rehash)
+    resumed_chunks = posted_chunks[:]
+    posted_chunks.append(None)  # let the rest through
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        resumed = resume_upload(journal_path, wallet, file_handler, file_path)
+
+        assert resumed.tx_posted
+        assert resumed.completed_chunks == set(resumed_chunks)
+        assert resumed.transaction.id == tx.id
+        assert resumed.transaction.verify()
+
+        resumed.upload_chunks(concurrency=2)
+
+    assert resumed.is_complete
+    assert len(posted_transactions) == 1
+    assert sorted(posted_chunks[7:]) == [i for i in range(11) if i not in resumed_chunks]
+
+    resumed.journal.remove()
+    assert not os.path.exists(journal_path)
+
+
+def test_to_json_round_trip(tmp_path):
+    file_path = str(tmp_path / "upload.bin")
+
+    with open(file_path, "wb") as f:
+        f.write(os.urandom(3 * MAX_CHUNK_SIZE))
+
+    with open(file_path, "rb", buffering=0) as file_handler:
+        tx = signed_transaction(file_handler, file_path)
+        uploader = transaction_uploader.get_uploader(tx, file_handler)
+        uploader.tx_posted = True
+        uploader.completed_chunks = {0, 2}
+
+        restored = from_serialized(wallet, file_handler, uploader.to_json())
+
+    assert restored.tx_posted
+    assert restored.completed_chunks == {0, 2}
+    assert restored.transaction.id == tx.id
+    assert restored.transaction.json_data == tx.json_data
+
+
+def test_concurrent_records_share_fsyncs(tmp_path, monkeypatch):
+    fsyncs = []
+
+    def slow_fsync(fileno):
+        fsyncs.append(fileno)
+        time.sleep(0.05)
+
+    monkeypatch.setattr(upload_journal.os, 'fsync', slow_fsync)
+
+    journal = UploadJournal(str(tmp_path / "upload.journal"))
+    journal.append({"transaction": {}})
+
+    threads = [threading.Thread(target=journal.record_chunk, args=(index,)) for index in range(16)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    journal.close()
+
+    assert journal.synced == journal.written == 17
+    assert len(fsyncs) < 17
+    assert journal.read()[2] == set(range(16))
+
@@ -0,0 +1,73 @@
+import json
+import hashlib
+from jose.utils import base64url_encode
+from arweave import Wallet, Transaction
+from arweave.verification import signature_data, verify_transaction, verify_transactions
+
+wallet = Wallet("test_jwk_file.json")
+
+
+def signed_v2(data):
+    tx = Transaction(wallet, data=data, last_tx='anchor', reward='1000')
+    tx.add_tag('Content-Type', 'text/plain')
+    tx.sign()
+
+    return json.loads(tx.json_data)
+
+
+def signed_v1(data):
+    tx = {
+        'format': 1,
+        'owner': wallet.owner,
+        'target': '',
+        'data': base64url_encode(data).decode(),
+        'quantity': '0',
+        'reward': '1000',
+        'last_tx': 'anchor',
+        'tags': [{'name': base64url_encode(b'App').decode(), 'value': base64url_encode(b'test').decode()}]
+    }
+
+    raw_signature = wallet.sign(signature_data(tx))
+    tx['signature'] = base64url_encode(raw_signature).decode()
+    tx['id'] = base64url_encode(hashlib.sha256(raw_signature).digest()).decode()
+
+    return tx
+
+
+def test_verify_v1_and_v2():
+    for tx in [signed_v2(b'payload'), signed_v1(b'payload')]:
+        assert verify_transaction(tx)
+        assert verify_transaction(json.dumps(tx))
+
+        assert not verify_transaction(dict(tx, reward='1001'))
+        assert not verify_transaction(dict(tx, id=base64url_encode(b'x' * 32).decode()))
+
+
+def test_loaded_transaction_verify():
+    loaded = Transaction(wallet, transaction=json.dumps(signed_v2(b'payload')))
+
+    assert loaded.verify()
+
+    loaded.tags[0]['value'] = b'text/html'
+
+    assert not loaded.verify()
+
+
+def test_verify_transactions_in_order():
+    transactions = [signed_v2('record {}'.format(i)) for i in range(10)]
+    transactions[3] = dict(transactions[3], reward='1')
+
+    reports = []
+
+    results = list(verify_transactions(transactions, workers=2, batch_size=3, progress=reports.append))
+
+    assert [tx_id for tx_id, _ in results] == [tx['id'] for tx in transactions]
+    assert [valid for _, valid in results] == [i != 3 for i in range(10)]
+    assert reports[-1]['verified'] == 10
+    assert reports[-1]['invalid'] == 1
+
+
+if __name__ == "__main__":
+    test_verify_v1_and_v2()
+    test_loaded_transaction_verify()
+    test_verify_transactions_in_order()
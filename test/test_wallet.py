@@ -1,4 +1,4 @@
-from arweave import Wallet
+from arweave import Wallet, HttpClient
 import arweave
 import json
 import responses
@@ -42,7 +42,21 @@ def test_create_from_data():
     assert from_data_wallet.owner == wallet.owner
 
 
+@responses.activate
+def test_shared_client():
+    client = HttpClient(pool_maxsize=4, timeout=5)
+    client_wallet = Wallet("test_jwk_file.json", client=client)
+
+    mock_url = '{}/wallet/{}/balance'.format(client_wallet.api_url, client_wallet.address)
+    responses.add(responses.GET, mock_url, body="12345678", status=200)
+
+    assert client_wallet.client is client
+    assert client_wallet.balance == winston_to_ar("12345678")
+    assert wallet.client is Wallet("test_jwk_file.json").client
+
+
 if __name__ == "__main__":
     test_get_balance()
     test_get_last_transaction_id()
     test_create_from_data()
+    test_shared_client()